@@ -0,0 +1,190 @@
+"""
+Agendador interno: fecha os resumos semanais e mensais sem depender de
+alguém chamar /resumos/gerar-semanais e /resumos/gerar-mensais.
+
+Cada processo (worker do gunicorn ou `flask agendador`) roda uma thread, mas
+só o líder executa as tarefas de manutenção. O líder é quem consegue o
+advisory lock AGENDADOR_TRAVA em uma conexão própria; se o processo morre ou
+a conexão cai, o Postgres solta a trava e outro processo assume no próximo
+ciclo. A cada AGENDADOR_INTERVALO segundos:
+
+- o líder processa os períodos sujos (agregacao.processar_periodos_sujos) e,
+  uma vez por mandato, reconstrói a última semana (segunda a domingo) e o
+  último mês encerrados (no modo materializado, atualiza as views);
+- com formularioporcasa particionada, o líder cria as partições dos
+  próximos meses e arquiva as antigas uma vez por dia (particoes.py);
+- o líder soma à base as versões de tabela de conexões encerradas
+  (cache_http.consolidar_versoes);
+- todos os processos aquecem o próprio cache com os gráficos desses
+  períodos e do dia anterior, para que o primeiro acesso do painel a um
+  período novo não pague a montagem (com GRAFICOS_CACHE_DIR o cache em
+  disco já é compartilhado e os demais apenas o leem).
+
+Desligue com AGENDADOR_ATIVO=0 (ex.: quando houver um cron externo).
+"""
+import os
+import threading
+from datetime import date, timedelta
+
+from agregacao import processar_periodos_sujos, reprocessar_resumos
+from cache_http import consolidar_versoes
+from database import connection, get_connection
+from particoes import manter_particoes
+from routes.resumos import aquecer_grafico
+
+AGENDADOR_ATIVO = os.getenv('AGENDADOR_ATIVO', '1') == '1'
+AGENDADOR_INTERVALO = float(os.getenv('AGENDADOR_INTERVALO', 60))
+# Chave do pg_try_advisory_lock de liderança (a mesma em todos os processos)
+AGENDADOR_TRAVA = int(os.getenv('AGENDADOR_TRAVA', 7301520160))
+
+
+def periodos_encerrados(hoje):
+    """[(nivel, inicio, fim)] da última semana e do último mês completos antes de `hoje`."""
+    inicio_semana = hoje - timedelta(days=hoje.weekday() + 7)
+    fim_mes = hoje.replace(day=1) - timedelta(days=1)
+    return [
+        ('semanal', inicio_semana, inicio_semana + timedelta(days=6)),
+        ('mensal', fim_mes.replace(day=1), fim_mes),
+    ]
+
+
+class Agendador:
+    """Thread de manutenção com eleição de líder por advisory lock."""
+
+    def __init__(self, app, intervalo=AGENDADOR_INTERVALO):
+        self.app = app
+        self.intervalo = intervalo
+        self.pid = os.getpid()
+        self._parar = threading.Event()
+        self._thread = None
+        self._conn_lider = None
+        # Períodos já fechados neste mandato de liderança
+        self._fechados = set()
+        # Último dia em que as partições foram mantidas
+        self._particoes_em = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._executar, name='agendador', daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def lider(self):
+        return self._conn_lider is not None
+
+    def _executar(self):
+        with self.app.app_context():
+            while not self._parar.is_set():
+                self.ciclo()
+                self._parar.wait(self.intervalo)
+        self._renunciar()
+
+    def ciclo(self, hoje=None):
+        """Uma rodada: tenta a liderança, executa as tarefas do líder e aquece o cache."""
+        hoje = hoje or date.today()
+        try:
+            if self._assumir_lideranca():
+                self._tarefas_do_lider(hoje)
+        except Exception as e:
+            print(f"Erro no agendador (tarefas do líder): {e}")
+            self._renunciar()
+        try:
+            self._aquecer(hoje)
+        except Exception as e:
+            print(f"Erro no agendador (aquecimento do cache): {e}")
+
+    def _assumir_lideranca(self):
+        conn = self._conn_lider
+        if conn is not None:
+            # A trava vale enquanto a sessão existir: se a conexão caiu, outro
+            # processo pode já ter assumido
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+                return True
+            except Exception:
+                self._renunciar()
+
+        conn = get_connection()
+        if conn is None:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (AGENDADOR_TRAVA,))
+                lider = cursor.fetchone()[0]
+            conn.commit()
+        except Exception:
+            lider = False
+        if not lider:
+            conn.close()
+            return False
+        self._conn_lider = conn
+        self._fechados = set()
+        return True
+
+    def _renunciar(self):
+        conn, self._conn_lider = self._conn_lider, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _tarefas_do_lider(self, hoje):
+        conn = self._conn_lider
+        relatorio = processar_periodos_sujos(conn)
+        if relatorio['periodos']:
+            print(f"Agendador: {relatorio['periodos']} períodos sujos processados em {relatorio['duracao_ms']} ms")
+
+        for nivel, inicio, fim in periodos_encerrados(hoje):
+            if (nivel, inicio) in self._fechados:
+                continue
+            reprocessar_resumos(conn, inicio, fim, (nivel,))
+            self._fechados.add((nivel, inicio))
+            print(f"Agendador: resumo {nivel} de {inicio} a {fim} fechado")
+
+        if self._particoes_em != hoje:
+            particoes = manter_particoes(conn, hoje=hoje)
+            if particoes is None or not particoes['adiada']:
+                self._particoes_em = hoje
+            if particoes and (particoes['criadas'] or particoes['arquivadas']):
+                print(f"Agendador: partições criadas {particoes['criadas']}, arquivadas {particoes['arquivadas']}")
+
+        consolidar_versoes(conn)
+
+    def _aquecer(self, hoje):
+        periodos = [('diario', hoje - timedelta(days=1))]
+        periodos += [(nivel, inicio) for nivel, inicio, _ in periodos_encerrados(hoje)]
+        with connection() as conn:
+            if not conn:
+                return
+            for tipo, periodo in periodos:
+                aquecer_grafico(conn, tipo, periodo)
+
+
+_agendador = None
+_agendador_lock = threading.Lock()
+
+
+def garantir_agendador(app):
+    """
+    Inicia a thread do agendador no processo atual, uma vez. Chamado a cada
+    requisição (before_request), para que cada worker do gunicorn inicie a
+    sua após o fork; importar o app (CLI, benchmarks) não inicia nada.
+    """
+    global _agendador
+    if not AGENDADOR_ATIVO:
+        return None
+    agendador = _agendador
+    if agendador is not None and agendador.pid == os.getpid():
+        return agendador
+    with _agendador_lock:
+        if _agendador is None or _agendador.pid != os.getpid():
+            _agendador = Agendador(app)
+            _agendador.iniciar()
+        return _agendador
@@ -0,0 +1,609 @@
+"""
+Manutenção das tabelas de resumo a partir de formularioporcasa.
+
+O caminho normal é incremental: cada inserção em formularioporcasa soma os
+contadores do(s) novo(s) formulário(s) na linha (data, idagente) do resumo
+com um upsert, custo O(1) por envio. O recálculo completo existe apenas
+para reparos, e o reprocessamento por intervalo (reprocessar_resumos) para
+reconstruir os três níveis de uma vez.
+
+Depende da restrição única (data, idagente) em resumodiario
+(sql/001_resumodiario_unico.sql) e das chaves (data_inicio, idagente) de
+resumosemanal e resumomensal (sql/007_indices_consultas.sql).
+
+Com RESUMOS_MODO=materializado os resumos semanais e mensais são lidos das
+views materializadas de sql/005_resumos_materializados.sql em vez das
+tabelas, e reconstruí-los significa atualizar as views.
+
+Escritas que não passam pelo upsert (edições e exclusões) e os níveis
+semanal e mensal são mantidos por processar_periodos_sujos, que refaz só
+os períodos marcados pelos triggers de sql/006_periodos_sujos.sql.
+"""
+import os
+import time
+from datetime import timedelta
+
+import cache_graficos
+
+RESUMOS_MODO = os.getenv('RESUMOS_MODO', 'tabela')
+RESUMOS_MATERIALIZADOS = RESUMOS_MODO == 'materializado'
+
+# De onde as rotas leem cada nível de resumo
+VIEWS_MATERIALIZADAS = {'semanal': 'resumosemanal_mv', 'mensal': 'resumomensal_mv'}
+TABELA_SEMANAL = VIEWS_MATERIALIZADAS['semanal'] if RESUMOS_MATERIALIZADOS else 'resumosemanal'
+TABELA_MENSAL = VIEWS_MATERIALIZADAS['mensal'] if RESUMOS_MATERIALIZADOS else 'resumomensal'
+
+COLUNAS_RESUMO_DIARIO = (
+    "total_domicilios_visitados", "total_pontos_criticos",
+    "total_criaduros_encontrados", "total_criaduros_eliminados",
+    "total_larvas_encontradas", "total_larvas_coletadas",
+    "total_adultos_coletados", "total_casos_suspeitos",
+)
+
+# Agregação de formularioporcasa para as colunas de resumodiario (mesma ordem)
+_AGREGADOS_FORMULARIO = """
+    COUNT(*),
+    SUM(COALESCE(num_pontos_criticos, 0)),
+    SUM(COALESCE(total_criaduros_encontrados, 0)),
+    SUM(COALESCE(criaduros_eliminados, 0)),
+    SUM(COALESCE(num_locos_larva, 0)),
+    SUM(COALESCE(num_locos_positivos, 0)),
+    SUM(COALESCE(num_adultos_coletados, 0)),
+    SUM(COALESCE(casos_suspeitos, 0))
+"""
+
+_INSERT_RESUMO_DIARIO = "INSERT INTO resumodiario (data, idagente, {colunas})".format(
+    colunas=", ".join(COLUNAS_RESUMO_DIARIO)
+)
+
+# Upsert incremental a partir de uma relação `novos` com as linhas recém
+# inseridas em formularioporcasa (ex.: CTE com INSERT ... RETURNING *).
+# A ordenação por (data, idagente) faz transações concorrentes travarem as
+# linhas do resumo sempre na mesma ordem, evitando deadlocks.
+DELTA_RESUMO_DIARIO = """
+    {insert}
+    SELECT data, idagente, {agregados}
+    FROM novos
+    GROUP BY data, idagente
+    ORDER BY data, idagente
+    ON CONFLICT (data, idagente) DO UPDATE SET {somas}
+""".format(
+    insert=_INSERT_RESUMO_DIARIO,
+    agregados=_AGREGADOS_FORMULARIO,
+    somas=", ".join(f"{c} = resumodiario.{c} + EXCLUDED.{c}" for c in COLUNAS_RESUMO_DIARIO),
+)
+
+
+def recalcular_resumo_diario(cursor, data, idagente):
+    """
+    Reconstrói a linha (data, idagente) de resumodiario a partir de
+    formularioporcasa. Uso restrito a reparos: varre todos os formulários
+    do agente no dia.
+
+    A linha do resumo é criada (se preciso) e travada antes da agregação,
+    então envios concorrentes ou já foram contados aqui ou aplicam seu
+    delta depois, sobre o valor recalculado.
+    """
+    cursor.execute(
+        _INSERT_RESUMO_DIARIO + " VALUES (%s, %s{zeros}) ON CONFLICT (data, idagente) DO NOTHING".format(
+            zeros=", 0" * len(COLUNAS_RESUMO_DIARIO)
+        ),
+        (data, idagente),
+    )
+    cursor.execute(
+        "SELECT 1 FROM resumodiario WHERE data = %s AND idagente = %s FOR UPDATE",
+        (data, idagente),
+    )
+    cursor.execute(
+        """
+        UPDATE resumodiario r SET ({colunas}) = (
+            SELECT {agregados}
+            FROM formularioporcasa f
+            WHERE f.data = %s AND f.idagente = %s
+        )
+        WHERE r.data = %s AND r.idagente = %s
+        RETURNING r.total_domicilios_visitados
+        """.format(colunas=", ".join(COLUNAS_RESUMO_DIARIO), agregados=_AGREGADOS_FORMULARIO),
+        (data, idagente, data, idagente),
+    )
+    total_domicilios = cursor.fetchone()[0]
+    if not total_domicilios:
+        # Nenhum formulário para o agente no dia: o resumo não deve existir
+        cursor.execute(
+            "DELETE FROM resumodiario WHERE data = %s AND idagente = %s",
+            (data, idagente),
+        )
+        return False
+    return True
+
+
+# --- Reprocessamento por intervalo -------------------------------------------
+# Cada nível é reconstruído com um DELETE e um único INSERT ... SELECT
+# agrupado por date_trunc, sem laço por período. Os resumos semanais e
+# mensais vêm de resumodiario (os mensais não passam pelos semanais, já que
+# uma semana pode cair em dois meses).
+
+NIVEIS_RESUMO = ('diario', 'semanal', 'mensal')
+
+_SOMAS_RESUMO_DIARIO = ", ".join(f"SUM({c})" for c in COLUNAS_RESUMO_DIARIO)
+
+
+def _inicio_mes(data):
+    return data.replace(day=1)
+
+
+def _fim_mes(data):
+    return (data.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _meses(inicio, fim):
+    """[(início, fim)] do intervalo cortado nas viradas de mês."""
+    partes = []
+    while inicio <= fim:
+        partes.append((inicio, min(_fim_mes(inicio), fim)))
+        inicio = _fim_mes(inicio) + timedelta(days=1)
+    return partes
+
+
+def reprocessar_diarios(cursor, inicio, fim, sobrescrever=True):
+    """
+    Reconstrói resumodiario de `inicio` a `fim` (inclusive) a partir de
+    formularioporcasa. Com sobrescrever=False só cria as linhas que faltam.
+    Devolve (linhas removidas, linhas gravadas).
+
+    Só as linhas do intervalo são travadas, na ordem (data, idagente) dos
+    upserts de criar_formulario: envios de outras datas seguem livres e os
+    do intervalo esperam e aplicam seu delta sobre o valor reconstruído.
+    Uma linha criada por um envio concorrente pode ser sobrescrita sem o
+    delta dele, mas esse envio marca o par em periodo_sujo e o próximo lote
+    o corrige. reprocessar_resumos chama esta função um mês por transação.
+
+    As versões dos gráficos do intervalo não são incrementadas aqui: quem
+    chama usa invalidar_diarios depois do commit.
+    """
+    if not sobrescrever:
+        cursor.execute(
+            _INSERT_RESUMO_DIARIO + """
+            SELECT data, idagente, {agregados}
+            FROM formularioporcasa
+            WHERE data BETWEEN %s AND %s
+            GROUP BY data, idagente
+            ORDER BY data, idagente
+            ON CONFLICT (data, idagente) DO NOTHING
+            """.format(agregados=_AGREGADOS_FORMULARIO),
+            (inicio, fim),
+        )
+        return 0, cursor.rowcount
+
+    cursor.execute(
+        "SELECT 1 FROM resumodiario WHERE data BETWEEN %s AND %s ORDER BY data, idagente FOR UPDATE",
+        (inicio, fim),
+    )
+    cursor.execute(
+        _INSERT_RESUMO_DIARIO + """
+        SELECT data, idagente, {agregados}
+        FROM formularioporcasa
+        WHERE data BETWEEN %s AND %s
+        GROUP BY data, idagente
+        ORDER BY data, idagente
+        ON CONFLICT (data, idagente) DO UPDATE SET {valores}
+        """.format(agregados=_AGREGADOS_FORMULARIO,
+                   valores=", ".join(f"{c} = EXCLUDED.{c}" for c in COLUNAS_RESUMO_DIARIO)),
+        (inicio, fim),
+    )
+    gravadas = cursor.rowcount
+    # Linhas sem nenhum formulário no intervalo não devem existir
+    cursor.execute(
+        """
+        DELETE FROM resumodiario r
+        WHERE r.data BETWEEN %s AND %s
+          AND NOT EXISTS (
+              SELECT 1 FROM formularioporcasa f WHERE f.data = r.data AND f.idagente = r.idagente
+          )
+        """,
+        (inicio, fim),
+    )
+    return cursor.rowcount, gravadas
+
+
+def invalidar_diarios(conn, inicio, fim):
+    """
+    Incrementa as versões diárias dos gráficos de `inicio` a `fim` em uma
+    transação própria, depois do commit de reprocessar_diarios: na mesma
+    transação, a trava de versao_graficos somada às de resumodiario poderia
+    causar deadlock com os envios do intervalo. Um leitor no intervalo
+    apenas guarda dados novos sob a versão antiga.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cache_graficos.invalidar_intervalo(cursor, 'diario', inicio, fim, '1 day')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def reprocessar_semanais(cursor, inicio, fim):
+    """
+    Reconstrói resumosemanal para todas as semanas (segunda a domingo) que
+    tocam o intervalo. Devolve (linhas removidas, linhas gravadas).
+    """
+    primeira = inicio - timedelta(days=inicio.weekday())
+    ultima = fim - timedelta(days=fim.weekday())
+
+    cursor.execute("LOCK TABLE resumosemanal IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("DELETE FROM resumosemanal WHERE data_inicio BETWEEN %s AND %s", (primeira, ultima))
+    removidas = cursor.rowcount
+    cursor.execute(
+        """
+        INSERT INTO resumosemanal (data_inicio, data_fim, idagente, {colunas})
+        SELECT date_trunc('week', data)::date, date_trunc('week', data)::date + 6, idagente, {somas}
+        FROM resumodiario
+        WHERE data BETWEEN %s AND %s
+        GROUP BY date_trunc('week', data), idagente
+        ORDER BY 1, idagente
+        """.format(colunas=", ".join(COLUNAS_RESUMO_DIARIO), somas=_SOMAS_RESUMO_DIARIO),
+        (primeira, ultima + timedelta(days=6)),
+    )
+    gravadas = cursor.rowcount
+    cache_graficos.invalidar_intervalo(cursor, 'semanal', primeira, ultima, '1 week')
+    return removidas, gravadas
+
+
+def reprocessar_mensais(cursor, inicio, fim):
+    """
+    Reconstrói resumomensal para todos os meses que tocam o intervalo.
+    Devolve (linhas removidas, linhas gravadas).
+    """
+    primeiro = _inicio_mes(inicio)
+    ultimo = _inicio_mes(fim)
+
+    cursor.execute("LOCK TABLE resumomensal IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("DELETE FROM resumomensal WHERE data_inicio BETWEEN %s AND %s", (primeiro, ultimo))
+    removidas = cursor.rowcount
+    cursor.execute(
+        """
+        INSERT INTO resumomensal (data_inicio, data_fim, idagente, {colunas})
+        SELECT date_trunc('month', data)::date,
+               (date_trunc('month', data) + interval '1 month - 1 day')::date,
+               idagente, {somas}
+        FROM resumodiario
+        WHERE data BETWEEN %s AND %s
+        GROUP BY date_trunc('month', data), idagente
+        ORDER BY 1, idagente
+        """.format(colunas=", ".join(f"{c}_mes" for c in COLUNAS_RESUMO_DIARIO), somas=_SOMAS_RESUMO_DIARIO),
+        (primeiro, _fim_mes(ultimo)),
+    )
+    gravadas = cursor.rowcount
+    cache_graficos.invalidar_intervalo(cursor, 'mensal', primeiro, ultimo, '1 month')
+    return removidas, gravadas
+
+
+def atualizar_materializado(cursor, nivel):
+    """
+    Atualiza a view materializada do nível sem bloquear leituras (CONCURRENTLY)
+    e invalida as versões de todos os períodos do nível. Devolve
+    (0, linhas na view), no mesmo formato dos reprocessar_*.
+    """
+    view = VIEWS_MATERIALIZADAS[nivel]
+    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+    # REFRESH não dispara os triggers de versão (ETag das listagens)
+    cursor.execute("SELECT incrementar_versao(%s)", (view,))
+    cache_graficos.invalidar_tipo(cursor, nivel)
+    cursor.execute(f"SELECT COUNT(*) FROM {view}")
+    return 0, cursor.fetchone()[0]
+
+
+def atualizar_materializados(conn, niveis=tuple(VIEWS_MATERIALIZADAS)):
+    """Atualiza as views dos níveis pedidos, uma transação por view."""
+    relatorio = []
+    for nivel in VIEWS_MATERIALIZADAS:
+        if nivel not in niveis:
+            continue
+        comeco = time.monotonic()
+        try:
+            with conn.cursor() as cursor:
+                _, linhas = atualizar_materializado(cursor, nivel)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        relatorio.append({
+            "nivel": nivel,
+            "view": VIEWS_MATERIALIZADAS[nivel],
+            "linhas": linhas,
+            "duracao_ms": round((time.monotonic() - comeco) * 1000),
+        })
+    return relatorio
+
+
+if RESUMOS_MATERIALIZADOS:
+    # As views cobrem todo o histórico: o intervalo não se aplica
+    _REPROCESSADORES = {
+        'diario': reprocessar_diarios,
+        'semanal': lambda cursor, inicio, fim: atualizar_materializado(cursor, 'semanal'),
+        'mensal': lambda cursor, inicio, fim: atualizar_materializado(cursor, 'mensal'),
+    }
+else:
+    _REPROCESSADORES = {
+        'diario': reprocessar_diarios,
+        'semanal': reprocessar_semanais,
+        'mensal': reprocessar_mensais,
+    }
+
+
+def reprocessar_resumos(conn, inicio, fim, niveis=NIVEIS_RESUMO):
+    """
+    Reconstrói os níveis pedidos para o intervalo, sempre na ordem diário ->
+    semanal -> mensal e com uma transação por nível (um nível confirmado não
+    é desfeito se o seguinte falhar). O diário, que os envios dos agentes
+    também atualizam, usa uma transação por mês: um envio espera no máximo
+    um mês de reconstrução, não o intervalo inteiro. Devolve um relatório
+    por nível.
+    """
+    relatorio = []
+    for nivel in NIVEIS_RESUMO:
+        if nivel not in niveis:
+            continue
+        comeco = time.monotonic()
+        removidas = gravadas = 0
+        partes = _meses(inicio, fim) if nivel == 'diario' else [(inicio, fim)]
+        for inicio_parte, fim_parte in partes:
+            try:
+                with conn.cursor() as cursor:
+                    removidas_parte, gravadas_parte = _REPROCESSADORES[nivel](cursor, inicio_parte, fim_parte)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if nivel == 'diario':
+                invalidar_diarios(conn, inicio_parte, fim_parte)
+            removidas += removidas_parte
+            gravadas += gravadas_parte
+        relatorio.append({
+            "nivel": nivel,
+            "linhas_removidas": removidas,
+            "linhas_gravadas": gravadas,
+            "duracao_ms": round((time.monotonic() - comeco) * 1000),
+        })
+    return relatorio
+
+
+# --- Períodos sujos -----------------------------------------------------------
+# Triggers em formularioporcasa (sql/006_periodos_sujos.sql) marcam cada
+# (data, idagente) alterado em periodo_sujo. processar_periodos_sujos refaz
+# só as linhas de resumo dessas marcas: o custo acompanha o volume de
+# escritas, não o tamanho do histórico.
+
+PERIODOS_SUJOS_LOTE = int(os.getenv('PERIODOS_SUJOS_LOTE', 1000))
+
+# Chave de pg_try_advisory_xact_lock: um lote por vez em todo o cluster
+_TRAVA_PERIODOS_SUJOS = 7301520151
+
+_PARES = "unnest(%s::date[], %s::int[])"
+
+
+def _colunas(pares):
+    """[(data, idagente), ...] -> ([datas], [agentes]) para unnest."""
+    return [p[0] for p in pares], [p[1] for p in pares]
+
+
+def _recalcular_diarios(cursor, pares):
+    """
+    Versão em lote de recalcular_resumo_diario para os pares (data,
+    idagente), que devem vir ordenados. Devolve as linhas que continuam
+    existindo.
+
+    As linhas existentes são travadas antes de qualquer escrita, na mesma
+    ordem (data, idagente) em que criar_formulario trava as suas.
+    """
+    datas, agentes = _colunas(pares)
+    cursor.execute(
+        f"""
+        SELECT 1 FROM resumodiario r JOIN {_PARES} AS s(data, idagente)
+            ON r.data = s.data AND r.idagente = s.idagente
+        ORDER BY r.data, r.idagente
+        FOR UPDATE OF r
+        """,
+        (datas, agentes),
+    )
+    # Uma linha criada por um envio concorrente depois da trava pode ser
+    # sobrescrita sem o delta dele, mas esse envio marca o par de novo e o
+    # próximo lote o corrige. O intervalo explícito restringe a leitura às
+    # partições do lote (particoes.py) já no planejamento.
+    cursor.execute(
+        _INSERT_RESUMO_DIARIO + """
+        SELECT s.data, s.idagente, a.*
+        FROM {pares} AS s(data, idagente)
+        CROSS JOIN LATERAL (
+            SELECT {agregados}
+            FROM formularioporcasa f
+            WHERE f.data = s.data AND f.idagente = s.idagente
+              AND f.data BETWEEN %s AND %s
+        ) AS a
+        ORDER BY s.data, s.idagente
+        ON CONFLICT (data, idagente) DO UPDATE SET {valores}
+        """.format(pares=_PARES, agregados=_AGREGADOS_FORMULARIO,
+                   valores=", ".join(f"{c} = EXCLUDED.{c}" for c in COLUNAS_RESUMO_DIARIO)),
+        (datas, agentes, min(datas), max(datas)),
+    )
+    # Pares sem nenhum formulário: o resumo não deve existir
+    cursor.execute(
+        f"""
+        DELETE FROM resumodiario r USING {_PARES} AS s(data, idagente)
+        WHERE r.data = s.data AND r.idagente = s.idagente AND r.total_domicilios_visitados = 0
+        """,
+        (datas, agentes),
+    )
+    return len(pares) - cursor.rowcount
+
+
+def _recalcular_semanais(cursor, pares):
+    """Refaz as linhas (data_inicio, idagente) de resumosemanal. Devolve as gravadas."""
+    datas, agentes = _colunas(pares)
+    cursor.execute("LOCK TABLE resumosemanal IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(
+        """
+        INSERT INTO resumosemanal (data_inicio, data_fim, idagente, {colunas})
+        SELECT s.data_inicio, s.data_inicio + 6, s.idagente, {somas}
+        FROM {pares} AS s(data_inicio, idagente)
+        JOIN resumodiario d ON d.idagente = s.idagente AND d.data BETWEEN s.data_inicio AND s.data_inicio + 6
+        GROUP BY s.data_inicio, s.idagente
+        ORDER BY 1, 3
+        ON CONFLICT (data_inicio, idagente) DO UPDATE SET {valores}
+        """.format(colunas=", ".join(COLUNAS_RESUMO_DIARIO), somas=_SOMAS_RESUMO_DIARIO, pares=_PARES,
+                   valores=", ".join(f"{c} = EXCLUDED.{c}" for c in COLUNAS_RESUMO_DIARIO)),
+        (datas, agentes),
+    )
+    gravadas = cursor.rowcount
+    # Semanas do agente que ficaram sem nenhum resumo diário
+    cursor.execute(
+        f"""
+        DELETE FROM resumosemanal r USING {_PARES} AS s(data_inicio, idagente)
+        WHERE r.data_inicio = s.data_inicio AND r.idagente = s.idagente
+          AND NOT EXISTS (
+              SELECT 1 FROM resumodiario d
+              WHERE d.idagente = s.idagente AND d.data BETWEEN s.data_inicio AND s.data_inicio + 6
+          )
+        """,
+        (datas, agentes),
+    )
+    return gravadas
+
+
+def _recalcular_mensais(cursor, pares):
+    """Refaz as linhas (data_inicio, idagente) de resumomensal. Devolve as gravadas."""
+    datas, agentes = _colunas(pares)
+    cursor.execute("LOCK TABLE resumomensal IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(
+        """
+        INSERT INTO resumomensal (data_inicio, data_fim, idagente, {colunas})
+        SELECT s.data_inicio, (s.data_inicio + interval '1 month - 1 day')::date, s.idagente, {somas}
+        FROM {pares} AS s(data_inicio, idagente)
+        JOIN resumodiario d ON d.idagente = s.idagente
+            AND d.data >= s.data_inicio AND d.data < s.data_inicio + interval '1 month'
+        GROUP BY s.data_inicio, s.idagente
+        ORDER BY 1, 3
+        ON CONFLICT (data_inicio, idagente) DO UPDATE SET {valores}
+        """.format(colunas=", ".join(f"{c}_mes" for c in COLUNAS_RESUMO_DIARIO),
+                   somas=_SOMAS_RESUMO_DIARIO, pares=_PARES,
+                   valores=", ".join(f"{c}_mes = EXCLUDED.{c}_mes" for c in COLUNAS_RESUMO_DIARIO)),
+        (datas, agentes),
+    )
+    gravadas = cursor.rowcount
+    # Meses do agente que ficaram sem nenhum resumo diário
+    cursor.execute(
+        f"""
+        DELETE FROM resumomensal r USING {_PARES} AS s(data_inicio, idagente)
+        WHERE r.data_inicio = s.data_inicio AND r.idagente = s.idagente
+          AND NOT EXISTS (
+              SELECT 1 FROM resumodiario d
+              WHERE d.idagente = s.idagente
+                AND d.data >= s.data_inicio AND d.data < s.data_inicio + interval '1 month'
+          )
+        """,
+        (datas, agentes),
+    )
+    return gravadas
+
+
+def processar_lote_sujo(conn, limite=PERIODOS_SUJOS_LOTE):
+    """
+    Processa até `limite` marcas de periodo_sujo em uma transação: refaz os
+    resumos diários das marcas e, no modo tabela, os semanais e mensais das
+    semanas/meses que as contêm. Devolve a contagem do lote, ou None se
+    outro processo já está processando.
+
+    A ordem de travas é a mesma de criar_formulario (resumodiario, depois
+    periodo_sujo), e uma marca só é removida se a versão lida não mudou: o
+    que for marcado durante o lote é processado no próximo.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (_TRAVA_PERIODOS_SUJOS,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return None
+
+        cursor.execute(
+            "SELECT data, idagente, versao FROM periodo_sujo ORDER BY data, idagente LIMIT %s",
+            (limite,),
+        )
+        marcas = cursor.fetchall()
+        if not marcas:
+            conn.rollback()
+            return {"periodos": 0, "diarios": 0, "semanais": 0, "mensais": 0}
+
+        pares = [(data, idagente) for data, idagente, _ in marcas]
+        semanas = sorted({(data - timedelta(days=data.weekday()), idagente) for data, idagente in pares})
+        meses = sorted({(_inicio_mes(data), idagente) for data, idagente in pares})
+
+        lote = {"periodos": len(marcas), "diarios": _recalcular_diarios(cursor, pares),
+                "semanais": 0, "mensais": 0}
+        if not RESUMOS_MATERIALIZADOS:
+            lote["semanais"] = _recalcular_semanais(cursor, semanas)
+            lote["mensais"] = _recalcular_mensais(cursor, meses)
+
+        cursor.execute(
+            """
+            DELETE FROM periodo_sujo p
+            USING unnest(%s::date[], %s::int[], %s::bigint[]) AS s(data, idagente, versao)
+            WHERE p.data = s.data AND p.idagente = s.idagente AND p.versao = s.versao
+            """,
+            ([m[0] for m in marcas], [m[1] for m in marcas], [m[2] for m in marcas]),
+        )
+    conn.commit()
+
+    # As versões dos gráficos são incrementadas depois do commit, como em
+    # criar_formulario e reprocessar_resumos: a linha de versao_graficos de
+    # um período é disputada por todos os envios, e travá-la junto com
+    # resumodiario seguraria esses envios até o fim do lote (ou causaria
+    # deadlock).
+    # Um leitor no intervalo apenas guarda dados novos sob a versão antiga.
+    try:
+        with conn.cursor() as cursor:
+            cache_graficos.invalidar_periodos(cursor, 'diario', [data for data, _ in pares])
+            if not RESUMOS_MATERIALIZADOS:
+                cache_graficos.invalidar_periodos(cursor, 'semanal', [inicio for inicio, _ in semanas])
+                cache_graficos.invalidar_periodos(cursor, 'mensal', [inicio for inicio, _ in meses])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return lote
+
+
+def processar_periodos_sujos(conn, limite=PERIODOS_SUJOS_LOTE, max_lotes=None):
+    """
+    Processa lotes de periodo_sujo até esvaziar a tabela (ou `max_lotes`).
+    No modo materializado, atualiza as views uma vez ao final se algo mudou.
+    Devolve o relatório com os totais e as marcas restantes.
+    """
+    comeco = time.monotonic()
+    relatorio = {"periodos": 0, "diarios": 0, "semanais": 0, "mensais": 0, "lotes": 0,
+                 "em_andamento": False}
+    while max_lotes is None or relatorio["lotes"] < max_lotes:
+        try:
+            lote = processar_lote_sujo(conn, limite)
+        except Exception:
+            conn.rollback()
+            raise
+        if lote is None:
+            relatorio["em_andamento"] = True
+            break
+        if not lote["periodos"]:
+            break
+        relatorio["lotes"] += 1
+        for campo in ("periodos", "diarios", "semanais", "mensais"):
+            relatorio[campo] += lote[campo]
+        if lote["periodos"] < limite:
+            break
+
+    if RESUMOS_MATERIALIZADOS and relatorio["periodos"]:
+        relatorio["materializados"] = atualizar_materializados(conn)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM periodo_sujo")
+        relatorio["restantes"] = cursor.fetchone()[0]
+    conn.commit()
+    relatorio["duracao_ms"] = round((time.monotonic() - comeco) * 1000)
+    return relatorio
@@ -3,43 +3,79 @@ from flask_cors import CORS
 from routes.usuarios import usuarios_bp
 from routes.formularios import formularios_bp
 from routes.resumos import resumos_bp
-from database import get_connection
+from routes.sincronizacao import sincronizacao_bp
+from routes.perfil import perfil_bp
+from database import connection, pool_stats
+from serializacao import ProvedorJSON
+from comandos import registrar_comandos
+from agendador import garantir_agendador
+import metricas
+import perfilador
 
 app = Flask(__name__)
 
+# JSON via orjson (datas, horas e Decimal sem conversões nas rotas)
+app.json = ProvedorJSON(app)
+
 # Evita redirects automáticos por trailing slash (/rota -> /rota/)
 app.url_map.strict_slashes = False
 
-# Configura CORS explicitamente (permitir seu frontend)
+# Configura CORS explicitamente (permitir seu frontend). O modo assíncrono
+# (asgi.py) aplica a mesma configuração às rotas que atende.
+CORS_ORIGENS = ["http://localhost:5173"]  # ajuste se precisar de mais origins
+CORS_CABECALHOS = ["Content-Type", "Authorization", "Accept", "X-Requested-With"]
+CORS_METODOS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 CORS(
     app,
-    origins=["http://localhost:5173"],  # ajuste se precisar de mais origins
+    origins=CORS_ORIGENS,
     supports_credentials=True,
-    allow_headers=["Content-Type", "Authorization", "Accept", "X-Requested-With"],
-    methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_headers=CORS_CABECALHOS,
+    methods=CORS_METODOS,
 )
 
+# Latência, status e tempo de banco por rota; GET /metrics (Prometheus) e
+# perfil das consultas (lentas, N+1, Server-Timing). Registrados antes dos
+# demais before_request para medir todas as requisições
+metricas.instrumentar_flask(app)
+perfilador.instrumentar_flask(app)
+
 # Opcional: responder rapidamente a OPTIONS antes de qualquer outro middleware
 @app.before_request
 def handle_options():
     if request.method == "OPTIONS":
         return ("", 200)
 
+# Agendador de resumos: cada worker inicia o seu na primeira requisição
+# (depois do fork); só o líder eleito no banco executa as tarefas
+@app.before_request
+def iniciar_agendador():
+    garantir_agendador(app)
+
 # Health-check rápido
 @app.route("/health", methods=["GET"])
 def health():
-    conn = get_connection()
-    if conn is None:
-        return jsonify({"healthy": False, "db": False}), 500
-    try:
-        conn.close()
-        return jsonify({"healthy": True, "db": True}), 200
-    except Exception:
-        return jsonify({"healthy": True, "db": False}), 500
+    with connection() as conn:
+        if conn is None:
+            return jsonify({"healthy": False, "db": False, "pool": pool_stats()}), 500
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return jsonify({"healthy": True, "db": True, "pool": pool_stats()}), 200
+        except Exception:
+            return jsonify({"healthy": True, "db": False, "pool": pool_stats()}), 500
+
+# Estatísticas do pool de conexões deste worker (para dimensionar DB_POOL_MAX)
+@app.route("/health/pool", methods=["GET"])
+def health_pool():
+    return jsonify({"success": True, "data": pool_stats()}), 200
 
 app.register_blueprint(usuarios_bp, url_prefix="/usuarios")
 app.register_blueprint(formularios_bp, url_prefix="/formularios")
 app.register_blueprint(resumos_bp, url_prefix="/resumos")
+app.register_blueprint(sincronizacao_bp, url_prefix="/sync")
+app.register_blueprint(perfil_bp, url_prefix="/perfil")
+
+registrar_comandos(app)
 
 @app.route("/")
 def home():
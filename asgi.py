@@ -0,0 +1,399 @@
+"""
+Modo assíncrono (ASGI) opcional para as rotas de leitura:
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+
+As rotas GET de usuários, formulários e resumos (listagens, gráficos em
+JSON e status dos jobs) rodam aqui sobre asyncpg: enquanto uma consulta
+espera o banco, o mesmo processo atende outras requisições, então um único
+processo segura centenas de conexões de painel. Todo o resto (escritas,
+imagens, exportações, /sync) é repassado ao app Flask, executado em threads
+(ASGI_WSGI_THREADS), de modo que o processo serve a API inteira.
+
+Os contratos JSON são os mesmos do app Flask: as rotas usam as mesmas
+consultas, validações, serialização (serializacao.para_json), ETags
+(cache_http) e cache de gráficos (cache_graficos).
+"""
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+import cache_graficos
+import database_async
+import metricas
+import perfilador
+import renderizacao
+from agendador import garantir_agendador
+from agregacao import TABELA_MENSAL, TABELA_SEMANAL
+from app import CORS_CABECALHOS, CORS_METODOS, CORS_ORIGENS, app as app_flask
+from cache_http import SQL_VERSOES, VERSAO_FORMATO, combinar_versoes, nao_modificado
+from database_async import sql_asyncpg
+from routes.formularios import (
+    LIMITE_MAXIMO, LINHAS_POR_LOTE_STREAM, SQL_OBTER_FORMULARIO, SQL_RESUMO_DIARIO,
+    codificar_cursor, consulta_listagem, ler_parametros_listagem,
+)
+from routes.resumos import RESPOSTAS_GRAFICOS, SQL_GRAFICOS
+from serializacao import para_json
+
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 10))
+
+
+class RespostaJSON(Response):
+    """JSON com a mesma serialização (e a mesma quebra de linha final) do app Flask."""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return para_json(content) + b"\n"
+
+
+def _json(corpo, status=200):
+    return RespostaJSON(corpo, status_code=status)
+
+
+def _erro_conexao():
+    return _json({"success": False, "erro": "Erro ao conectar ao banco"}, 500)
+
+
+def _dicts(registros):
+    return [dict(registro) for registro in registros]
+
+
+def condicional(*tabelas):
+    """Equivalente assíncrono de cache_http.condicional."""
+    def decorador(view):
+        @wraps(view)
+        async def envolvida(request):
+            if request.method != "GET":
+                return await view(request)
+
+            # A view recebe esta mesma conexão nos seus blocos connection()
+            async with database_async.conexao_compartilhada() as conn:
+                if conn is None:
+                    return await view(request)
+                try:
+                    linhas = await conn.fetch(sql_asyncpg(SQL_VERSOES), list(tabelas))
+                except Exception as e:
+                    print(f"Aviso: não foi possível ler versao_tabela: {e}")
+                    return await view(request)
+
+                etag, ultima_alteracao = combinar_versoes(linhas, tabelas)
+                if nao_modificado(
+                    etag, ultima_alteracao,
+                    parse_etags(request.headers.get("if-none-match")),
+                    parse_date(request.headers.get("if-modified-since")),
+                ):
+                    resposta = Response(status_code=304)
+                else:
+                    resposta = await view(request)
+                    if resposta.status_code != 200:
+                        return resposta
+
+            resposta.headers["ETag"] = quote_etag(etag)
+            if ultima_alteracao is not None:
+                resposta.headers["Last-Modified"] = http_date(ultima_alteracao)
+            resposta.headers["Cache-Control"] = "no-cache"
+            return resposta
+        return envolvida
+    return decorador
+
+
+async def _listar(sql, mensagem_erro, *args):
+    """Resposta {"success", "data"} com todas as linhas da consulta."""
+    async with database_async.connection() as conn:
+        if conn is None:
+            return _erro_conexao()
+        try:
+            linhas = await conn.fetch(sql_asyncpg(sql), *args)
+        except Exception as e:
+            return _json({"success": False, "erro": f"{mensagem_erro}: {str(e)}"}, 500)
+    return _json({"success": True, "data": _dicts(linhas)})
+
+
+async def _obter(sql, chave, nao_encontrado, mensagem_erro):
+    """Resposta com uma linha pela chave, ou 404."""
+    async with database_async.connection() as conn:
+        if conn is None:
+            return _erro_conexao()
+        try:
+            linha = await conn.fetchrow(sql_asyncpg(sql), chave)
+        except Exception as e:
+            return _json({"success": False, "erro": f"{mensagem_erro}: {str(e)}"}, 500)
+    if linha:
+        return _json({"success": True, "data": dict(linha)})
+    return _json({"success": False, "erro": nao_encontrado}, 404)
+
+
+# --- Saúde -------------------------------------------------------------------
+
+async def health(request):
+    async with database_async.connection() as conn:
+        if conn is None:
+            return _json({"healthy": False, "db": False, "pool": database_async.pool_stats()}, 500)
+        try:
+            await conn.fetchval("SELECT 1")
+            return _json({"healthy": True, "db": True, "pool": database_async.pool_stats()})
+        except Exception:
+            return _json({"healthy": True, "db": False, "pool": database_async.pool_stats()}, 500)
+
+
+async def health_pool(request):
+    return _json({"success": True, "data": database_async.pool_stats()})
+
+
+# --- Usuários ----------------------------------------------------------------
+
+@condicional("usuario")
+async def listar_usuarios(request):
+    return await _listar("SELECT * FROM usuario;", "Erro ao listar usuários")
+
+
+@condicional("usuario")
+async def obter_usuario(request):
+    return await _obter("SELECT * FROM usuario WHERE idusuario = %s;", request.path_params["id_usuario"],
+                        "Usuário não encontrado", "Erro ao obter usuário")
+
+
+# --- Formulários -------------------------------------------------------------
+
+async def _stream_formularios(conn, sql, params, formato):
+    """Linhas de um cursor no servidor, com a conexão emprestada até o fim."""
+    try:
+        async with conn.transaction():
+            cursor = conn.cursor(sql_asyncpg(sql), *params, prefetch=LINHAS_POR_LOTE_STREAM)
+            if formato == "ndjson":
+                async for formulario in cursor:
+                    yield para_json(dict(formulario)) + b"\n"
+            else:
+                yield b'{"success": true, "data": ['
+                separador = b""
+                async for formulario in cursor:
+                    yield separador + para_json(dict(formulario))
+                    separador = b","
+                yield b"]}"
+    finally:
+        await database_async.devolver(conn)
+
+
+@condicional("formularioporcasa", "agente")
+async def listar_formularios(request):
+    limite, posicao, formato, filtros, erros_campo = ler_parametros_listagem(request.query_params)
+    if erros_campo:
+        return _json({"success": False, "errors": erros_campo}, 400)
+
+    if formato in ("ndjson", "stream"):
+        conn = await database_async.emprestar()
+        if conn is None:
+            return _erro_conexao()
+        sql, params = consulta_listagem(posicao, limite, filtros)
+        return StreamingResponse(
+            _stream_formularios(conn, sql, params, formato),
+            media_type="application/x-ndjson" if formato == "ndjson" else "application/json",
+        )
+
+    paginado = limite is not None or posicao is not None
+    if paginado:
+        limite = limite or LIMITE_MAXIMO
+        # Busca uma linha a mais para saber se existe próxima página
+        sql, params = consulta_listagem(posicao, limite + 1, filtros)
+    else:
+        sql, params = consulta_listagem(filtros=filtros)
+
+    async with database_async.connection() as conn:
+        if conn is None:
+            return _erro_conexao()
+        try:
+            formularios = _dicts(await conn.fetch(sql_asyncpg(sql), *params))
+        except Exception as e:
+            return _json({"success": False, "erro": f"Erro ao listar formulários: {str(e)}"}, 500)
+
+    if not paginado:
+        return _json({"success": True, "data": formularios})
+
+    proximo_cursor = None
+    if len(formularios) > limite:
+        formularios = formularios[:limite]
+        ultimo = formularios[-1]
+        proximo_cursor = codificar_cursor(ultimo['data'], ultimo['idboletimdiario'])
+
+    return _json({"success": True, "data": formularios, "proximo_cursor": proximo_cursor})
+
+
+async def obter_formulario(request):
+    return await _obter(SQL_OBTER_FORMULARIO, request.path_params["id_formulario"],
+                        "Formulário não encontrado", "Erro ao obter formulário")
+
+
+@condicional("formularioporcasa")
+async def resumo_diario_formularios(request):
+    return await _listar(SQL_RESUMO_DIARIO, "Erro ao buscar resumo diário")
+
+
+# --- Resumos -----------------------------------------------------------------
+
+@condicional("resumodiario")
+async def resumos_diarios(request):
+    return await _listar("SELECT * FROM resumodiario ORDER BY data DESC;", "Erro ao buscar resumos diários")
+
+
+@condicional(TABELA_SEMANAL)
+async def resumos_semanais(request):
+    return await _listar(f"SELECT * FROM {TABELA_SEMANAL} ORDER BY data_inicio DESC;",
+                         "Erro ao buscar resumos semanais")
+
+
+@condicional(TABELA_MENSAL)
+async def resumos_mensais(request):
+    return await _listar(f"SELECT * FROM {TABELA_MENSAL} ORDER BY data_inicio DESC;",
+                         "Erro ao buscar resumos mensais")
+
+
+async def _resposta_grafico(request, tipo, erro_sem_dados, erro_geracao):
+    """Equivalente assíncrono de routes.resumos._resposta_grafico."""
+    try:
+        periodo = datetime.strptime(request.path_params["data"], '%Y-%m-%d').date()
+    except ValueError:
+        return _json({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}, 400)
+
+    async with database_async.connection() as conn:
+        if conn is None:
+            return _erro_conexao()
+        try:
+            # O asyncpg envia date.max como 'infinity' (TODOS_OS_PERIODOS)
+            versao = await conn.fetchval(sql_asyncpg(cache_graficos.SQL_VERSAO_PERIODO), tipo, periodo, date.max)
+            etag = f"{VERSAO_FORMATO}-{versao}"
+            cabecalhos = {"ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+            if parse_etags(request.headers.get("if-none-match")).contains(etag):
+                return Response(status_code=304, headers=cabecalhos)
+
+            chave = cache_graficos.chave_grafico(tipo, periodo, versao)
+            corpo = cache_graficos.obter(chave)
+            if corpo is None:
+                linhas = await conn.fetch(sql_asyncpg(SQL_GRAFICOS[tipo]), periodo)
+                if not linhas:
+                    return _json({"success": False, "erro": erro_sem_dados}, 404)
+                # Montar as figuras é CPU (e a primeira vez carrega o template
+                # do Plotly): fora do loop de eventos
+                with metricas.medir('render_duracao_segundos', tipo=tipo, formato='json'):
+                    dados = await run_in_threadpool(RESPOSTAS_GRAFICOS[tipo], periodo, _dicts(linhas))
+                corpo = para_json(dados)
+                cache_graficos.guardar(chave, corpo)
+        except Exception as e:
+            return _json({"success": False, "erro": f"{erro_geracao}: {str(e)}"}, 500)
+
+    return Response(corpo, media_type="application/json", headers=cabecalhos)
+
+
+async def grafico_diarios(request):
+    return await _resposta_grafico(request, 'diario', "Nenhum dado encontrado para esta data",
+                                   "Erro ao gerar gráficos")
+
+
+async def grafico_semanais(request):
+    return await _resposta_grafico(request, 'semanal', "Nenhum dado encontrado para esta semana",
+                                   "Erro ao gerar gráficos semanais")
+
+
+async def grafico_mensais(request):
+    return await _resposta_grafico(request, 'mensal', "Nenhum dado encontrado para este mês",
+                                   "Erro ao gerar gráficos mensais")
+
+
+async def status_job_grafico(request):
+    """Estado do job. Com ?aguardar=N (até 30s) espera o job terminar (long-poll)."""
+    job_id = request.path_params["job_id"]
+    try:
+        aguardar = renderizacao.ler_aguardar(request.query_params.get('aguardar', 0))
+    except ValueError:
+        return _json({"success": False, "erro": "Parâmetro 'aguardar' inválido"}, 400)
+
+    if aguardar:
+        status = await run_in_threadpool(renderizacao.aguardar_job, job_id, aguardar)
+    else:
+        status = renderizacao.status_job(job_id)
+    if status is None:
+        return _json({"success": False, "erro": "Job não encontrado"}, 404)
+    return _json({"success": True, "data": status})
+
+
+# --- Aplicação ---------------------------------------------------------------
+
+def _rota(caminho, funcao):
+    """
+    Rota GET com o mesmo CORS do app Flask (só nas rotas atendidas aqui) e
+    as mesmas métricas e o mesmo perfil de consultas por rota
+    (metricas.instrumentar_flask, perfilador.instrumentar_flask).
+    """
+    # Rótulo no formato das regras do Flask ({id:int} -> <int:id>), para que
+    # as séries sejam as mesmas nos dois modos
+    rotulo = re.sub(r'\{(\w+)(?::(\w+))?\}', lambda m: f"<{m[2] + ':' if m[2] else ''}{m[1]}>", caminho)
+
+    async def atender(request):
+        inicio = metricas.iniciar_requisicao()
+        perfil = perfilador.iniciar(rotulo)
+        status = 500
+        try:
+            # Como o before_request do app Flask: OPTIONS responde vazio
+            if request.method == "OPTIONS":
+                resposta = Response(status_code=200)
+            else:
+                resposta = await funcao(request)
+            status = resposta.status_code
+            if perfil is not None:
+                resposta.headers.append("Server-Timing", perfilador.atual().server_timing())
+            return resposta
+        finally:
+            perfilador.finalizar(perfil)
+            metricas.finalizar_requisicao(inicio, rotulo, request.method, status)
+
+    endpoint = CORSMiddleware(
+        request_response(atender),
+        allow_origins=CORS_ORIGENS,
+        allow_credentials=True,
+        allow_headers=CORS_CABECALHOS,
+        allow_methods=CORS_METODOS,
+    )
+    return Route(caminho, endpoint, methods=["GET", "OPTIONS"])
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(app):
+    await database_async.criar_pool()
+    garantir_agendador(app_flask)
+    try:
+        yield
+    finally:
+        await database_async.fechar_pool()
+
+
+app = Starlette(
+    routes=[
+        _rota("/health", health),
+        _rota("/health/pool", health_pool),
+        _rota("/usuarios", listar_usuarios),
+        _rota("/usuarios/{id_usuario:int}", obter_usuario),
+        _rota("/formularios", listar_formularios),
+        _rota("/formularios/resumo/diario", resumo_diario_formularios),
+        _rota("/formularios/{id_formulario:int}", obter_formulario),
+        _rota("/resumos/diarios", resumos_diarios),
+        _rota("/resumos/semanais", resumos_semanais),
+        _rota("/resumos/mensais", resumos_mensais),
+        _rota("/resumos/graficos/diarios/{data}", grafico_diarios),
+        _rota("/resumos/graficos/semanais/{data}", grafico_semanais),
+        _rota("/resumos/graficos/mensais/{data}", grafico_mensais),
+        _rota("/resumos/graficos/jobs/{job_id}", status_job_grafico),
+        # Qualquer outra rota (e métodos além de GET) vai para o app Flask
+        Mount("/", WSGIMiddleware(app_flask, workers=ASGI_WSGI_THREADS)),
+    ],
+    lifespan=_ciclo_de_vida,
+)
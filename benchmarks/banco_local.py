@@ -0,0 +1,129 @@
+"""
+PostgreSQL descartável para benchmarks: initdb em um diretório temporário,
+pg_ctl start com socket Unix no mesmo diretório (sem porta TCP), as
+migrações de sql/ (migracoes.py) e dados sintéticos determinísticos
+(gerar_dados.py).
+
+    with PostgresLocal() as pg:
+        aplicar_esquema(pg.dsn)
+        popular(pg.dsn, agentes=30, formularios=50000, dias=90)
+
+Os binários são procurados em --pg-bin / PG_BIN, no PATH e em
+`pg_config --bindir`. O PostgreSQL não roda como root.
+
+Os testes (tests/conftest.py) usam o mesmo servidor descartável.
+"""
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import psycopg2
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+DATA_INICIAL = date(2025, 1, 6)  # uma segunda-feira
+
+
+def encontrar_binarios(pg_bin=None):
+    """Diretório com initdb e pg_ctl."""
+    candidatos = [pg_bin, os.getenv('PG_BIN')]
+    if shutil.which('pg_ctl'):
+        candidatos.append(os.path.dirname(shutil.which('pg_ctl')))
+    if shutil.which('pg_config'):
+        saida = subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True)
+        candidatos.append(saida.stdout.strip())
+    candidatos += sorted(glob.glob('/usr/lib/postgresql/*/bin'), reverse=True)
+    for diretorio in candidatos:
+        if diretorio and os.path.exists(os.path.join(diretorio, 'pg_ctl')):
+            return diretorio
+    raise RuntimeError("initdb/pg_ctl não encontrados: instale o PostgreSQL ou use --pg-bin")
+
+
+class PostgresLocal:
+    """Servidor temporário; apagado ao sair do bloco `with`."""
+
+    def __init__(self, pg_bin=None, fsync=True, max_conexoes=200, banco='entomotrack'):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise RuntimeError("O PostgreSQL não roda como root: use um usuário comum ou --dsn")
+        self.bin = encontrar_binarios(pg_bin)
+        self.fsync = fsync
+        self.max_conexoes = max_conexoes
+        self.banco = banco
+        self.diretorio = None
+
+    @property
+    def dsn(self):
+        return f"postgresql:///{self.banco}?host={self.diretorio}&port=5432&user=postgres"
+
+    def _executar(self, *args):
+        subprocess.run([os.path.join(self.bin, args[0]), *args[1:]], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def iniciar(self):
+        self.diretorio = tempfile.mkdtemp(prefix='entomotrack-pg-')
+        dados = os.path.join(self.diretorio, 'dados')
+        self._executar('initdb', '-D', dados, '-U', 'postgres', '-A', 'trust', '-E', 'UTF8', '--no-locale')
+        opcoes = [
+            "-c listen_addresses=''",
+            f"-c unix_socket_directories='{self.diretorio}'",
+            '-p 5432',
+            f'-c max_connections={self.max_conexoes}',
+            '-c shared_buffers=128MB',
+        ]
+        if not self.fsync:
+            # Só para medir o app sem o custo de disco: não compare com produção
+            opcoes += ['-c fsync=off', '-c synchronous_commit=off', '-c full_page_writes=off']
+        self._executar('pg_ctl', '-D', dados, '-o', ' '.join(opcoes),
+                       '-l', os.path.join(self.diretorio, 'postgres.log'), '-w', 'start')
+
+        conn = psycopg2.connect(self.dsn.replace(f'/{self.banco}?', '/postgres?'))
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'CREATE DATABASE {self.banco}')
+        conn.close()
+        return self
+
+    def parar(self):
+        if self.diretorio is None:
+            return
+        try:
+            self._executar('pg_ctl', '-D', os.path.join(self.diretorio, 'dados'), '-m', 'immediate', '-w', 'stop')
+        except subprocess.CalledProcessError:
+            pass
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        self.diretorio = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+def aplicar_esquema(dsn):
+    """Aplica as migrações de sql/, como `flask migrar`. Devolve os nomes aplicados."""
+    from migracoes import migrar
+
+    conn = psycopg2.connect(dsn)
+    try:
+        return [item['nome'] for item in migrar(conn, progresso=lambda mensagem: None)]
+    finally:
+        conn.close()
+
+
+def popular(dsn, agentes=30, formularios=50000, dias=90, semente=42):
+    """
+    Dados sintéticos de benchmarks/gerar_dados.py a partir de DATA_INICIAL,
+    com os resumos já calculados. Devolve (primeiro dia, último dia).
+    """
+    from gerar_dados import gerar
+
+    gerar(dsn, agentes=agentes, bairros=max(5, agentes // 5), formularios=formularios,
+          inicio=DATA_INICIAL, dias=dias, semente=semente, progresso=lambda mensagem: None)
+    return DATA_INICIAL, DATA_INICIAL + timedelta(days=dias - 1)
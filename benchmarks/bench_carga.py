@@ -0,0 +1,428 @@
+"""
+Teste de carga dos endpoints principais contra um PostgreSQL descartável.
+
+Sobe um PostgreSQL temporário (benchmarks/banco_local.py), cria o esquema,
+popula com dados determinísticos, inicia o servidor (gunicorn com
+gunicorn.conf.py ou uvicorn asgi:app) e mede, para cada cenário e
+concorrência, vazão e latências p50/p95/p99. O resultado sai em JSON para
+comparar commits.
+
+Uso (na raiz do projeto, com um usuário que não seja root):
+    python benchmarks/bench_carga.py --saida antes.json
+    git checkout outra-branch
+    python benchmarks/bench_carga.py --saida depois.json --comparar antes.json
+
+    python benchmarks/bench_carga.py --cenarios listar,grafico_json --concorrencia 1,8,32
+    python benchmarks/bench_carga.py --dsn "$DATABASE_URL"          # banco existente (vazio)
+    python benchmarks/bench_carga.py --url http://localhost:5000 --sem-popular
+    python benchmarks/bench_carga.py --entrada depois.json --comparar antes.json
+
+Cenários:
+  criar_formulario   POST /formularios (um formulário com chave de idempotência)
+  listar             GET /formularios?limite=100, seguindo o proximo_cursor
+  resumo_diario      GET /formularios/resumo/diario
+  gerar_semanais     POST /resumos/gerar-semanais de uma semana aleatória
+  grafico_json       GET /resumos/graficos/diarios/<data> (cache do gráfico ligado)
+  grafico_png        GET /resumos/graficos/diarios/<data>/imagem?assincrono=1, que
+                     cria o job (202), alternado com o long-poll do job (requer Kaleido)
+
+A carga é gerada por threads deste processo (uma conexão keep-alive cada);
+em máquinas com poucos núcleos o gerador disputa CPU com o servidor, então
+compare apenas resultados obtidos na mesma máquina. Sai com código 1 se a
+comparação encontrar regressão acima da tolerância.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from banco_local import DATA_INICIAL, RAIZ, PostgresLocal, aplicar_esquema, popular  # noqa: E402
+
+VERSAO_RESULTADO = 1
+
+
+# --- Cenários ---------------------------------------------------------------------
+
+class Contexto:
+    """Parâmetros dos dados populados, compartilhados pelos cenários."""
+
+    def __init__(self, inicio, fim, agentes):
+        self.inicio = inicio
+        self.fim = fim
+        self.agentes = agentes
+
+    def dia(self, aleatorio):
+        return self.inicio + timedelta(days=aleatorio.randint(0, (self.fim - self.inicio).days))
+
+
+def criar_formulario(ctx, aleatorio, estado):
+    corpo = {
+        "data": ctx.dia(aleatorio).isoformat(),
+        "idagente": aleatorio.randint(1, ctx.agentes),
+        "tipo_inseto": aleatorio.choice(['aedes', 'culex', 'barbeiro']),
+        "bairro": "Centro",
+        "endereco": f"Rua {aleatorio.randint(1, 300)}, {aleatorio.randint(1, 2000)}",
+        "hora_inicio": "08:00",
+        "hora_saida": "08:20",
+        "num_pontos_criticos": aleatorio.randint(0, 3),
+        "total_criaduros_encontrados": aleatorio.randint(0, 9),
+        "criaduros_eliminados": aleatorio.randint(0, 7),
+        "casos_suspeitos": aleatorio.randint(0, 1),
+        "chave_idempotencia": uuid.UUID(int=aleatorio.getrandbits(128)).hex,
+    }
+    return 'POST', '/formularios', corpo
+
+
+def listar(ctx, aleatorio, estado):
+    # Cada thread percorre as páginas; o cursor da resposta anterior fica no estado
+    cursor = estado.get('cursor')
+    return 'GET', '/formularios?limite=100' + (f'&cursor={cursor}' if cursor else ''), None
+
+
+def _apos_listar(estado, corpo):
+    try:
+        estado['cursor'] = json.loads(corpo).get('proximo_cursor')
+    except ValueError:
+        estado['cursor'] = None
+
+
+def resumo_diario(ctx, aleatorio, estado):
+    return 'GET', '/formularios/resumo/diario', None
+
+
+def gerar_semanais(ctx, aleatorio, estado):
+    return 'POST', '/resumos/gerar-semanais', {"data_referencia": ctx.dia(aleatorio).isoformat()}
+
+
+def grafico_json(ctx, aleatorio, estado):
+    return 'GET', f'/resumos/graficos/diarios/{ctx.dia(aleatorio).isoformat()}', None
+
+
+def grafico_png(ctx, aleatorio, estado):
+    # Espera o job criado na iteração anterior ou cria outro
+    status_url = estado.pop('status_url', None)
+    if status_url:
+        estado['aguardando'] = status_url
+        return 'GET', status_url + '?aguardar=30', None
+    return 'GET', f'/resumos/graficos/diarios/{ctx.dia(aleatorio).isoformat()}/imagem?assincrono=1', None
+
+
+def _apos_grafico_png(estado, corpo):
+    try:
+        resposta = json.loads(corpo)
+    except ValueError:
+        return
+    if 'status_url' in resposta:
+        estado['status_url'] = resposta['status_url']
+    elif resposta.get('data', {}).get('status') in ('pendente', 'executando'):
+        estado['status_url'] = estado.get('aguardando')
+
+
+CENARIOS = {
+    'criar_formulario': (criar_formulario, None),
+    'listar': (listar, _apos_listar),
+    'resumo_diario': (resumo_diario, None),
+    'gerar_semanais': (gerar_semanais, None),
+    'grafico_json': (grafico_json, None),
+    'grafico_png': (grafico_png, _apos_grafico_png),
+}
+
+
+# --- Geração de carga -------------------------------------------------------------
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return None
+    # Método do posto mais próximo
+    indice = min(len(ordenadas) - 1, max(0, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3) if segundos is not None else None
+
+
+def _trabalhador(url, cenario, ctx, semente, parar, medir, medidas):
+    gerar, depois = CENARIOS[cenario]
+    aleatorio = random.Random(semente)
+    estado = {}
+    alvo = urlsplit(url)
+    conexao = None
+    while not parar.is_set():
+        metodo, caminho, corpo = gerar(ctx, aleatorio, estado)
+        cabecalhos = {}
+        dados = None
+        if corpo is not None:
+            dados = json.dumps(corpo).encode()
+            cabecalhos['Content-Type'] = 'application/json'
+        inicio = time.perf_counter()
+        while True:
+            reutilizada = conexao is not None
+            try:
+                if conexao is None:
+                    conexao = http.client.HTTPConnection(alvo.hostname, alvo.port, timeout=120)
+                conexao.request(metodo, caminho, body=dados, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                conteudo = resposta.read()
+                status = resposta.status
+                break
+            except (OSError, http.client.HTTPException):
+                conexao.close()
+                conexao = None
+                # Conexão keep-alive fechada pelo servidor (ex.: worker reciclado
+                # pelo max_requests): como um navegador, tenta de novo em uma nova
+                if not reutilizada:
+                    conteudo, status = b'', 0
+                    break
+        duracao = time.perf_counter() - inicio
+        if depois is not None and 200 <= status < 300:
+            depois(estado, conteudo)
+        if medir.is_set():
+            medidas.append((duracao, status))
+    if conexao is not None:
+        conexao.close()
+
+
+def executar_cenario(url, cenario, ctx, concorrencia, duracao, aquecimento, semente):
+    parar = threading.Event()
+    medir = threading.Event()
+    # list.append é atômico: cada thread anexa sem lock
+    medidas = []
+    threads = [
+        # Semente por thread e rodada: as chaves de idempotência não se repetem entre rodadas
+        threading.Thread(target=_trabalhador, args=(url, cenario, ctx, f'{semente}:{cenario}:{concorrencia}:{i}',
+                                                    parar, medir, medidas), daemon=True)
+        for i in range(concorrencia)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(aquecimento)
+    medir.set()
+    inicio = time.perf_counter()
+    time.sleep(duracao)
+    medir.clear()
+    decorrido = time.perf_counter() - inicio
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    latencias = sorted(d for d, _ in medidas)
+    status = {}
+    for _, codigo in medidas:
+        status[codigo] = status.get(codigo, 0) + 1
+    # 0 = falha de conexão ou timeout
+    erros = sum(n for codigo, n in status.items() if codigo == 0 or codigo >= 500)
+    return {
+        "cenario": cenario,
+        "concorrencia": concorrencia,
+        "requisicoes": len(medidas),
+        "erros": erros,
+        "status": {str(codigo): n for codigo, n in sorted(status.items())},
+        "duracao_s": round(decorrido, 3),
+        "rps": round(len(medidas) / decorrido, 2),
+        "p50_ms": _ms(_percentil(latencias, 50)),
+        "p95_ms": _ms(_percentil(latencias, 95)),
+        "p99_ms": _ms(_percentil(latencias, 99)),
+        "max_ms": _ms(latencias[-1] if latencias else None),
+        "media_ms": _ms(sum(latencias) / len(latencias) if latencias else None),
+    }
+
+
+# --- Servidor ---------------------------------------------------------------------
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(tipo, dsn, log):
+    porta = _porta_livre()
+    ambiente = dict(os.environ, DATABASE_URL=dsn, PORT=str(porta), AGENDADOR_ATIVO='0')
+    if tipo == 'gunicorn':
+        # Log de acesso desligado: imprimir cada requisição mede o terminal
+        comando = [sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py',
+                   '--bind', f'127.0.0.1:{porta}', '--access-logfile', '/dev/null']
+    else:
+        comando = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(porta),
+                   '--no-access-log']
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{porta}'
+    prazo = time.monotonic() + 60
+    while time.monotonic() < prazo:
+        if processo.poll() is not None:
+            raise RuntimeError(f"Servidor {tipo} terminou ao iniciar (veja {log.name})")
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+            conexao.request('GET', '/health')
+            if conexao.getresponse().status == 200:
+                return processo, url
+        except OSError:
+            pass
+        time.sleep(0.3)
+    processo.terminate()
+    raise RuntimeError(f"Servidor {tipo} não respondeu a /health em 60s")
+
+
+def _commit():
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True)
+        sujo = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip()
+        return saida.stdout.strip() + ('-modificado' if sujo else '') or None
+    except OSError:
+        return None
+
+
+# --- Comparação -------------------------------------------------------------------
+
+def comparar(base, atual, tolerancia):
+    """Imprime as variações por cenário; devolve as regressões acima da tolerância."""
+    anteriores = {(r['cenario'], r['concorrencia']): r for r in base['resultados']}
+    regressoes = []
+    print(f"\nComparação com {base.get('commit') or '?'} (tolerância {tolerancia:.0%})")
+    print(f"{'cenário':18} {'conc':>4} {'rps':>18} {'p95 ms':>22}")
+    for r in atual['resultados']:
+        anterior = anteriores.get((r['cenario'], r['concorrencia']))
+        if anterior is None or not anterior['rps'] or not anterior['p95_ms'] or r['p95_ms'] is None:
+            continue
+        var_rps = r['rps'] / anterior['rps'] - 1
+        var_p95 = r['p95_ms'] / anterior['p95_ms'] - 1
+        marca = ''
+        if var_rps < -tolerancia or var_p95 > tolerancia:
+            marca = '  REGRESSÃO'
+            regressoes.append(r)
+        print(f"{r['cenario']:18} {r['concorrencia']:4} "
+              f"{anterior['rps']:8.1f}->{r['rps']:8.1f} {var_rps:+6.1%} "
+              f"{anterior['p95_ms']:8.1f}->{r['p95_ms']:8.1f} {var_p95:+6.1%}{marca}")
+    return regressoes
+
+
+def _lista_inteiros(texto):
+    return [int(parte) for parte in texto.split(',') if parte]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cenarios', default=','.join(c for c in CENARIOS if c != 'grafico_png'),
+                        help=f"separados por vírgula, entre: {', '.join(CENARIOS)}")
+    parser.add_argument('--concorrencia', type=_lista_inteiros, default=[1, 8, 32])
+    parser.add_argument('--duracao', type=float, default=10, help='segundos medidos por cenário')
+    parser.add_argument('--aquecimento', type=float, default=2)
+    parser.add_argument('--servidor', choices=['gunicorn', 'uvicorn'], default='gunicorn')
+    parser.add_argument('--url', help='servidor já em execução (não inicia um)')
+    parser.add_argument('--dsn', help='banco existente em vez do PostgreSQL temporário')
+    parser.add_argument('--pg-bin', help='diretório com initdb e pg_ctl')
+    parser.add_argument('--sem-fsync', action='store_true', help='PostgreSQL temporário com fsync=off')
+    parser.add_argument('--sem-popular', action='store_true', help='não cria esquema nem dados (--dsn/--url)')
+    parser.add_argument('--agentes', type=int, default=30)
+    parser.add_argument('--formularios', type=int, default=50000)
+    parser.add_argument('--dias', type=int, default=90)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON com os resultados')
+    parser.add_argument('--entrada', help='resultado já gravado (não executa, só compara)')
+    parser.add_argument('--comparar', help='resultado anterior para comparação')
+    parser.add_argument('--tolerancia', type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.entrada:
+        with open(args.entrada) as arquivo:
+            resultado = json.load(arquivo)
+    else:
+        cenarios = [c for c in args.cenarios.split(',') if c]
+        desconhecidos = [c for c in cenarios if c not in CENARIOS]
+        if desconhecidos:
+            parser.error(f"cenários desconhecidos: {', '.join(desconhecidos)}")
+        resultado = executar(args, cenarios)
+        if args.saida:
+            with open(args.saida, 'w') as arquivo:
+                json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+            print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            base = json.load(arquivo)
+        if comparar(base, resultado, args.tolerancia):
+            sys.exit(1)
+
+
+def executar(args, cenarios):
+    pg = None
+    servidor = None
+    # Saída do servidor, para investigar erros
+    log = tempfile.NamedTemporaryFile('w', prefix='bench_carga-', suffix='.log', delete=False)
+    try:
+        dsn = args.dsn
+        if dsn is None and args.url is None:
+            print("Iniciando PostgreSQL temporário...")
+            pg = PostgresLocal(args.pg_bin, fsync=not args.sem_fsync).iniciar()
+            dsn = pg.dsn
+
+        inicio = DATA_INICIAL
+        fim = inicio + timedelta(days=args.dias - 1)
+        if dsn is not None and not args.sem_popular:
+            print(f"Criando esquema e {args.formularios} formulários de {args.agentes} agentes...")
+            comeco = time.perf_counter()
+            aplicar_esquema(dsn)
+            inicio, fim = popular(dsn, args.agentes, args.formularios, args.dias, args.semente)
+            print(f"  pronto em {time.perf_counter() - comeco:.1f}s")
+
+        url = args.url
+        if url is None:
+            servidor, url = iniciar_servidor(args.servidor, dsn, log)
+
+        ctx = Contexto(inicio, fim, args.agentes)
+        resultados = []
+        print(f"\n{'cenário':18} {'conc':>4} {'req':>7} {'erros':>5} {'rps':>8} "
+              f"{'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+        for cenario in cenarios:
+            for concorrencia in args.concorrencia:
+                r = executar_cenario(url, cenario, ctx, concorrencia, args.duracao, args.aquecimento, args.semente)
+                resultados.append(r)
+                print(f"{cenario:18} {concorrencia:4} {r['requisicoes']:7} {r['erros']:5} {r['rps']:8.1f} "
+                      f"{r['p50_ms'] or 0:8.1f} {r['p95_ms'] or 0:8.1f} {r['p99_ms'] or 0:8.1f}")
+                if r['erros']:
+                    print(f"  (erros: veja a saída do servidor em {log.name})")
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait(30)
+        if pg is not None:
+            pg.parar()
+        log.close()
+
+    return {
+        "versao": VERSAO_RESULTADO,
+        "commit": _commit(),
+        "momento": datetime.now().isoformat(timespec='seconds'),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "servidor": 'externo' if args.url else args.servidor,
+            "banco": 'externo' if args.dsn else ('temporario-sem-fsync' if args.sem_fsync else 'temporario'),
+        },
+        "parametros": {
+            "agentes": args.agentes, "formularios": args.formularios, "dias": args.dias,
+            "duracao_s": args.duracao, "aquecimento_s": args.aquecimento, "semente": args.semente,
+        },
+        "resultados": resultados,
+    }
+
+
+if __name__ == '__main__':
+    main()
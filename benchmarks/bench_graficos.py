@@ -0,0 +1,121 @@
+"""
+Compara os gráficos em JSON de graficos_json.py com as figuras Plotly de
+graficos.py e mede o tempo de montagem + serialização de cada caminho.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_graficos.py [--agentes 5,30,200] [--repeticoes 50]
+
+Sai com código 1 se algum gráfico divergir.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.io as pio  # noqa: E402
+
+import graficos  # noqa: E402
+import graficos_json  # noqa: E402
+
+COLUNAS_DIARIO = (
+    'total_domicilios_visitados', 'total_pontos_criticos', 'total_criaduros_encontrados',
+    'total_criaduros_eliminados', 'total_larvas_encontradas', 'total_larvas_coletadas',
+    'total_adultos_coletados', 'total_casos_suspeitos',
+)
+
+
+def linhas_diarias(n, aleatorio):
+    linhas = []
+    for idagente in aleatorio.sample(range(1, n * 3 + 1), n):
+        linha = {'idagente': idagente}
+        for coluna in COLUNAS_DIARIO:
+            # Zeros frequentes exercitam o caso sem criaduros (eficiência 0)
+            linha[coluna] = aleatorio.choice([0, 0, aleatorio.randint(1, 500)])
+        linhas.append(linha)
+    return sorted(linhas, key=lambda linha: linha['idagente'])
+
+
+def linhas_mensais(n, aleatorio):
+    return [{f'{c}_mes': v for c, v in linha.items() if c != 'idagente'} | {'idagente': linha['idagente']}
+            for linha in linhas_diarias(n, aleatorio)]
+
+
+def casos(n, aleatorio):
+    dia = date(2025, 11, 3)
+    diarias = linhas_diarias(n, aleatorio)
+    mensais = linhas_mensais(n, aleatorio)
+    return [
+        ('diario',
+         lambda: graficos.figuras_graficos_diarios(dia, diarias),
+         lambda: graficos_json.graficos_diarios(dia, diarias)),
+        ('semanal',
+         lambda: graficos.figuras_graficos_semanais(dia, dia + timedelta(days=6), diarias),
+         lambda: graficos_json.graficos_semanais(dia, dia + timedelta(days=6), diarias)),
+        ('mensal',
+         lambda: graficos.figuras_graficos_mensais(dia.replace(day=1), mensais),
+         lambda: graficos_json.graficos_mensais(dia.replace(day=1), mensais)),
+    ]
+
+
+def caminho_plotly(montar):
+    # O que as rotas faziam antes: Figure -> to_json -> loads -> dumps da resposta
+    return json.dumps({nome: json.loads(pio.to_json(fig)) for nome, fig in montar()})
+
+
+def caminho_direto(montar):
+    return json.dumps(dict(montar()))
+
+
+def verificar(agentes, aleatorio):
+    divergencias = 0
+    for n in agentes:
+        for tipo, plotly, direto in casos(n, aleatorio):
+            esperado = {nome: json.loads(pio.to_json(fig)) for nome, fig in plotly()}
+            obtido = json.loads(caminho_direto(direto))
+            for nome in esperado:
+                if esperado[nome] != obtido.get(nome):
+                    divergencias += 1
+                    print(f"DIVERGE: {tipo}/{nome} com {n} agentes")
+    return divergencias
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return tempos[len(tempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--agentes', default='1,5,30,200')
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    agentes = [int(n) for n in args.agentes.split(',')]
+
+    divergencias = verificar(agentes, aleatorio)
+    print(f"equivalência: {'OK' if not divergencias else f'{divergencias} divergência(s)'}")
+
+    print(f"{'tipo':8} {'agentes':>7} {'plotly ms':>10} {'direto ms':>10} {'ganho':>7}")
+    for n in agentes:
+        for tipo, plotly, direto in casos(n, aleatorio):
+            antes = medir(lambda: caminho_plotly(plotly), args.repeticoes)
+            depois = medir(lambda: caminho_direto(direto), args.repeticoes)
+            print(f"{tipo:8} {n:>7} {antes:>10.2f} {depois:>10.2f} {antes / depois:>6.1f}x")
+
+    sys.exit(1 if divergencias else 0)
+
+
+if __name__ == '__main__':
+    main()
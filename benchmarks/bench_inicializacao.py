@@ -0,0 +1,89 @@
+"""
+Custo de subir um worker: tempo de importação do app e memória residente,
+medidos em um processo novo para cada cenário.
+
+Cenários:
+  app            import app (o que cada worker do gunicorn faz ao iniciar)
+  app+graficos   import app + template dos gráficos JSON (1ª rota de gráfico)
+  app+plotly     import app + plotly.express (como era antes da carga sob demanda)
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_inicializacao.py [--repeticoes 5]
+
+Sai com código 1 se `import app` carregar plotly, pandas, numpy ou kaleido:
+esses pacotes só devem ser importados pelos processos de renderização ou na
+primeira rota de gráfico.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ('plotly', 'pandas', 'numpy', 'kaleido')
+
+CENARIOS = {
+    'app': 'import app',
+    'app+graficos': 'import app, graficos_json; graficos_json._carregar_template()',
+    'app+plotly': 'import app; import plotly.express',
+}
+
+# Executado no processo filho: mede a importação e devolve JSON no stdout
+FILHO = r"""
+import json, sys, time
+sys.path.insert(0, {raiz!r})
+inicio = time.perf_counter()
+{codigo}
+duracao = time.perf_counter() - inicio
+rss_kb = None
+try:
+    with open('/proc/self/status') as status:
+        for linha in status:
+            if linha.startswith('VmRSS:'):
+                rss_kb = int(linha.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'ms': duracao * 1000,
+    'rss_mb': rss_kb / 1024 if rss_kb else None,
+    'pesados': [m for m in {pesados!r} if m in sys.modules],
+}}))
+"""
+
+
+def executar(codigo):
+    ambiente = dict(os.environ)
+    # O app não conecta ao importar, mas database.py lê a variável
+    ambiente.setdefault('DATABASE_URL', 'postgresql://localhost/entomotrack')
+    saida = subprocess.run(
+        [sys.executable, '-c', FILHO.format(raiz=RAIZ, codigo=codigo, pesados=PESADOS)],
+        capture_output=True, text=True, check=True, env=ambiente, cwd=RAIZ,
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'cenário':14} {'import ms':>10} {'RSS MB':>8}  módulos pesados")
+    falhou = False
+    for nome, codigo in CENARIOS.items():
+        medidas = [executar(codigo) for _ in range(args.repeticoes)]
+        medidas.sort(key=lambda m: m['ms'])
+        mediana = medidas[len(medidas) // 2]
+        rss = f"{mediana['rss_mb']:8.1f}" if mediana['rss_mb'] else f"{'?':>8}"
+        print(f"{nome:14} {mediana['ms']:10.1f} {rss}  {', '.join(mediana['pesados']) or '-'}")
+        if nome == 'app' and mediana['pesados']:
+            falhou = True
+
+    if falhou:
+        print("ERRO: `import app` carregou módulos de gráficos")
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == '__main__':
+    main()
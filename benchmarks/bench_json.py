@@ -0,0 +1,139 @@
+"""
+Serialização de 100 mil formulários: provedor padrão do Flask (com a
+conversão de horas por linha que as rotas faziam) contra serializacao.py,
+com e sem orjson.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_json.py [--linhas 100000] [--repeticoes 5]
+    python benchmarks/bench_json.py --banco "$DATABASE_URL"   # linhas reais
+
+Com --banco as linhas vêm de formularioporcasa via RealDictCursor (a tabela
+precisa ter dados; use o gerador de dados se estiver vazia).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, time as hora, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import serializacao  # noqa: E402
+
+
+def linhas_sinteticas(n, semente):
+    aleatorio = random.Random(semente)
+    bairros = ['Centro', 'Jardim América', 'Vila Nova', 'São José', 'Boa Vista']
+    inicio = date(2025, 1, 1)
+    linhas = []
+    for i in range(n):
+        entrada = hora(aleatorio.randint(7, 15), aleatorio.choice([0, 15, 30, 45]))
+        linhas.append({
+            'idboletimdiario': i + 1,
+            'data': inicio + timedelta(days=aleatorio.randint(0, 364)),
+            'bairro': aleatorio.choice(bairros),
+            'endereco': f'Rua {aleatorio.randint(1, 300)}, {aleatorio.randint(1, 2000)}',
+            'tipo_inseto': aleatorio.choice(['aedes', 'culex', 'barbeiro']),
+            'hora_inicio': entrada,
+            'hora_saida': hora(entrada.hour + 1, entrada.minute),
+            'num_pontos_criticos': aleatorio.randint(0, 5),
+            'total_criaduros_encontrados': aleatorio.randint(0, 10),
+            'criaduros_eliminados': aleatorio.randint(0, 10),
+            'tipos_criaduros': 'pneu, caixa d\'água',
+            'num_locos_larva': aleatorio.randint(0, 4),
+            'num_locos_positivos': aleatorio.randint(0, 4),
+            'num_adultos_encontrados': aleatorio.randint(0, 3),
+            'num_adultos_coletados': aleatorio.randint(0, 3),
+            'acaorealizada': 'Tratamento focal',
+            'inseticida_usado': 'Pyriproxyfen',
+            'quantidade_inseticida': '10g',
+            'casos_suspeitos': aleatorio.randint(0, 2),
+            'nome_pessoa': 'Maria da Silva',
+            'telefone_pessoa': '(11) 99999-0000',
+            'observacoes': '',
+            'idagente': aleatorio.randint(1, 40),
+            'chave_idempotencia': None,
+            'agente_matricula': f'AG{aleatorio.randint(1000, 9999)}',
+        })
+    return linhas
+
+
+def linhas_do_banco(dsn, n):
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    with psycopg2.connect(dsn) as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT f.*, ag.matricula AS agente_matricula
+            FROM formularioporcasa f JOIN agente ag ON f.idagente = ag.idagente
+            ORDER BY f.data DESC, f.idboletimdiario DESC LIMIT %s
+        """, (n,))
+        return cursor.fetchall()
+
+
+def padrao_flask(app, linhas):
+    # Caminho antigo: str() nas horas de cada linha e jsonify padrão
+    for formulario in linhas:
+        if formulario.get('hora_inicio'):
+            formulario['hora_inicio'] = str(formulario['hora_inicio'])
+        if formulario.get('hora_saida'):
+            formulario['hora_saida'] = str(formulario['hora_saida'])
+    return app.json.response({"success": True, "data": linhas}).get_data()
+
+
+def provedor(app, linhas):
+    return app.json.response({"success": True, "data": linhas}).get_data()
+
+
+def medir(funcao, preparar, repeticoes):
+    tempos = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        argumento = preparar()
+        inicio = time.perf_counter()
+        tamanho = len(funcao(argumento))
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return tempos[len(tempos) // 2] * 1000, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--banco', help='DSN do PostgreSQL para usar linhas reais')
+    args = parser.parse_args()
+
+    linhas = linhas_do_banco(args.banco, args.linhas) if args.banco else linhas_sinteticas(args.linhas, 42)
+    print(f"{len(linhas)} linhas ({'banco' if args.banco else 'sintéticas'})")
+
+    app_padrao = Flask('padrao')
+    app_padrao.json = DefaultJSONProvider(app_padrao)
+    app_rapido = Flask('rapido')
+    app_rapido.json = serializacao.ProvedorJSON(app_rapido)
+
+    # O caminho antigo altera as linhas, então cada repetição usa uma cópia
+    def copiar():
+        return [dict(linha) for linha in linhas]
+
+    resultados = [('flask padrão + str() nas horas', *medir(lambda l: padrao_flask(app_padrao, l), copiar, args.repeticoes))]
+
+    orjson = serializacao.orjson
+    if orjson is not None:
+        resultados.append(('ProvedorJSON (orjson)', *medir(lambda l: provedor(app_rapido, l), copiar, args.repeticoes)))
+    serializacao.orjson = None
+    try:
+        resultados.append(('ProvedorJSON (json padrão)', *medir(lambda l: provedor(app_rapido, l), copiar, args.repeticoes)))
+    finally:
+        serializacao.orjson = orjson
+
+    base = resultados[0][1]
+    for nome, ms, tamanho in resultados:
+        print(f"{nome:32} {ms:9.1f} ms  {tamanho / 1e6:6.1f} MB  {base / ms:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+Gerador de dados em escala de produção: usuários, agentes e supervisores,
+milhões de visitas (formularioporcasa) ao longo de vários anos e, por
+padrão, os resumos diário, semanal e mensal já calculados.
+
+Uso (na raiz do projeto, com o esquema já aplicado):
+    python benchmarks/gerar_dados.py --dsn "$DATABASE_URL" --truncar \\
+        --agentes 2000 --bairros 300 --formularios 5000000 --anos 3
+
+As linhas são montadas em Python e enviadas com COPY em lotes
+(--lote linhas, uma transação por lote). Com o mesmo --semente e a mesma
+versão do Python o conjunto é idêntico, inclusive os ids, se as tabelas
+partirem vazias (--truncar reinicia as sequências).
+
+Características dos dados:
+- cada agente tem um bairro de atuação (90% das visitas nele);
+- visitas concentradas em dias úteis, poucas aos sábados e quase nenhuma
+  aos domingos, com mais visitas no período chuvoso;
+- casos suspeitos, larvas, criadouros e adultos seguem a sazonalidade da
+  dengue (pico no fim do verão) e variam de um ano para outro;
+- contadores coerentes entre si (positivos <= larvas, eliminados <=
+  encontrados, coletados <= encontrados).
+
+Durante a carga os gatilhos das tabelas ficam desligados na sessão
+(session_replication_role = replica, requer superusuário), o que também
+dispensa a checagem de chave estrangeira; os ids gerados já são
+consistentes. sync_xid recebe o id da transação de cada lote, como o
+gatilho faria, e as versões de tabela (ETags) e o cache de gráficos são
+invalidados no fim. Sem superusuário a carga funciona com os gatilhos
+ligados, só que mais devagar.
+
+Com --sem-resumos os resumos não são calculados: todos os pares
+(data, agente) ficam marcados em periodo_sujo para o agendador ou
+`flask processar-pendentes`.
+"""
+import argparse
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+TABELAS_CARREGADAS = ('usuario', 'agente', 'supervisor', 'formularioporcasa',
+                      'resumodiario', 'resumosemanal', 'resumomensal')
+
+COLUNAS_FORMULARIO = (
+    'data', 'bairro', 'endereco', 'tipo_inseto', 'hora_inicio', 'hora_saida',
+    'num_pontos_criticos', 'total_criaduros_encontrados', 'criaduros_eliminados', 'tipos_criaduros',
+    'num_locos_larva', 'num_locos_positivos', 'num_adultos_encontrados', 'num_adultos_coletados',
+    'acaorealizada', 'inseticida_usado', 'quantidade_inseticida', 'casos_suspeitos',
+    'nome_pessoa', 'telefone_pessoa', 'observacoes', 'idagente', 'sync_xid',
+)
+
+PREFIXOS_BAIRRO = ['Jardim', 'Vila', 'Parque', 'Conjunto', 'Residencial', 'Núcleo', 'Chácara', 'Alto']
+NOMES_BAIRRO = [
+    'América', 'Esperança', 'São José', 'Boa Vista', 'Primavera', 'das Flores', 'Santa Rita', 'Aeroporto',
+    'Industrial', 'Progresso', 'Bela Vista', 'Nova Era', 'São Pedro', 'Santo Antônio', 'Paraíso',
+    'dos Pássaros', 'Alvorada', 'Cruzeiro', 'Independência', 'Liberdade', 'Monte Alegre', 'Ipiranga',
+    'Santa Luzia', 'Tropical', 'Universitário', 'Redenção', 'Planalto', 'Recreio', 'Copacabana', 'Eldorado',
+]
+LOGRADOUROS = ['Rua', 'Rua', 'Rua', 'Avenida', 'Travessa', 'Alameda']
+NOMES = ['Maria', 'José', 'Ana', 'João', 'Antônia', 'Francisco', 'Francisca', 'Carlos', 'Adriana', 'Paulo',
+         'Juliana', 'Pedro', 'Márcia', 'Lucas', 'Fernanda', 'Luiz', 'Patrícia', 'Marcos', 'Aline', 'Gabriel',
+         'Sandra', 'Rafael', 'Camila', 'Daniel', 'Amanda', 'Marcelo', 'Bruna', 'Bruno', 'Jéssica', 'Eduardo']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+              'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes',
+              'Vieira', 'Barbosa', 'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques']
+TIPOS_CRIADUROS = ['', '', 'pneu', 'vaso de planta', "caixa d'água", 'garrafa', 'calha', 'lixo',
+                   'pneu, vaso de planta', 'ralo', 'piscina', 'bebedouro de animais']
+OBSERVACOES = ['morador ausente', 'imóvel fechado', 'recusa parcial', 'retorno agendado', 'cão bravo']
+# (ação, inseticida, quantidade, peso)
+ACOES = [
+    ('vistoria', '', '', 50),
+    ('eliminação mecânica', '', '', 30),
+    ('tratamento focal', 'larvicida', '10 g', 15),
+    ('orientação ao morador', '', '', 5),
+]
+
+PICO_SAZONAL = 75           # dia do ano com mais casos (meados de março)
+NIVEIS_SAZONAIS = 24        # intensidades pré-calculadas das distribuições
+
+
+def _poisson(media, maximo):
+    """Pesos acumulados de uma Poisson truncada em `maximo`."""
+    acumulado, peso, pesos = 0.0, math.exp(-media), []
+    for k in range(maximo + 1):
+        acumulado += peso
+        pesos.append(acumulado)
+        peso *= media / (k + 1)
+    return pesos
+
+
+class Gerador:
+    """Dados determinísticos a partir de uma semente."""
+
+    def __init__(self, semente=42, agentes=2000, bairros=300, inicio=date(2022, 1, 3), dias=3 * 365):
+        self.aleatorio = random.Random(semente)
+        self.agentes = agentes
+        self.inicio = inicio
+        self.dias = dias
+        a = self.aleatorio
+
+        nomes_bairro = [f'{p} {n}' for n in NOMES_BAIRRO for p in PREFIXOS_BAIRRO] + NOMES_BAIRRO
+        a.shuffle(nomes_bairro)
+        total = len(nomes_bairro)
+        self.bairros = [nomes_bairro[i] if i < total else f'{nomes_bairro[i % total]} {i // total + 1}'
+                        for i in range(bairros)]
+        self.bairro_do_agente = [None] + [a.choice(self.bairros) for _ in range(agentes)]
+        self.ruas = [f'{a.choice(LOGRADOUROS)} {a.choice(NOMES)} {a.choice(SOBRENOMES)}' for _ in range(5000)]
+        self.pessoas = [f'{n} {s}' for n in NOMES for s in SOBRENOMES]
+        self.telefones = [f'(11) 9{a.randint(1000, 9999)}-{a.randint(0, 9999):04d}' for _ in range(20000)]
+        self.horarios = []
+        for minuto in range(7 * 60, 17 * 60, 5):
+            duracao = a.choice([5, 10, 15, 20, 30, 40])
+            self.horarios.append((f'{minuto // 60:02d}:{minuto % 60:02d}',
+                                  f'{(minuto + duracao) // 60:02d}:{(minuto + duracao) % 60:02d}'))
+
+        # Intensidade de cada ano (anos epidêmicos e anos calmos)
+        self.fator_ano = {ano: a.uniform(0.6, 1.6) for ano in range(inicio.year, inicio.year + dias // 365 + 2)}
+        self.tabelas = [self._tabelas_nivel(n / (NIVEIS_SAZONAIS - 1)) for n in range(NIVEIS_SAZONAIS)]
+
+    @staticmethod
+    def _tabelas_nivel(s):
+        """Distribuições dos contadores para a intensidade s (0 a 1, 1 = pico de um ano epidêmico)."""
+        return {
+            'pontos': _poisson(0.6 + 0.6 * s, 10),
+            'criaduros': _poisson(0.8 + 3.5 * s, 25),
+            'eliminados': _poisson(0.6 + 2.5 * s, 25),
+            'larvas': _poisson(0.2 + 2.2 * s, 20),
+            'positivos': _poisson(0.05 + 1.0 * s, 15),
+            'adultos': _poisson(0.1 + 1.5 * s, 15),
+            'coletados': _poisson(0.05 + 0.8 * s, 15),
+            'casos': _poisson(0.01 + 0.35 * s, 8),
+        }
+
+    def sazonalidade(self, dia):
+        """Intensidade do dia: estação (0 a 1) vezes o fator do ano."""
+        estacao = (1 + math.cos(2 * math.pi * (dia.timetuple().tm_yday - PICO_SAZONAL) / 365.25)) / 2
+        return estacao * self.fator_ano[dia.year]
+
+    def visitas_por_dia(self, total):
+        """Quantidade de visitas de cada dia, somando exatamente `total`."""
+        pesos = []
+        for i in range(self.dias):
+            dia = self.inicio + timedelta(days=i)
+            semana = (1.0, 1.0, 1.0, 1.0, 1.0, 0.35, 0.03)[dia.weekday()]
+            # Mais mutirões no período chuvoso
+            pesos.append(semana * (0.8 + 0.4 * self.sazonalidade(dia) / 1.6))
+        soma = sum(pesos)
+        quantidades, acumulado, anterior = [], 0.0, 0
+        for peso in pesos:
+            acumulado += peso
+            atual = round(acumulado / soma * total)
+            quantidades.append(atual - anterior)
+            anterior = atual
+        return quantidades
+
+    def usuarios(self):
+        """(usuários, agentes, supervisores) como texto COPY."""
+        a = self.aleatorio
+        supervisores = max(1, self.agentes // 20)
+        usuarios, agentes, chefes = [], [], []
+        for i in range(1, self.agentes + supervisores + 1):
+            nome = f'{a.choice(NOMES)} {a.choice(SOBRENOMES)}'
+            funcao = 'agente' if i <= self.agentes else 'supervisor'
+            email = f'{funcao}{i}@exemplo.org'
+            usuarios.append(f'{i}\t{nome}\t{email}\tsenha\t{funcao}\t{a.choice(self.telefones)}\n')
+            if i <= self.agentes:
+                agentes.append(f'{i}\t{1 + (i - 1) % max(1, self.agentes // 25)}\tA{i:06d}\t{i}\n')
+            else:
+                chefes.append(f'{i - self.agentes}\tS{i - self.agentes:05d}\t{i}\n')
+        return ''.join(usuarios), ''.join(agentes), ''.join(chefes)
+
+    def formularios(self, total, lote):
+        """Gera (texto COPY sem sync_xid, linhas) em lotes de ~`lote` linhas, em ordem de data."""
+        a = self.aleatorio
+        agentes = range(1, self.agentes + 1)
+        acoes = [acao[:3] for acao in ACOES]
+        pesos_acoes = [acao[3] for acao in ACOES]
+        pendentes, quantidade = [], 0
+        for i, n in enumerate(self.visitas_por_dia(total)):
+            if not n:
+                continue
+            dia = self.inicio + timedelta(days=i)
+            nivel = min(NIVEIS_SAZONAIS - 1, round(self.sazonalidade(dia) / 1.6 * (NIVEIS_SAZONAIS - 1)))
+            t = self.tabelas[nivel]
+            data = dia.isoformat()
+
+            ids = a.choices(agentes, k=n)
+            fora = a.choices(self.bairros, k=n)
+            bairros = [self.bairro_do_agente[ag] if r < 0.9 else b
+                       for ag, b, r in zip(ids, fora, (a.random() for _ in range(n)))]
+            ruas = a.choices(self.ruas, k=n)
+            numeros = a.choices(range(1, 2500), k=n)
+            insetos = a.choices(('aedes', 'culex', 'barbeiro'), (85, 12, 3), k=n)
+            horarios = a.choices(self.horarios, k=n)
+            valores = range(26)
+            pontos = a.choices(valores[:11], cum_weights=t['pontos'], k=n)
+            criaduros = a.choices(valores, cum_weights=t['criaduros'], k=n)
+            eliminados = a.choices(valores, cum_weights=t['eliminados'], k=n)
+            tipos = a.choices(TIPOS_CRIADUROS, k=n)
+            larvas = a.choices(valores[:21], cum_weights=t['larvas'], k=n)
+            positivos = a.choices(valores[:16], cum_weights=t['positivos'], k=n)
+            adultos = a.choices(valores[:16], cum_weights=t['adultos'], k=n)
+            coletados = a.choices(valores[:16], cum_weights=t['coletados'], k=n)
+            escolhas_acoes = a.choices(acoes, pesos_acoes, k=n)
+            casos = a.choices(valores[:9], cum_weights=t['casos'], k=n)
+            pessoas = a.choices(self.pessoas, k=n)
+            telefones = a.choices(self.telefones, k=n)
+            observacoes = [a.choice(OBSERVACOES) if r < 0.05 else '' for r in (a.random() for _ in range(n))]
+
+            for j in range(n):
+                acao, inseticida, dose = escolhas_acoes[j]
+                pendentes.append(
+                    f'{data}\t{bairros[j]}\t{ruas[j]}, {numeros[j]}\t{insetos[j]}\t'
+                    f'{horarios[j][0]}\t{horarios[j][1]}\t{pontos[j]}\t{criaduros[j]}\t'
+                    f'{min(eliminados[j], criaduros[j])}\t{tipos[j]}\t{larvas[j]}\t'
+                    f'{min(positivos[j], larvas[j])}\t{adultos[j]}\t{min(coletados[j], adultos[j])}\t'
+                    f'{acao}\t{inseticida}\t{dose}\t{casos[j]}\t{pessoas[j]}\t{telefones[j]}\t'
+                    f'{observacoes[j]}\t{ids[j]}\t'
+                )
+            quantidade += n
+            if quantidade >= lote:
+                yield pendentes, quantidade
+                pendentes, quantidade = [], 0
+        if pendentes:
+            yield pendentes, quantidade
+
+
+def _copy(cursor, tabela, colunas, texto):
+    cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN", io.StringIO(texto))
+
+
+def _desligar_gatilhos(cursor):
+    """Gatilhos e checagem de FK desligados nesta sessão (False se não for superusuário)."""
+    try:
+        cursor.execute("SAVEPOINT gatilhos")
+        cursor.execute("SET session_replication_role = replica")
+        cursor.execute("RELEASE SAVEPOINT gatilhos")
+        return True
+    except psycopg2.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT gatilhos")
+        return False
+
+
+def gerar(dsn, agentes=2000, bairros=300, formularios=5_000_000, inicio=date(2022, 1, 3), dias=3 * 365,
+          semente=42, resumos=True, truncar=False, lote=200_000, progresso=print):
+    """Carrega o conjunto e devolve um relatório com linhas e tempos por etapa."""
+    from agregacao import reprocessar_resumos
+    from particoes import criar_particoes, particionada
+    import cache_graficos
+
+    gerador = Gerador(semente, agentes, bairros, inicio, dias)
+    fim = inicio + timedelta(days=dias - 1)
+    relatorio = {"agentes": agentes, "bairros": bairros, "formularios": formularios,
+                 "inicio": inicio.isoformat(), "fim": fim.isoformat(), "etapas": {}}
+    comeco_total = time.perf_counter()
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            if truncar:
+                cursor.execute(
+                    "TRUNCATE usuario, agente, supervisor, formularioporcasa, resumodiario, resumosemanal, "
+                    "resumomensal, periodo_sujo RESTART IDENTITY CASCADE"
+                )
+            else:
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM usuario) OR EXISTS (SELECT 1 FROM formularioporcasa)")
+                if cursor.fetchone()[0]:
+                    raise RuntimeError("As tabelas já têm dados: use --truncar para apagá-las antes da carga")
+            if particionada(cursor):
+                # Sem as partições do período as visitas iriam todas para a padrão
+                criadas = criar_particoes(cursor, inicio, fim)
+                if criadas:
+                    progresso(f"{len(criadas)} partições mensais criadas")
+            sem_gatilhos = _desligar_gatilhos(cursor)
+            if not sem_gatilhos:
+                progresso("Aviso: sem superusuário os gatilhos continuam ligados (carga mais lenta)")
+
+            comeco = time.perf_counter()
+            usuarios, lista_agentes, supervisores = gerador.usuarios()
+            _copy(cursor, 'usuario', ('idusuario', 'nome', 'email', 'senha', 'funcao', 'telefone'), usuarios)
+            _copy(cursor, 'agente', ('idagente', 'quartelaria', 'matricula', 'idusuario'), lista_agentes)
+            _copy(cursor, 'supervisor', ('idsupervisor', 'matricula', 'idusuario'), supervisores)
+            for tabela, coluna in (('usuario', 'idusuario'), ('agente', 'idagente'), ('supervisor', 'idsupervisor')):
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{tabela}', '{coluna}'), "
+                    f"(SELECT COALESCE(max({coluna}), 0) + 1 FROM {tabela}), false)"
+                )
+        conn.commit()
+        relatorio["etapas"]["usuarios_s"] = round(time.perf_counter() - comeco, 2)
+
+        comeco = time.perf_counter()
+        carregadas = 0
+        for linhas, quantidade in gerador.formularios(formularios, lote):
+            with conn.cursor() as cursor:
+                # O mesmo valor que o gatilho marcar_sync_xid gravaria
+                cursor.execute("SELECT pg_current_xact_id()::text")
+                xid = cursor.fetchone()[0] + '\n'
+                _copy(cursor, 'formularioporcasa', COLUNAS_FORMULARIO, xid.join(linhas) + xid)
+            conn.commit()
+            carregadas += quantidade
+            decorrido = time.perf_counter() - comeco
+            progresso(f"  {carregadas:>10} formulários ({carregadas / decorrido:,.0f}/s)")
+        relatorio["etapas"]["formularios_s"] = round(time.perf_counter() - comeco, 2)
+
+        with conn.cursor() as cursor:
+            cursor.execute("SET session_replication_role = DEFAULT")
+        comeco = time.perf_counter()
+        if resumos:
+            progresso("Calculando resumos diários, semanais e mensais...")
+            reprocessar_resumos(conn, inicio, fim)
+        elif sem_gatilhos:
+            # Os gatilhos de periodo_sujo não rodaram: marca tudo para o processamento incremental
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO periodo_sujo (data, idagente) "
+                    "SELECT DISTINCT data, idagente FROM formularioporcasa ORDER BY 1, 2 ON CONFLICT DO NOTHING"
+                )
+        with conn.cursor() as cursor:
+            if resumos:
+                cursor.execute("DELETE FROM periodo_sujo")
+            # ETags e cache de gráficos de um servidor já em execução
+            cursor.execute(
+                "SELECT incrementar_versao(tabela) FROM unnest(%s::text[]) AS tabela", (list(TABELAS_CARREGADAS),)
+            )
+            for tipo in ('diario', 'semanal', 'mensal'):
+                cache_graficos.invalidar_tipo(cursor, tipo)
+        conn.commit()
+        relatorio["etapas"]["resumos_s"] = round(time.perf_counter() - comeco, 2)
+
+        comeco = time.perf_counter()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for tabela in TABELAS_CARREGADAS:
+                cursor.execute(f"VACUUM ANALYZE {tabela}")
+        relatorio["etapas"]["vacuum_s"] = round(time.perf_counter() - comeco, 2)
+    finally:
+        conn.close()
+
+    relatorio["duracao_s"] = round(time.perf_counter() - comeco_total, 2)
+    relatorio["formularios_por_s"] = round(formularios / relatorio["etapas"]["formularios_s"]) \
+        if relatorio["etapas"]["formularios_s"] else None
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--agentes', type=int, default=2000)
+    parser.add_argument('--bairros', type=int, default=300)
+    parser.add_argument('--formularios', type=int, default=5_000_000)
+    parser.add_argument('--inicio', type=date.fromisoformat, default=date(2022, 1, 3))
+    parser.add_argument('--anos', type=float, default=3)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=200_000, help='linhas por COPY/transação')
+    parser.add_argument('--sem-resumos', action='store_true', help='marca os períodos como sujos em vez de calcular')
+    parser.add_argument('--truncar', action='store_true', help='apaga os dados das tabelas antes da carga')
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("informe --dsn ou DATABASE_URL")
+
+    relatorio = gerar(
+        args.dsn, agentes=args.agentes, bairros=args.bairros, formularios=args.formularios,
+        inicio=args.inicio, dias=round(args.anos * 365), semente=args.semente,
+        resumos=not args.sem_resumos, truncar=args.truncar, lote=args.lote,
+    )
+    print(f"Concluído em {relatorio['duracao_s']}s: {relatorio['etapas']} "
+          f"({relatorio['formularios_por_s']} formulários/s no COPY)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Confere com EXPLAIN que as consultas quentes das rotas usam os índices de
+sql/007_indices_consultas.sql, sql/009_indices_filtros_listagem.sql (e anteriores) em um banco com volume de
+produção. Sai com código 1 se alguma consulta não usar o índice esperado
+ou fizer Seq Scan na tabela consultada.
+
+Uso (na raiz do projeto):
+    python benchmarks/verificar_indices.py                    # PostgreSQL descartável
+    python benchmarks/verificar_indices.py --dsn "$DATABASE_URL" --sem-popular
+
+Sem --dsn sobe um PostgreSQL temporário (banco_local.py), aplica as
+migrações e gera --formularios visitas com gerar_dados.py. Com --dsn e sem
+--sem-popular o banco precisa estar vazio (ou use --truncar).
+
+Com --particionar formularioporcasa é convertida em tabela particionada por
+mês (particoes.py) antes da carga. Em tabelas particionadas valem os
+índices das partições, e as consultas de um dia só podem ler uma partição.
+
+As consultas são as mesmas das rotas (importadas delas quando possível),
+com parâmetros tirados dos dados: um dia no meio do histórico, um agente
+com visitas nesse dia (e o bairro e a matrícula dele, para os filtros da
+listagem), um e-mail e uma matrícula existentes.
+
+tests/test_verificar_indices.py roda a mesma verificação no pytest
+(preparar + verificar_consultas), com um volume menor.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import psycopg2  # noqa: E402
+
+from banco_local import DATA_INICIAL, PostgresLocal, aplicar_esquema  # noqa: E402
+
+TIPOS_INDICE = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+# Abaixo disso a tabela inteira cabe em poucas leituras e o Seq Scan é o
+# plano certo (ex.: supervisores, poucas dezenas de linhas)
+PAGINAS_MINIMAS = 10
+
+
+def consultas_quentes(amostra):
+    """[(nome, sql, parametros, tabela, índice esperado, máximo de partições lidas)]."""
+    from routes.formularios import consulta_listagem
+    from routes.resumos import SQL_GRAFICOS
+
+    dia, idagente = amostra['dia'], amostra['idagente']
+    semana = dia - timedelta(days=dia.weekday())
+    mes = dia.replace(day=1)
+    listagem, parametros_listagem = consulta_listagem(None, 51)
+    pagina, parametros_pagina = consulta_listagem((dia, amostra['idboletimdiario']), 51)
+    do_agente, parametros_agente = consulta_listagem(None, 51, {'matricula': amostra['matricula_formulario']})
+    do_bairro, parametros_bairro = consulta_listagem(
+        None, 51, {'data_inicio': dia - timedelta(days=6), 'data_fim': dia, 'bairro': amostra['bairro']})
+    com_casos, parametros_casos = consulta_listagem(None, 51, {'casos_suspeitos': True})
+
+    return [
+        ("usuario por e-mail", "SELECT 1 FROM usuario WHERE email = %s;",
+         (amostra['email'],), 'usuario', 'usuario_email_key', None),
+        ("agente por matrícula", "SELECT 1 FROM agente WHERE matricula = %s;",
+         (amostra['matricula_agente'],), 'agente', 'agente_matricula_key', None),
+        ("supervisor por matrícula", "SELECT 1 FROM supervisor WHERE matricula = %s;",
+         (amostra['matricula_supervisor'],), 'supervisor', 'supervisor_matricula_key', None),
+        ("listagem de formulários", listagem, parametros_listagem,
+         'formularioporcasa', 'formularioporcasa_data_id_idx', None),
+        ("listagem de formulários (cursor)", pagina, parametros_pagina,
+         'formularioporcasa', 'formularioporcasa_data_id_idx', None),
+        ("listagem por matrícula", do_agente, parametros_agente,
+         'formularioporcasa', 'formularioporcasa_idagente_data_id_idx', None),
+        ("listagem do bairro na semana", do_bairro, parametros_bairro,
+         'formularioporcasa', 'formularioporcasa_bairro_data_id_idx', 2),
+        ("listagem com casos suspeitos", com_casos, parametros_casos,
+         'formularioporcasa', 'formularioporcasa_casos_suspeitos_idx', None),
+        ("formulários do dia e agente",
+         "SELECT COUNT(*), SUM(num_locos_larva) FROM formularioporcasa WHERE data = %s AND idagente = %s",
+         (dia, idagente), 'formularioporcasa', 'formularioporcasa_data_idagente_idx', 1),
+        ("agentes com formulários no dia", "SELECT DISTINCT idagente FROM formularioporcasa WHERE data = %s",
+         (dia,), 'formularioporcasa', 'formularioporcasa_data_idagente_idx', 1),
+        ("gráfico diário", SQL_GRAFICOS['diario'], (dia,),
+         'resumodiario', 'resumodiario_data_idagente_key', None),
+        ("resumos diários da semana", "SELECT COUNT(*) as total FROM resumodiario WHERE data BETWEEN %s AND %s",
+         (semana, semana + timedelta(days=6)), 'resumodiario', 'resumodiario_data_idagente_key', None),
+        ("gráfico semanal", "SELECT * FROM resumosemanal WHERE data_inicio = %s ORDER BY idagente",
+         (semana,), 'resumosemanal', 'resumosemanal_periodo_key', None),
+        ("gráfico mensal", "SELECT * FROM resumomensal WHERE data_inicio = %s ORDER BY idagente",
+         (mes,), 'resumomensal', 'resumomensal_periodo_key', None),
+    ]
+
+
+def _nos(plano):
+    yield plano
+    for filho in plano.get('Plans', []):
+        yield from _nos(filho)
+
+
+def _arvore(cursor, relacao):
+    """Nomes da relação (tabela ou índice) e das suas partições."""
+    cursor.execute(
+        "SELECT %s::regclass::text UNION SELECT relid::regclass::text FROM pg_partition_tree(%s::regclass)",
+        (relacao, relacao),
+    )
+    return {nome for (nome,) in cursor.fetchall()}
+
+
+def verificar(cursor, sql, parametros, tabela, indice, maximo_particoes=None):
+    """(ok, resumo do plano) da consulta."""
+    tabelas = _arvore(cursor, tabela)
+    cursor.execute("SELECT COALESCE(SUM(relpages), 0) FROM pg_class WHERE oid = ANY(%s::regclass[])",
+                   (list(tabelas),))
+    paginas = cursor.fetchone()[0]
+    if paginas < PAGINAS_MINIMAS:
+        return True, f"{tabela} tem {paginas} página(s): índice não é necessário nesse volume"
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, parametros)
+    plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    nos = list(_nos(plano[0]['Plan']))
+    indices = _arvore(cursor, indice)
+    usados = [no.get('Index Name') for no in nos if no['Node Type'] in TIPOS_INDICE]
+    seq_scan = any(no['Node Type'] == 'Seq Scan' and no.get('Relation Name') in tabelas for no in nos)
+    lidas = {no['Relation Name'] for no in nos if no.get('Relation Name') in tabelas}
+    descricoes = []
+    for no in nos:
+        descricao = (no['Node Type'] + (f" ({no['Index Name']})" if no.get('Index Name') else "")
+                     + (f" em {no['Relation Name']}" if no.get('Relation Name') and not no.get('Index Name') else ""))
+        # Uma partição por mês: mostra só a primeira de uma sequência igual
+        chave = (no['Node Type'], no.get('Relation Name') in tabelas)
+        if descricoes and chave[1] and descricoes[-1][0] == chave:
+            descricoes[-1][2] += 1
+        else:
+            descricoes.append([chave, descricao, 0])
+    resumo = ", ".join(descricao + (f" +{outras}" if outras else "") for _, descricao, outras in descricoes)
+    if len(tabelas) > 1:
+        resumo += f"; {len(lidas)} de {len(tabelas) - 1} partição(ões)"
+    podadas = maximo_particoes is None or len(tabelas) == 1 or len(lidas) <= maximo_particoes
+    return bool(indices.intersection(usados)) and not seq_scan and podadas, resumo
+
+
+def amostrar(cursor, dia):
+    cursor.execute(
+        """
+        SELECT f.idagente, f.idboletimdiario, f.bairro, ag.matricula FROM formularioporcasa f
+        JOIN agente ag ON ag.idagente = f.idagente
+        WHERE f.data = (SELECT MIN(data) FROM formularioporcasa WHERE data >= %s)
+        ORDER BY f.idboletimdiario LIMIT 1
+        """,
+        (dia,),
+    )
+    idagente, idboletimdiario, bairro, matricula_formulario = cursor.fetchone()
+    cursor.execute("SELECT data FROM formularioporcasa WHERE idboletimdiario = %s", (idboletimdiario,))
+    dia = cursor.fetchone()[0]
+    cursor.execute("SELECT email FROM usuario ORDER BY idusuario DESC LIMIT 1")
+    email = cursor.fetchone()[0]
+    cursor.execute("SELECT matricula FROM agente ORDER BY idagente DESC LIMIT 1")
+    matricula_agente = cursor.fetchone()[0]
+    cursor.execute("SELECT matricula FROM supervisor ORDER BY idsupervisor DESC LIMIT 1")
+    linha = cursor.fetchone()
+    return {
+        'dia': dia, 'idagente': idagente, 'idboletimdiario': idboletimdiario, 'email': email,
+        'bairro': bairro, 'matricula_formulario': matricula_formulario,
+        'matricula_agente': matricula_agente, 'matricula_supervisor': linha[0] if linha else '',
+    }
+
+
+def preparar(dsn, formularios, agentes, dias, particionar=False, truncar=False):
+    """Aplica as migrações e gera os dados (convertendo antes, com particionar)."""
+    from gerar_dados import gerar
+
+    aplicar_esquema(dsn)
+    if particionar:
+        from particoes import converter
+
+        conn = psycopg2.connect(dsn)
+        try:
+            converter(conn)
+        finally:
+            conn.close()
+    gerar(dsn, agentes=agentes, bairros=max(5, agentes // 5), formularios=formularios,
+          inicio=DATA_INICIAL, dias=dias, truncar=truncar, progresso=lambda mensagem: None)
+
+
+def verificar_consultas(dsn):
+    """[(nome, índice esperado, ok, resumo do plano)] das consultas quentes."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SELECT MIN(data), MAX(data) FROM formularioporcasa")
+            inicio, fim = cursor.fetchone()
+            if inicio is None:
+                raise RuntimeError("formularioporcasa está vazia: gere dados antes (sem --sem-popular)")
+            amostra = amostrar(cursor, inicio + (fim - inicio) // 2)
+
+            resultados = []
+            for nome, sql, parametros, tabela, indice, maximo in consultas_quentes(amostra):
+                ok, resumo = verificar(cursor, sql, parametros, tabela, indice, maximo)
+                resultados.append((nome, indice, ok, resumo))
+    finally:
+        conn.close()
+    return resultados
+
+
+def executar(dsn, args):
+    if not args.sem_popular:
+        print(f"Gerando {args.formularios} formulários de {args.agentes} agentes...")
+        preparar(dsn, args.formularios, args.agentes, args.dias, args.particionar, args.truncar)
+
+    try:
+        resultados = verificar_consultas(dsn)
+    except RuntimeError as erro:
+        raise SystemExit(str(erro))
+    for nome, indice, ok, resumo in resultados:
+        print(f"{'ok   ' if ok else 'FALHA'} {nome:34} espera {indice}\n      {resumo}")
+    return sum(not ok for _, _, ok, _ in resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', help='Banco existente (padrão: PostgreSQL descartável)')
+    parser.add_argument('--pg-bin', help='Diretório com initdb e pg_ctl')
+    parser.add_argument('--sem-popular', action='store_true', help='Usa os dados já existentes no banco')
+    parser.add_argument('--truncar', action='store_true', help='Apaga os dados antes de gerar')
+    parser.add_argument('--particionar', action='store_true',
+                        help='Particiona formularioporcasa por mês antes de gerar')
+    parser.add_argument('--agentes', type=int, default=500)
+    parser.add_argument('--formularios', type=int, default=1_000_000)
+    parser.add_argument('--dias', type=int, default=3 * 365)
+    args = parser.parse_args()
+
+    if args.dsn:
+        falhas = executar(args.dsn, args)
+    else:
+        with PostgresLocal(args.pg_bin, fsync=False) as pg:
+            falhas = executar(pg.dsn, args)
+
+    print(f"{falhas} consulta(s) sem o índice esperado" if falhas else "Todas as consultas usam índice")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Cache dos JSON de gráficos (/resumos/graficos/...).
+
+A chave combina tipo de gráfico, período e a versão dos dados do período
+(tabela versao_graficos). Toda rota que grava um período incrementa a
+versão, então um gráfico antigo nunca é servido: a próxima leitura
+simplesmente procura uma chave nova. Os envios de formulários e os
+reprocessamentos do diário incrementam logo depois do commit, para não
+travar a linha de versão junto com resumodiario; no intervalo um leitor
+pode no máximo guardar dados novos sob a versão antiga.
+
+Há dois níveis: LRU em memória, limitado em bytes, por worker; e,
+opcionalmente (GRAFICOS_CACHE_DIR), um diretório compartilhado entre os
+workers do gunicorn na mesma máquina.
+"""
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import metricas
+from cache_http import VERSAO_FORMATO
+
+CACHE_MAX_BYTES = int(os.getenv('GRAFICOS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+CACHE_DIR = os.getenv('GRAFICOS_CACHE_DIR')
+CACHE_DISCO_MAX_ARQUIVOS = int(os.getenv('GRAFICOS_CACHE_DISCO_MAX_ARQUIVOS', 2000))
+
+
+class CacheLRU:
+    """LRU thread-safe limitado pelo total de bytes armazenados."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._itens[chave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._bytes -= len(removido)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+
+class CacheDisco:
+    """Arquivos em um diretório, gravados de forma atômica (tmp + rename)."""
+
+    def __init__(self, diretorio, max_arquivos):
+        self.diretorio = diretorio
+        self.max_arquivos = max_arquivos
+        # next() em itertools.count é atômico: cada gravação recebe um número
+        # diferente, mesmo entre as threads do gthread
+        self._gravacoes = itertools.count(1)
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, hashlib.sha1(chave.encode()).hexdigest() + ".json")
+
+    def get(self, chave):
+        try:
+            with open(self._caminho(chave), "rb") as arquivo:
+                return arquivo.read()
+        except OSError:
+            return None
+
+    def set(self, chave, valor):
+        try:
+            fd, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+            with os.fdopen(fd, "wb") as arquivo:
+                arquivo.write(valor)
+            os.replace(temporario, self._caminho(chave))
+        except OSError:
+            return
+        if next(self._gravacoes) % 100 == 0:
+            self._limpar()
+
+    def _limpar(self):
+        """Remove os arquivos mais antigos acima do limite."""
+        try:
+            arquivos = [entrada for entrada in os.scandir(self.diretorio) if entrada.name.endswith(".json")]
+            excedente = len(arquivos) - self.max_arquivos
+            if excedente > 0:
+                arquivos.sort(key=lambda entrada: entrada.stat().st_mtime)
+                for entrada in arquivos[:excedente]:
+                    os.unlink(entrada.path)
+        except OSError:
+            pass
+
+
+_memoria = CacheLRU(CACHE_MAX_BYTES)
+_disco = CacheDisco(CACHE_DIR, CACHE_DISCO_MAX_ARQUIVOS) if CACHE_DIR else None
+
+
+def chave_grafico(tipo, periodo, versao):
+    # O formato entra na chave para o cache em disco não servir corpos antigos
+    return f"{tipo}:{periodo.isoformat()}:{versao}:{VERSAO_FORMATO}"
+
+
+def obter(chave):
+    """Corpo JSON (bytes) guardado para a chave, ou None."""
+    tipo = chave.split(':', 1)[0]
+    corpo = _memoria.get(chave)
+    if corpo is not None:
+        metricas.contar('cache_graficos_total', tipo=tipo, resultado='memoria')
+        return corpo
+    if _disco is not None:
+        corpo = _disco.get(chave)
+        if corpo is not None:
+            _memoria.set(chave, corpo)
+            metricas.contar('cache_graficos_total', tipo=tipo, resultado='disco')
+            return corpo
+    metricas.contar('cache_graficos_total', tipo=tipo, resultado='falta')
+    return None
+
+
+def guardar(chave, corpo):
+    _memoria.set(chave, corpo)
+    if _disco is not None:
+        _disco.set(chave, corpo)
+
+
+# Período especial cuja versão vale para todos os períodos do tipo (usado
+# quando uma atualização não sabe quais períodos mudaram, ex.: REFRESH das
+# views materializadas)
+TODOS_OS_PERIODOS = 'infinity'
+
+
+# Soma de dois contadores que só crescem: muda sempre que um deles muda.
+# Parâmetros: tipo, período, TODOS_OS_PERIODOS
+SQL_VERSAO_PERIODO = (
+    "SELECT COALESCE(SUM(versao), 0)::bigint FROM versao_graficos WHERE tipo = %s AND periodo IN (%s, %s)"
+)
+
+
+def versao_periodo(cursor, tipo, periodo):
+    """Versão atual dos dados de um período ('diario', 'semanal' ou 'mensal')."""
+    cursor.execute(SQL_VERSAO_PERIODO, (tipo, periodo, TODOS_OS_PERIODOS))
+    return cursor.fetchone()[0]
+
+
+def invalidar_periodo(cursor, tipo, periodo):
+    """
+    Incrementa a versão do período. Deve rodar na mesma transação que grava
+    os dados, para que a nova versão só fique visível junto com eles.
+    """
+    cursor.execute(
+        """
+        INSERT INTO versao_graficos (tipo, periodo, versao) VALUES (%s, %s, 1)
+        ON CONFLICT (tipo, periodo) DO UPDATE SET versao = versao_graficos.versao + 1
+        """,
+        (tipo, periodo),
+    )
+
+
+def invalidar_tipo(cursor, tipo):
+    """Invalida todos os períodos do tipo de uma vez."""
+    invalidar_periodo(cursor, tipo, TODOS_OS_PERIODOS)
+
+
+def invalidar_intervalo(cursor, tipo, inicio, fim, passo):
+    """
+    Incrementa a versão de todos os períodos de `inicio` a `fim` com o
+    `passo` dado ('1 day', '1 week', '1 month'), em ordem para evitar
+    deadlocks. Mesma regra de transação de invalidar_periodo.
+    """
+    cursor.execute(
+        """
+        INSERT INTO versao_graficos (tipo, periodo, versao)
+        SELECT %s, periodo::date, 1
+        FROM generate_series(%s::date, %s::date, %s::interval) AS periodo
+        ORDER BY 2
+        ON CONFLICT (tipo, periodo) DO UPDATE SET versao = versao_graficos.versao + 1
+        """,
+        (tipo, inicio, fim, passo),
+    )
+
+
+def invalidar_periodos(cursor, tipo, periodos):
+    """
+    Incrementa a versão de uma lista qualquer de períodos do tipo, em ordem
+    para evitar deadlocks. Mesma regra de transação de invalidar_periodo.
+    """
+    cursor.execute(
+        """
+        INSERT INTO versao_graficos (tipo, periodo, versao)
+        SELECT %s, periodo, 1
+        FROM unnest(%s::date[]) AS periodo
+        ORDER BY 2
+        ON CONFLICT (tipo, periodo) DO UPDATE SET versao = versao_graficos.versao + 1
+        """,
+        (tipo, sorted(set(periodos))),
+    )
@@ -0,0 +1,126 @@
+"""
+GET condicional (ETag / Last-Modified) nas listagens.
+
+A validação usa as versões de tabela (sql/004 e sql/010), mantidas por
+triggers: a rota lê a versão de cada tabela da qual a resposta depende e,
+se o cliente já tem essa versão (If-None-Match) ou nada mudou desde a data
+que ele informou (If-Modified-Since), responde 304 sem buscar nenhuma linha
+nem serializar nada.
+
+As versões são lidas antes da consulta da rota, então a resposta é no
+mínimo tão nova quanto o ETag enviado; no pior caso o cliente baixa de novo
+na próxima chamada. A rota usa a mesma conexão da leitura das versões
+(database.conexao_compartilhada), com um único checkout do pool.
+"""
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from database import conexao_compartilhada
+
+# Incrementar quando o formato das respostas mudar, para que ETags antigos
+# não validem um corpo com outra representação
+VERSAO_FORMATO = "2"
+
+
+# Base consolidada mais os incrementos de cada conexão (sql/010)
+SQL_VERSOES = """
+    SELECT tabela, SUM(versao)::bigint, MAX(alterado_em)
+    FROM (
+        SELECT tabela, versao, alterado_em FROM versao_tabela
+        UNION ALL
+        SELECT tabela, versao, alterado_em FROM versao_tabela_conexao
+    ) v
+    WHERE tabela = ANY(%s)
+    GROUP BY tabela
+"""
+
+
+def combinar_versoes(linhas, tabelas):
+    """(ETag, última alteração) a partir das linhas (tabela, versao, alterado_em)."""
+    versoes = {tabela: (versao, alterado_em) for tabela, versao, alterado_em in linhas}
+    etag = "-".join([VERSAO_FORMATO] + [str(versoes.get(tabela, (0, None))[0]) for tabela in tabelas])
+    alteracoes = [alterado_em for _, alterado_em in versoes.values() if alterado_em is not None]
+    ultima_alteracao = max(alteracoes) if alteracoes else None
+    if ultima_alteracao is not None:
+        # HTTP só tem precisão de segundos
+        ultima_alteracao = ultima_alteracao.replace(microsecond=0)
+    return etag, ultima_alteracao
+
+
+def versoes_tabelas(conn, tabelas):
+    """(ETag, última alteração) do conjunto de tabelas."""
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_VERSOES, (list(tabelas),))
+        linhas = cursor.fetchall()
+    conn.commit()
+    return combinar_versoes(linhas, tabelas)
+
+
+def consolidar_versoes(conn):
+    """
+    Soma à base as versões de conexões já encerradas (sql/010). Devolve
+    quantas linhas foram consolidadas.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT consolidar_versoes()")
+        consolidadas = cursor.fetchone()[0]
+    conn.commit()
+    return consolidadas
+
+
+def nao_modificado(etag, ultima_alteracao, if_none_match, if_modified_since):
+    """
+    True se o cliente já tem a versão atual. `if_none_match` é um ETags do
+    werkzeug (vazio se o cabeçalho não veio) e `if_modified_since` um
+    datetime ou None.
+    """
+    # If-None-Match tem precedência sobre If-Modified-Since (RFC 9110)
+    if if_none_match:
+        return if_none_match.contains(etag)
+    return (
+        if_modified_since is not None
+        and ultima_alteracao is not None
+        and ultima_alteracao <= if_modified_since
+    )
+
+
+def condicional(*tabelas):
+    """
+    Decorador para rotas GET cuja resposta depende apenas das `tabelas`
+    (e dos parâmetros da URL). Acrescenta ETag/Last-Modified às respostas 200
+    e responde 304 quando o cliente já tem a versão atual.
+    """
+    def decorador(view):
+        @wraps(view)
+        def envolvida(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            # A view recebe esta mesma conexão nos seus blocos connection()
+            with conexao_compartilhada() as conn:
+                if not conn:
+                    # Sem banco a própria rota responde com o erro de sempre
+                    return view(*args, **kwargs)
+                try:
+                    etag, ultima_alteracao = versoes_tabelas(conn, tabelas)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Aviso: não foi possível ler versao_tabela: {e}")
+                    return view(*args, **kwargs)
+
+                if nao_modificado(etag, ultima_alteracao, request.if_none_match, request.if_modified_since):
+                    resposta = Response(status=304)
+                else:
+                    resposta = make_response(view(*args, **kwargs))
+                    if resposta.status_code != 200:
+                        return resposta
+
+            resposta.set_etag(etag)
+            if ultima_alteracao is not None:
+                resposta.last_modified = ultima_alteracao
+            # O cliente pode guardar, mas deve revalidar a cada uso
+            resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador
@@ -0,0 +1,165 @@
+"""
+Comandos de manutenção do Flask CLI (flask --app app <comando>).
+"""
+import time
+from datetime import datetime
+
+import click
+
+from agregacao import (
+    NIVEIS_RESUMO, VIEWS_MATERIALIZADAS, atualizar_materializados, processar_periodos_sujos,
+    reprocessar_resumos,
+)
+from agendador import AGENDADOR_INTERVALO, Agendador
+from database import connection
+from migracoes import estado, migrar
+from particoes import PARTICOES_MESES_FUTUROS, PARTICOES_RETER_MESES, converter, manter_particoes
+
+
+def _data(ctx, param, valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise click.BadParameter("use o formato YYYY-MM-DD")
+
+
+def registrar_comandos(app):
+    @app.cli.command('migrar')
+    @click.option('--listar', is_flag=True, help='Só mostra as migrações aplicadas e pendentes')
+    def migrar_comando(listar):
+        """Aplica as migrações pendentes de sql/ (ver migracoes.py)."""
+        with connection() as conn:
+            if not conn:
+                raise click.ClickException("Erro ao conectar ao banco")
+            try:
+                if listar:
+                    for item in estado(conn):
+                        situacao = item['aplicada_em'].strftime('%Y-%m-%d %H:%M') if item['aplicada_em'] else 'pendente'
+                        click.echo(f"{item['nome']:36} {situacao}" + (" (alterada)" if item['alterada'] else ""))
+                    return
+                aplicadas = migrar(conn, progresso=click.echo)
+            except Exception as e:
+                raise click.ClickException(f"Erro ao aplicar migrações: {e}")
+
+        click.echo(f"{len(aplicadas)} migração(ões) aplicada(s)" if aplicadas else "Banco já está atualizado")
+
+    @app.cli.command('particionar-formularios')
+    @click.option('--meses-futuros', default=PARTICOES_MESES_FUTUROS, show_default=True,
+                  type=click.IntRange(min=0), help='Meses à frente criados já na conversão')
+    def particionar_formularios_comando(meses_futuros):
+        """Converte formularioporcasa em tabela particionada por mês (ver particoes.py)."""
+        with connection() as conn:
+            if not conn:
+                raise click.ClickException("Erro ao conectar ao banco")
+            try:
+                relatorio = converter(conn, meses_futuros)
+            except Exception as e:
+                raise click.ClickException(f"Erro ao particionar formularioporcasa: {e}")
+
+        if relatorio is None:
+            click.echo("formularioporcasa já é particionada")
+        else:
+            click.echo(f"linhas={relatorio['linhas']} particoes={relatorio['particoes']} {relatorio['duracao_ms']} ms")
+
+    @app.cli.command('manter-particoes')
+    @click.option('--meses-futuros', default=PARTICOES_MESES_FUTUROS, show_default=True,
+                  type=click.IntRange(min=0), help='Meses à frente com partição já criada')
+    @click.option('--reter-meses', default=PARTICOES_RETER_MESES, show_default=True,
+                  type=click.IntRange(min=0), help='Arquiva partições mais antigas que isso (0: nunca)')
+    def manter_particoes_comando(meses_futuros, reter_meses):
+        """Cria as próximas partições mensais e arquiva as antigas."""
+        with connection() as conn:
+            if not conn:
+                raise click.ClickException("Erro ao conectar ao banco")
+            try:
+                relatorio = manter_particoes(conn, meses_futuros, reter_meses)
+            except Exception as e:
+                raise click.ClickException(f"Erro na manutenção das partições: {e}")
+
+        if relatorio is None:
+            raise click.ClickException("formularioporcasa não é particionada: use `flask particionar-formularios`")
+        if relatorio['adiada']:
+            raise click.ClickException("Tabela ocupada (lock_timeout): tente de novo")
+        click.echo(
+            f"criadas={','.join(relatorio['criadas']) or '-'} "
+            f"arquivadas={','.join(relatorio['arquivadas']) or '-'} {relatorio['duracao_ms']} ms"
+        )
+
+    @app.cli.command('reprocessar-resumos')
+    @click.option('--inicio', required=True, callback=_data, help='Primeira data (YYYY-MM-DD)')
+    @click.option('--fim', required=True, callback=_data, help='Última data (YYYY-MM-DD)')
+    @click.option('--nivel', 'niveis', multiple=True, type=click.Choice(NIVEIS_RESUMO),
+                  help='Níveis a reconstruir (padrão: todos)')
+    def reprocessar_resumos_comando(inicio, fim, niveis):
+        """Reconstrói os resumos de um intervalo a partir dos formulários."""
+        if inicio > fim:
+            raise click.BadParameter("--inicio deve ser anterior ou igual a --fim")
+
+        with connection() as conn:
+            if not conn:
+                raise click.ClickException("Erro ao conectar ao banco")
+            try:
+                relatorio = reprocessar_resumos(conn, inicio, fim, niveis or NIVEIS_RESUMO)
+            except Exception as e:
+                raise click.ClickException(f"Erro ao reprocessar resumos: {e}")
+
+        for item in relatorio:
+            click.echo(
+                f"{item['nivel']:8} removidas={item['linhas_removidas']:<7} "
+                f"gravadas={item['linhas_gravadas']:<7} {item['duracao_ms']} ms"
+            )
+
+    @app.cli.command('atualizar-materializados')
+    @click.option('--nivel', 'niveis', multiple=True, type=click.Choice(tuple(VIEWS_MATERIALIZADAS)),
+                  help='Views a atualizar (padrão: todas)')
+    def atualizar_materializados_comando(niveis):
+        """Atualiza (CONCURRENTLY) as views materializadas de resumos."""
+        with connection() as conn:
+            if not conn:
+                raise click.ClickException("Erro ao conectar ao banco")
+            try:
+                relatorio = atualizar_materializados(conn, niveis or tuple(VIEWS_MATERIALIZADAS))
+            except Exception as e:
+                raise click.ClickException(f"Erro ao atualizar views materializadas: {e}")
+
+        for item in relatorio:
+            click.echo(f"{item['view']:18} linhas={item['linhas']:<7} {item['duracao_ms']} ms")
+
+    @app.cli.command('processar-pendentes')
+    @click.option('--continuo', is_flag=True, help='Repete até ser interrompido (Ctrl+C)')
+    @click.option('--intervalo', default=30, show_default=True, type=click.IntRange(min=1),
+                  help='Segundos entre execuções com --continuo')
+    def processar_pendentes_comando(continuo, intervalo):
+        """Refaz só os resumos dos períodos marcados como sujos."""
+        while True:
+            with connection() as conn:
+                if not conn:
+                    raise click.ClickException("Erro ao conectar ao banco")
+                try:
+                    relatorio = processar_periodos_sujos(conn)
+                except Exception as e:
+                    raise click.ClickException(f"Erro ao processar períodos pendentes: {e}")
+
+            click.echo(
+                f"periodos={relatorio['periodos']} diarios={relatorio['diarios']} "
+                f"semanais={relatorio['semanais']} mensais={relatorio['mensais']} "
+                f"restantes={relatorio['restantes']} {relatorio['duracao_ms']} ms"
+                + (" (outro processo em andamento)" if relatorio['em_andamento'] else "")
+            )
+            if not continuo:
+                break
+            time.sleep(intervalo)
+
+    @app.cli.command('agendador')
+    @click.option('--intervalo', default=AGENDADOR_INTERVALO, show_default=True, type=click.FloatRange(min=1),
+                  help='Segundos entre ciclos')
+    def agendador_comando(intervalo):
+        """Roda o agendador de resumos em primeiro plano (Ctrl+C para sair)."""
+        agendador = Agendador(app, intervalo)
+        try:
+            while True:
+                agendador.ciclo()
+                click.echo(f"ciclo concluído ({'líder' if agendador.lider else 'seguidor'})")
+                time.sleep(intervalo)
+        finally:
+            agendador.parar()
@@ -1,13 +1,31 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
 from dotenv import load_dotenv
+from flask import g, has_app_context
+
+import metricas
+import perfilador
 
 load_dotenv()
 
+# Configuração do pool (pode ser ajustada por variáveis de ambiente)
+POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+# Conexões ociosas há mais tempo que isso são validadas com SELECT 1 antes de reutilizar
+POOL_VALIDAR_APOS = float(os.getenv('DB_POOL_VALIDAR_APOS', 30))
+
+
 def get_connection():
     """
     Retorna uma conexão psycopg2 ou None em caso de falha.
     Use com cuidado: sempre feche a conexão após uso.
+    Nas rotas prefira `connection()`, que reaproveita conexões do pool.
     """
     try:
         database_url = os.getenv('DATABASE_URL')
@@ -17,4 +35,390 @@ def get_connection():
         return connection
     except Exception as e:
         print(f"Erro ao conectar ao PostgreSQL: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+class _CursorMedido:
+    """
+    Mixin que registra a duração de cada consulta na requisição corrente
+    (metricas.py) e no perfilador (consultas lentas, N+1).
+    """
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _registrar_consulta(self.connection, query, vars, time.perf_counter() - inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _registrar_consulta(self.connection, query, None, time.perf_counter() - inicio)
+
+
+def _registrar_consulta(conn, query, parametros, duracao):
+    metricas.registrar_consulta(duracao)
+    lenta = perfilador.registrar(query, parametros, duracao)
+    if lenta is not None:
+        _explicar(conn, query, parametros, lenta)
+
+
+def _explicar(conn, query, parametros, registro):
+    """EXPLAIN (ANALYZE, BUFFERS) da consulta lenta, isolado em um savepoint."""
+    if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        return
+    prefixo = 'EXPLAIN (ANALYZE, BUFFERS) '
+    query = (prefixo.encode() if isinstance(query, bytes) else prefixo) + query
+    # Cursor simples, fora da medição
+    cursor = psycopg2.extensions.cursor(conn)
+    try:
+        savepoint = not conn.autocommit
+        if savepoint:
+            cursor.execute("SAVEPOINT perfil_explain")
+        try:
+            cursor.execute(query, parametros)
+            perfilador.anexar_plano(registro, [linha[0] for linha in cursor.fetchall()])
+        except Exception as e:
+            print(f"Aviso: EXPLAIN da consulta lenta falhou: {e}")
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT perfil_explain")
+            return
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT perfil_explain")
+    finally:
+        cursor.close()
+
+
+_cursores_medidos = {}
+
+
+def _cursor_medido(classe):
+    """Subclasse medida de uma cursor_factory (criada uma vez por classe)."""
+    medido = _cursores_medidos.get(classe)
+    if medido is None:
+        medido = _cursores_medidos[classe] = type(classe.__name__, (_CursorMedido, classe), {})
+    return medido
+
+
+class ConexaoMedida(psycopg2.extensions.connection):
+    """Conexão do pool: todo cursor criado nela mede suas consultas."""
+
+    def cursor(self, *args, **kwargs):
+        classe = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _cursor_medido(classe)
+        return super().cursor(*args, **kwargs)
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite de checkout."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe com tamanho mínimo/máximo, timeout de
+    checkout e validação de conexões ociosas.
+
+    Cada processo (worker do gunicorn) precisa do seu próprio pool: conexões
+    não podem ser compartilhadas entre processos após o fork.
+    """
+
+    def __init__(self, dsn, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT,
+                 validar_apos=POOL_VALIDAR_APOS):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Configuração de pool inválida: verifique DB_POOL_MIN/DB_POOL_MAX")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validar_apos = validar_apos
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition(threading.Lock())
+        self._ociosas = []  # pilha de (conexão, momento em que foi devolvida)
+        self._em_uso = set()
+        self._abrindo = 0
+        self._fechado = False
+
+        # Estatísticas acumuladas
+        self._checkouts = 0
+        self._timeouts = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+        for _ in range(minconn):
+            self._ociosas.append((self._conectar(), time.monotonic()))
+
+    def _conectar(self):
+        return psycopg2.connect(self.dsn, connection_factory=ConexaoMedida)
+
+    def _total(self):
+        return len(self._ociosas) + len(self._em_uso) + self._abrindo
+
+    def _conexao_valida(self, conn, ociosa_desde):
+        if conn.closed:
+            return False
+        if time.monotonic() - ociosa_desde < self.validar_apos:
+            return True
+        try:
+            # Cursor simples: a validação não conta como consulta da requisição
+            with psycopg2.extensions.cursor(conn) as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conn):
+        self._descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """Retira uma conexão do pool, aguardando no máximo `timeout` segundos."""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        prazo = inicio + timeout
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._fechado:
+                        raise PoolEsgotado("Pool de conexões encerrado")
+                    if self._ociosas:
+                        conn, ociosa_desde = self._ociosas.pop()
+                        criar = False
+                        break
+                    if self._total() < self.maxconn:
+                        self._abrindo += 1
+                        conn, ociosa_desde = None, None
+                        criar = True
+                        break
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolEsgotado(
+                            f"Nenhuma conexão livre após {timeout:.1f}s (máximo {self.maxconn})"
+                        )
+                    self._cond.wait(restante)
+
+            # Validação e abertura de conexões acontecem fora do lock
+            if criar:
+                try:
+                    conn = self._conectar()
+                except Exception:
+                    with self._cond:
+                        self._abrindo -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._abrindo -= 1
+                    self._em_uso.add(conn)
+                    self._registrar_checkout(inicio)
+                return conn
+
+            if self._conexao_valida(conn, ociosa_desde):
+                with self._cond:
+                    self._em_uso.add(conn)
+                    self._registrar_checkout(inicio)
+                return conn
+
+            # Conexão velha ou quebrada: descarta e tenta de novo
+            with self._cond:
+                self._descartar(conn)
+                self._cond.notify()
+
+    def _registrar_checkout(self, inicio):
+        espera = time.monotonic() - inicio
+        self._checkouts += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+
+    def putconn(self, conn, descartar=False):
+        """Devolve a conexão ao pool, desfazendo qualquer transação pendente."""
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._cond:
+            self._em_uso.discard(conn)
+            if descartar or conn.closed or self._fechado:
+                self._descartar(conn)
+            else:
+                self._ociosas.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._fechado = True
+            for conn, _ in self._ociosas:
+                self._descartar(conn)
+            self._ociosas = []
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                "pid": self.pid,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "em_uso": len(self._em_uso),
+                "ociosas": len(self._ociosas),
+                "abrindo": self._abrindo,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "descartadas": self._descartadas,
+                "espera_media_ms": round(self._espera_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(**kwargs):
+    """
+    Cria o pool do processo atual. Deve ser chamado após o fork de cada
+    worker (ex.: hook post_fork do gunicorn); se não for, o pool é criado
+    sob demanda no primeiro uso.
+    """
+    global _pool
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL não definido no .env")
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            return _pool
+        # Um pool herdado do processo pai não pode ser usado: as conexões
+        # pertencem ao pai, então apenas esquecemos a referência.
+        _pool = ConnectionPool(database_url, **kwargs)
+        return _pool
+
+
+def get_pool():
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        pool = init_pool()
+    return pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def pool_stats():
+    """Estatísticas do pool do processo atual (None se ainda não foi criado)."""
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.estatisticas()
+
+
+def _retirar(timeout):
+    """(pool, conexão), ou (None, None) se não for possível obter conexão."""
+    try:
+        pool = get_pool()
+        return pool, pool.getconn(timeout)
+    except Exception as e:
+        print(f"Erro ao conectar ao PostgreSQL: {e}")
+        metricas.contar('db_erros_conexao_total')
+        return None, None
+
+
+class _ConexaoCompartilhada:
+    """Conexão de conexao_compartilhada() e quantos blocos ainda a usam."""
+
+    __slots__ = ('pool', 'conn', 'usos')
+
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+        self.usos = 1
+
+    def liberar(self):
+        # Só o último bloco devolve (e desfaz o que ficou pendente)
+        self.usos -= 1
+        if self.usos == 0:
+            self.pool.putconn(self.conn)
+
+
+@contextmanager
+def connection(timeout=None):
+    """
+    Empresta uma conexão do pool durante o bloco `with`.
+
+    Entrega None (como get_connection) se não for possível obter conexão,
+    para que as rotas respondam com erro 500. A conexão sempre volta ao
+    pool na saída do bloco, inclusive em returns antecipados e exceções;
+    transações não confirmadas são desfeitas.
+
+    Dentro de conexao_compartilhada() a conexão é a dela, sem novo checkout.
+    """
+    compartilhada = g.get('_conexao_compartilhada') if has_app_context() else None
+    if compartilhada is not None:
+        compartilhada.usos += 1
+        try:
+            yield compartilhada.conn
+        finally:
+            compartilhada.liberar()
+        return
+
+    pool, conn = _retirar(timeout)
+    if conn is None:
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+@contextmanager
+def conexao_compartilhada(timeout=None):
+    """
+    Como connection(), mas os blocos connection() abertos durante este bloco
+    na mesma requisição (flask.g) recebem a mesma conexão em vez de retirar
+    outra do pool. Ela volta ao pool quando o último desses blocos termina,
+    o que pode ser depois deste (respostas em streaming).
+    """
+    pool, conn = _retirar(timeout)
+    if conn is None:
+        yield None
+        return
+
+    compartilhada = _ConexaoCompartilhada(pool, conn)
+    anterior = g.get('_conexao_compartilhada')
+    g._conexao_compartilhada = compartilhada
+    try:
+        yield conn
+    finally:
+        g._conexao_compartilhada = anterior
+        compartilhada.liberar()
+
+
+def _metricas_pool():
+    estatisticas = pool_stats()
+    if estatisticas is None:
+        return []
+    return [
+        ('pool_conexoes', {'estado': 'em_uso', 'pool': 'sync'}, estatisticas['em_uso']),
+        ('pool_conexoes', {'estado': 'ociosas', 'pool': 'sync'}, estatisticas['ociosas']),
+        ('pool_conexoes', {'estado': 'max', 'pool': 'sync'}, estatisticas['max']),
+    ]
+
+
+metricas.registrar_coletor(_metricas_pool)
@@ -0,0 +1,196 @@
+"""
+Pool de conexões asyncpg do modo assíncrono (asgi.py).
+
+Usa o mesmo DATABASE_URL do app Flask. As consultas são compartilhadas com
+as rotas síncronas e escritas no estilo do psycopg2 (%s); sql_asyncpg as
+converte para os parâmetros numerados ($1, $2...) do asyncpg.
+"""
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+import asyncpg
+from dotenv import load_dotenv
+
+import metricas
+import perfilador
+
+load_dotenv()
+
+# Um processo assíncrono atende muitas requisições ao mesmo tempo, então o
+# pool dele costuma ser maior que o de um worker síncrono
+ASYNC_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', 2))
+ASYNC_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_MAX', 20))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+
+_PARAMETRO = re.compile(r'%s')
+
+_pool = None
+# Conexão de conexao_compartilhada() na tarefa corrente
+_compartilhada = ContextVar('conexao_compartilhada', default=None)
+
+
+@lru_cache(maxsize=256)
+def sql_asyncpg(sql):
+    """Troca os %s da consulta por $1, $2... (as consultas não usam % literal)."""
+    contador = iter(range(1, sql.count('%s') + 1))
+    return _PARAMETRO.sub(lambda _: f'${next(contador)}', sql)
+
+
+async def _configurar_conexao(conn):
+    # O psycopg2 entrega xid8 (sync_xid) como texto; mantém o mesmo JSON
+    await conn.set_type_codec('xid8', schema='pg_catalog', encoder=str, decoder=str, format='text')
+
+
+async def criar_pool():
+    global _pool
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL não definido no .env")
+    _pool = await asyncpg.create_pool(
+        database_url, min_size=ASYNC_POOL_MIN, max_size=ASYNC_POOL_MAX, init=_configurar_conexao,
+    )
+    return _pool
+
+
+async def fechar_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+
+def pool_stats():
+    """Estatísticas do pool (None se ainda não foi criado)."""
+    if _pool is None:
+        return None
+    return {
+        "pid": os.getpid(),
+        "min": _pool.get_min_size(),
+        "max": _pool.get_max_size(),
+        "tamanho": _pool.get_size(),
+        "ociosas": _pool.get_idle_size(),
+    }
+
+
+class ConexaoMedida:
+    """
+    Conexão emprestada que registra a duração das consultas na requisição
+    corrente (metricas.py) e no perfilador. O logger de consultas do asyncpg
+    chama o callback fora da tarefa da requisição, por isso a medição fica
+    aqui.
+    """
+
+    __slots__ = ('conexao',)
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __getattr__(self, nome):
+        return getattr(self.conexao, nome)
+
+    async def _medir(self, metodo, query, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            resultado = await metodo(query, *args, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            metricas.registrar_consulta(duracao)
+            lenta = perfilador.registrar(query, args, duracao)
+        if lenta is not None:
+            await self._explicar(query, args, lenta)
+        return resultado
+
+    async def _explicar(self, query, args, registro):
+        # Dentro de uma transação uma falha do EXPLAIN a abortaria
+        if self.conexao.is_in_transaction():
+            return
+        try:
+            linhas = await self.conexao.fetch('EXPLAIN (ANALYZE, BUFFERS) ' + query, *args)
+            perfilador.anexar_plano(registro, [linha[0] for linha in linhas])
+        except Exception as e:
+            print(f"Aviso: EXPLAIN da consulta lenta falhou: {e}")
+
+    def execute(self, *args, **kwargs):
+        return self._medir(self.conexao.execute, *args, **kwargs)
+
+    def fetch(self, *args, **kwargs):
+        return self._medir(self.conexao.fetch, *args, **kwargs)
+
+    def fetchrow(self, *args, **kwargs):
+        return self._medir(self.conexao.fetchrow, *args, **kwargs)
+
+    def fetchval(self, *args, **kwargs):
+        return self._medir(self.conexao.fetchval, *args, **kwargs)
+
+
+async def emprestar():
+    """Retira uma conexão do pool, ou None (como database.connection) se não for possível."""
+    try:
+        if _pool is None:
+            raise RuntimeError("Pool assíncrono não iniciado")
+        return ConexaoMedida(await _pool.acquire(timeout=POOL_TIMEOUT))
+    except Exception as e:
+        print(f"Erro ao conectar ao PostgreSQL: {e}")
+        metricas.contar('db_erros_conexao_total')
+        return None
+
+
+async def devolver(conn):
+    await _pool.release(conn.conexao)
+
+
+@asynccontextmanager
+async def connection():
+    """
+    Empresta uma conexão durante o bloco `async with` (None se não houver).
+    Dentro de conexao_compartilhada() a conexão é a dela, sem novo checkout.
+    """
+    compartilhada = _compartilhada.get()
+    if compartilhada is not None:
+        yield compartilhada
+        return
+
+    conn = await emprestar()
+    if conn is None:
+        yield None
+        return
+    try:
+        yield conn
+    finally:
+        await devolver(conn)
+
+
+@asynccontextmanager
+async def conexao_compartilhada():
+    """
+    Como connection(), mas os blocos connection() abertos durante este, na
+    mesma tarefa, recebem a mesma conexão (equivalente de
+    database.conexao_compartilhada). Os streams usam emprestar() e têm a sua.
+    """
+    async with connection() as conn:
+        if conn is None:
+            yield None
+            return
+        token = _compartilhada.set(conn)
+        try:
+            yield conn
+        finally:
+            _compartilhada.reset(token)
+
+
+def _metricas_pool():
+    estatisticas = pool_stats()
+    if estatisticas is None:
+        return []
+    return [
+        ('pool_conexoes', {'estado': 'em_uso', 'pool': 'async'}, estatisticas['tamanho'] - estatisticas['ociosas']),
+        ('pool_conexoes', {'estado': 'ociosas', 'pool': 'async'}, estatisticas['ociosas']),
+        ('pool_conexoes', {'estado': 'max', 'pool': 'async'}, estatisticas['max']),
+    ]
+
+
+metricas.registrar_coletor(_metricas_pool)
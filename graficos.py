@@ -0,0 +1,207 @@
+"""
+Figuras Plotly dos resumos.
+
+Importado apenas pelos processos de renderização em imagem
+(renderizacao.py), nunca pelos workers web; as funções recebem
+as linhas do resumo já lidas do banco como lista de dicionários. As rotas
+JSON montam os mesmos gráficos sem o Plotly (graficos_json.py), então
+qualquer mudança aqui deve ser repetida lá.
+"""
+from datetime import timedelta
+
+import plotly.graph_objects as go
+import plotly.express as px
+
+LARGURA_PNG = 1200
+ALTURA_PNG = 700
+
+
+def figura_diaria_imagem(data_selecionada, dados_list):
+    """Gráfico principal do dia: comparação entre agentes"""
+    return px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        title=f'Comparação de Agentes - {data_selecionada}',
+        labels={'value': 'Quantidade', 'variable': 'Métrica'},
+        barmode='group'
+    )
+
+
+def figuras_diarias_zip(data_selecionada, dados_list):
+    """Lista de (nome do arquivo, figura) com todos os gráficos do dia"""
+    data = data_selecionada.isoformat()
+
+    fig1 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        title=f'Comparação de Agentes - {data_selecionada}',
+        barmode='group'
+    )
+
+    fig2 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_criaduros_encontrados', 'total_criaduros_eliminados'],
+        title=f'Criaduros - {data_selecionada}',
+        barmode='group'
+    )
+
+    fig3 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_larvas_encontradas', 'total_larvas_coletadas'],
+        title=f'Larvas - {data_selecionada}',
+        barmode='group'
+    )
+
+    return [
+        (f'comparacao_agentes_{data}.png', fig1),
+        (f'criaduros_{data}.png', fig2),
+        (f'larvas_{data}.png', fig3),
+    ]
+
+
+def figuras_graficos_diarios(data_selecionada, dados_list):
+    """Lista de (nome, figura) dos gráficos diários em JSON"""
+    # Gráfico 1: Comparação entre agentes (métricas principais)
+    fig1 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        title=f'Comparação de Agentes - {data_selecionada}',
+        labels={'value': 'Quantidade', 'variable': 'Métrica', 'idagente': 'Agente'},
+        barmode='group'
+    )
+
+    # Gráfico 2: Criaduros encontrados vs eliminados
+    fig2 = go.Figure()
+    for agente in dados_list:
+        fig2.add_trace(go.Bar(
+            name=f'Agente {agente["idagente"]}',
+            x=['Encontrados', 'Eliminados'],
+            y=[agente['total_criaduros_encontrados'], agente['total_criaduros_eliminados']],
+            text=[agente['total_criaduros_encontrados'], agente['total_criaduros_eliminados']],
+            textposition='auto'
+        ))
+    fig2.update_layout(title=f'Criaduros - {data_selecionada}', barmode='group')
+
+    # Gráfico 3: Larvas encontradas vs coletadas
+    fig3 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_larvas_encontradas', 'total_larvas_coletadas'],
+        title=f'Larvas - {data_selecionada}',
+        labels={'value': 'Quantidade', 'variable': 'Tipo'},
+        barmode='group'
+    )
+
+    return [("comparacao_agentes", fig1), ("criaduros", fig2), ("larvas", fig3)]
+
+
+def figuras_graficos_semanais(inicio_semana, fim_semana, dados_list):
+    """Lista de (nome, figura) dos gráficos semanais"""
+    # Gráfico 1: Métricas principais da semana
+    fig1 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        title=f'Resumo Semanal - {inicio_semana} a {fim_semana}',
+        labels={'value': 'Quantidade', 'variable': 'Métrica'},
+        barmode='group'
+    )
+
+    # Gráfico 2: Eficiência na eliminação de criaduros
+    eficiencia_data = []
+    for agente in dados_list:
+        encontrados = agente['total_criaduros_encontrados'] or 0
+        if encontrados > 0:
+            eficiencia = ((agente['total_criaduros_eliminados'] or 0) / encontrados) * 100
+        else:
+            eficiencia = 0
+        eficiencia_data.append({
+            'idagente': agente['idagente'],
+            'eficiencia': round(eficiencia, 2)
+        })
+
+    fig2 = px.bar(
+        eficiencia_data,
+        x='idagente',
+        y='eficiencia',
+        title='Eficiência na Eliminação de Criaduros (%)',
+        labels={'eficiencia': 'Eficiência (%)', 'idagente': 'Agente'}
+    )
+
+    # Gráfico 3: Pizza - Distribuição de atividades
+    totais = {
+        'Domicílios Visitados': sum([d['total_domicilios_visitados'] or 0 for d in dados_list]),
+        'Pontos Críticos': sum([d['total_pontos_criticos'] or 0 for d in dados_list]),
+        'Casos Suspeitos': sum([d['total_casos_suspeitos'] or 0 for d in dados_list])
+    }
+
+    fig3 = px.pie(
+        values=list(totais.values()),
+        names=list(totais.keys()),
+        title='Distribuição de Atividades da Semana'
+    )
+
+    return [("metricas_principais", fig1), ("eficiencia_criaduros", fig2), ("distribuicao_atividades", fig3)]
+
+
+def figuras_graficos_mensais(inicio_mes, dados_list):
+    """Lista de (nome, figura) dos gráficos mensais"""
+    # Gráfico 1: Comparação mensal entre agentes
+    fig1 = px.bar(
+        dados_list,
+        x='idagente',
+        y=['total_domicilios_visitados_mes', 'total_pontos_criticos_mes', 'total_casos_suspeitos_mes'],
+        title=f'Resumo Mensal - {inicio_mes.strftime("%B %Y")}',
+        labels={'value': 'Quantidade', 'variable': 'Métrica'},
+        barmode='group'
+    )
+
+    # Gráfico 2: Evolução de larvas e adultos coletados
+    fig2 = go.Figure()
+    fig2.add_trace(go.Bar(name='Larvas Coletadas', 
+                         x=[d['idagente'] for d in dados_list],
+                         y=[d['total_larvas_coletadas_mes'] for d in dados_list]))
+    fig2.add_trace(go.Bar(name='Adultos Coletados', 
+                         x=[d['idagente'] for d in dados_list],
+                         y=[d['total_adultos_coletados_mes'] for d in dados_list]))
+    fig2.update_layout(title='Coleta de Larvas e Adultos', barmode='group')
+
+    # Gráfico 3: Heatmap de produtividade
+    metricas = ['Domicílios', 'Pontos Críticos', 'Criaduros Elim', 'Larvas Colet', 'Adultos Colet']
+    valores = []
+    for agente in dados_list:
+        valores.append([
+            agente['total_domicilios_visitados_mes'],
+            agente['total_pontos_criticos_mes'],
+            agente['total_criaduros_eliminados_mes'],
+            agente['total_larvas_coletadas_mes'],
+            agente['total_adultos_coletados_mes']
+        ])
+
+    fig3 = px.imshow(
+        valores,
+        x=metricas,
+        y=[f'Agente {d["idagente"]}' for d in dados_list],
+        title='Heatmap de Produtividade Mensal',
+        aspect="auto",
+        color_continuous_scale='Viridis'
+    )
+
+    return [("comparacao_mensal", fig1), ("coleta_insetos", fig2), ("heatmap_produtividade", fig3)]
+
+
+def figuras_exportacao(nivel, inicio, dados_list):
+    """Lista de (nome do arquivo, figura) de um período na exportação em ZIP"""
+    if nivel == 'diario':
+        return figuras_diarias_zip(inicio, dados_list)
+
+    if nivel == 'semanal':
+        figuras = figuras_graficos_semanais(inicio, inicio + timedelta(days=6), dados_list)
+    else:
+        figuras = figuras_graficos_mensais(inicio, dados_list)
+    return [(f'{nome}_{inicio.isoformat()}.png', fig) for nome, fig in figuras]
@@ -0,0 +1,251 @@
+"""
+Gráficos dos resumos montados direto como JSON do Plotly.
+
+Produz as mesmas figuras de graficos.py (px.bar, px.pie, px.imshow e
+go.Bar), mas sem construir objetos Figure: nada de pandas, validação do
+Plotly nem o ciclo to_json -> loads -> jsonify. Cada gráfico é um dicionário
+montado a partir das linhas do resumo e serializado uma única vez na
+resposta.
+
+O template de layout (cores, fontes, eixos) é o padrão do Plotly instalado,
+lido uma vez por processo. tests/test_graficos_json.py compara a saída
+daqui com a de graficos.py nos nove gráficos, com linhas como as do
+RealDictCursor; benchmarks/bench_graficos.py mede o ganho.
+"""
+import json
+import threading
+from decimal import Decimal
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def _carregar_template():
+    """Template padrão do Plotly e escala Viridis (lidos uma vez)."""
+    global _template
+    with _template_lock:
+        if _template is None:
+            import plotly.colors
+            import plotly.io as pio
+            template = pio.templates[pio.templates.default].to_plotly_json()
+            viridis = plotly.colors.sequential.Viridis
+            _template = {
+                # Ida e volta pelo json deixa o dicionário igual ao do to_json
+                "layout": json.loads(json.dumps(template)),
+                "cores": template["layout"]["colorway"],
+                "viridis": [[i / (len(viridis) - 1), cor] for i, cor in enumerate(viridis)],
+            }
+        return _template
+
+
+def _numero(valor):
+    """Valor de uma linha do resumo como no JSON do Plotly.
+
+    SUM no PostgreSQL pode chegar como Decimal, que a resposta escreveria
+    como string; None (NULL) fica null, como o NaN do pandas no px.
+    """
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    return valor
+
+
+def _texto(valor):
+    """`text` de go.Bar: o Plotly converte para string, mas mantém null"""
+    valor = _numero(valor)
+    return None if valor is None else str(valor)
+
+
+def _eixos(titulo_x, titulo_y):
+    return {
+        "xaxis": {"anchor": "y", "domain": [0.0, 1.0], "title": {"text": titulo_x}},
+        "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "title": {"text": titulo_y}},
+    }
+
+
+def _barras_agrupadas(dados_list, colunas, titulo, rotulo_x, rotulo_valor, rotulo_variavel):
+    """Equivalente a px.bar(x='idagente', y=[colunas...], barmode='group')"""
+    template = _carregar_template()
+    cores = template["cores"]
+    x = [d['idagente'] for d in dados_list]
+    traces = []
+    for i, coluna in enumerate(colunas):
+        traces.append({
+            "alignmentgroup": "True",
+            "hovertemplate": f"{rotulo_variavel}={coluna}<br>{rotulo_x}=%{{x}}<br>{rotulo_valor}=%{{y}}<extra></extra>",
+            "legendgroup": coluna,
+            "marker": {"color": cores[i % len(cores)], "pattern": {"shape": ""}},
+            "name": coluna,
+            "offsetgroup": coluna,
+            "orientation": "v",
+            "showlegend": True,
+            "textposition": "auto",
+            "x": x,
+            "xaxis": "x",
+            "y": [_numero(d[coluna]) for d in dados_list],
+            "yaxis": "y",
+            "type": "bar",
+        })
+    layout = {"template": template["layout"]}
+    layout.update(_eixos(rotulo_x, rotulo_valor))
+    layout.update({
+        "legend": {"title": {"text": rotulo_variavel}, "tracegroupgap": 0},
+        "title": {"text": titulo},
+        "barmode": "group",
+    })
+    return {"data": traces, "layout": layout}
+
+
+def _barras(series, titulo):
+    """Equivalente a go.Figure com um go.Bar por série e barmode='group'"""
+    return {
+        "data": [dict(serie, type="bar") for serie in series],
+        "layout": {"template": _carregar_template()["layout"], "title": {"text": titulo}, "barmode": "group"},
+    }
+
+
+def graficos_diarios(data_selecionada, dados_list):
+    """Lista de (nome, figura) dos gráficos diários"""
+    comparacao = _barras_agrupadas(
+        dados_list,
+        ['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        f'Comparação de Agentes - {data_selecionada}', 'Agente', 'Quantidade', 'Métrica'
+    )
+
+    # O Plotly converte `text` para string
+    criaduros = _barras(
+        [{
+            "name": f'Agente {agente["idagente"]}',
+            "text": [_texto(agente['total_criaduros_encontrados']), _texto(agente['total_criaduros_eliminados'])],
+            "textposition": "auto",
+            "x": ['Encontrados', 'Eliminados'],
+            "y": [_numero(agente['total_criaduros_encontrados']), _numero(agente['total_criaduros_eliminados'])],
+        } for agente in dados_list],
+        f'Criaduros - {data_selecionada}'
+    )
+
+    larvas = _barras_agrupadas(
+        dados_list,
+        ['total_larvas_encontradas', 'total_larvas_coletadas'],
+        f'Larvas - {data_selecionada}', 'idagente', 'Quantidade', 'Tipo'
+    )
+
+    return [("comparacao_agentes", comparacao), ("criaduros", criaduros), ("larvas", larvas)]
+
+
+def graficos_semanais(inicio_semana, fim_semana, dados_list):
+    """Lista de (nome, figura) dos gráficos semanais"""
+    template = _carregar_template()
+
+    metricas = _barras_agrupadas(
+        dados_list,
+        ['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
+        f'Resumo Semanal - {inicio_semana} a {fim_semana}', 'idagente', 'Quantidade', 'Métrica'
+    )
+
+    eficiencias = []
+    for agente in dados_list:
+        encontrados = _numero(agente['total_criaduros_encontrados']) or 0
+        if encontrados > 0:
+            eficiencia = ((_numero(agente['total_criaduros_eliminados']) or 0) / encontrados) * 100
+        else:
+            eficiencia = 0
+        eficiencias.append(round(eficiencia, 2))
+
+    layout = {"template": template["layout"]}
+    layout.update(_eixos('Agente', 'Eficiência (%)'))
+    layout.update({
+        "legend": {"tracegroupgap": 0},
+        "title": {"text": 'Eficiência na Eliminação de Criaduros (%)'},
+        "barmode": "relative",
+    })
+    eficiencia_criaduros = {
+        "data": [{
+            "alignmentgroup": "True",
+            "hovertemplate": "Agente=%{x}<br>Eficiência (%)=%{y}<extra></extra>",
+            "legendgroup": "",
+            "marker": {"color": template["cores"][0], "pattern": {"shape": ""}},
+            "name": "",
+            "offsetgroup": "",
+            "orientation": "v",
+            "showlegend": False,
+            "textposition": "auto",
+            "x": [d['idagente'] for d in dados_list],
+            "xaxis": "x",
+            "y": eficiencias,
+            "yaxis": "y",
+            "type": "bar",
+        }],
+        "layout": layout,
+    }
+
+    distribuicao = {
+        "data": [{
+            "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+            "hovertemplate": "label=%{label}<br>value=%{value}<extra></extra>",
+            "labels": ['Domicílios Visitados', 'Pontos Críticos', 'Casos Suspeitos'],
+            "legendgroup": "",
+            "name": "",
+            "showlegend": True,
+            "values": [
+                sum(_numero(d['total_domicilios_visitados']) or 0 for d in dados_list),
+                sum(_numero(d['total_pontos_criticos']) or 0 for d in dados_list),
+                sum(_numero(d['total_casos_suspeitos']) or 0 for d in dados_list),
+            ],
+            "type": "pie",
+        }],
+        "layout": {
+            "template": template["layout"],
+            "legend": {"tracegroupgap": 0},
+            "title": {"text": 'Distribuição de Atividades da Semana'},
+        },
+    }
+
+    return [("metricas_principais", metricas), ("eficiencia_criaduros", eficiencia_criaduros),
+            ("distribuicao_atividades", distribuicao)]
+
+
+def graficos_mensais(inicio_mes, dados_list):
+    """Lista de (nome, figura) dos gráficos mensais"""
+    template = _carregar_template()
+    agentes = [d['idagente'] for d in dados_list]
+
+    comparacao = _barras_agrupadas(
+        dados_list,
+        ['total_domicilios_visitados_mes', 'total_pontos_criticos_mes', 'total_casos_suspeitos_mes'],
+        f'Resumo Mensal - {inicio_mes.strftime("%B %Y")}', 'idagente', 'Quantidade', 'Métrica'
+    )
+
+    coleta = _barras(
+        [{"name": 'Larvas Coletadas', "x": agentes, "y": [_numero(d['total_larvas_coletadas_mes']) for d in dados_list]},
+         {"name": 'Adultos Coletados', "x": agentes, "y": [_numero(d['total_adultos_coletados_mes']) for d in dados_list]}],
+        'Coleta de Larvas e Adultos'
+    )
+
+    heatmap = {
+        "data": [{
+            "coloraxis": "coloraxis",
+            "name": "0",
+            "x": ['Domicílios', 'Pontos Críticos', 'Criaduros Elim', 'Larvas Colet', 'Adultos Colet'],
+            "y": [f'Agente {d["idagente"]}' for d in dados_list],
+            "z": [[
+                _numero(agente['total_domicilios_visitados_mes']),
+                _numero(agente['total_pontos_criticos_mes']),
+                _numero(agente['total_criaduros_eliminados_mes']),
+                _numero(agente['total_larvas_coletadas_mes']),
+                _numero(agente['total_adultos_coletados_mes'])
+            ] for agente in dados_list],
+            "type": "heatmap",
+            "xaxis": "x",
+            "yaxis": "y",
+            "hovertemplate": "x: %{x}<br>y: %{y}<br>color: %{z}<extra></extra>",
+        }],
+        "layout": {
+            "template": template["layout"],
+            "xaxis": {"anchor": "y", "domain": [0.0, 1.0]},
+            "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "autorange": "reversed"},
+            "coloraxis": {"colorscale": template["viridis"]},
+            "title": {"text": 'Heatmap de Produtividade Mensal'},
+        },
+    }
+
+    return [("comparacao_mensal", comparacao), ("coleta_insetos", coleta), ("heatmap_produtividade", heatmap)]
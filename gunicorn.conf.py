@@ -0,0 +1,145 @@
+"""
+Configuração do gunicorn para produção (gunicorn app:app -c gunicorn.conf.py).
+
+Tudo pode ser ajustado por variáveis de ambiente:
+
+  PORT                      porta (padrão 5000)
+  GUNICORN_WORKER_CLASS     gthread (padrão) ou sync
+  GUNICORN_THREADS          threads por worker no gthread (padrão 4)
+  GUNICORN_WORKERS          número de processos (padrão: fórmula abaixo)
+  GUNICORN_DB_CONEXOES      conexões do Postgres reservadas para este serviço (padrão 40)
+  GUNICORN_RENDER_PROCESSOS processos do Kaleido (PNG) na máquina toda (padrão 4)
+  GUNICORN_PRELOAD          1 (padrão) carrega o app no master antes do fork
+  GUNICORN_MAX_REQUESTS     reciclar o worker após N requisições (padrão 1000, 0 desliga)
+  GUNICORN_TIMEOUT          segundos sem resposta até matar o worker (padrão 120)
+  METRICAS_DIR              diretório onde os workers somam as métricas de /metrics
+                            (o de workers encerrados vai para encerrados.json)
+
+Dimensionamento
+---------------
+Cada requisição em andamento usa no máximo uma conexão do pool do worker
+(os streams seguram a sua até o fim), então cada worker precisa de
+DB_POOL_MAX = threads, e o serviço inteiro abre até
+
+    conexões = workers × DB_POOL_MAX  (+1 do líder do agendador)
+
+que deve caber em GUNICORN_DB_CONEXOES, ou seja, no max_connections do
+Postgres menos as conexões reservadas e as de outros clientes (psql,
+migrações, outras instâncias). Daí o padrão:
+
+    threads   = GUNICORN_THREADS (1 no sync)
+    workers   = min(2 × CPUs + 1, (GUNICORN_DB_CONEXOES - 1) // threads)
+    DB_POOL_MAX = threads  (se não definido)
+
+Com várias instâncias, divida GUNICORN_DB_CONEXOES entre elas.
+
+Cada worker também tem seu pool de renderização (renderizacao.py, criado só
+no primeiro PNG), e cada processo do Kaleido ocupa bem mais memória que um
+worker. O total da máquina fica em GUNICORN_RENDER_PROCESSOS, dividido
+entre os workers:
+
+    RENDER_WORKERS = max(1, GUNICORN_RENDER_PROCESSOS // workers)  (se não definido)
+
+Com mais workers que processos cada worker fica com 1 e o total passa do
+orçamento (aviso no log): reduza os workers ou aumente o orçamento.
+
+Memória
+-------
+Com preload o app é importado uma vez no master e os workers herdam os
+módulos por copy-on-write; gc.freeze() antes do fork evita que a coleta de
+lixo copie essas páginas. O template dos gráficos JSON (plotly.io) também é
+carregado no master (GRAFICOS_PRELOAD=0 desliga). max_requests recicla os
+workers, devolvendo a memória que respostas grandes (fetchall das
+listagens completas) deixam alocada; o jitter evita que todos reiniciem ao
+mesmo tempo.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+
+DB_CONEXOES = int(os.getenv('GUNICORN_DB_CONEXOES', 40))
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    max(1, min(2 * multiprocessing.cpu_count() + 1, (DB_CONEXOES - 1) // threads)),
+))
+
+# O pool de cada worker acompanha as threads; database.py lê a variável ao
+# ser importado, o que acontece depois deste arquivo
+os.environ.setdefault('DB_POOL_MAX', str(threads))
+
+# O mesmo para o pool de renderização (renderizacao.py)
+RENDER_PROCESSOS = int(os.getenv('GUNICORN_RENDER_PROCESSOS', 4))
+os.environ.setdefault('RENDER_WORKERS', str(max(1, RENDER_PROCESSOS // workers)))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Heartbeat dos workers em memória (em contêiner /tmp pode ser overlay lento)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Descarta as métricas de workers de uma execução anterior."""
+    import metricas
+    metricas.limpar_diretorio()
+
+
+def when_ready(server):
+    """No master, depois do preload e antes de criar os workers."""
+    conexoes = workers * int(os.environ['DB_POOL_MAX']) + 1
+    server.log.info(
+        f"{workers} workers {worker_class} x {threads} threads, DB_POOL_MAX={os.environ['DB_POOL_MAX']}: "
+        f"até {conexoes} conexões (orçamento GUNICORN_DB_CONEXOES={DB_CONEXOES})"
+    )
+    if conexoes > DB_CONEXOES:
+        server.log.warning("Conexões possíveis acima de GUNICORN_DB_CONEXOES: reduza workers ou DB_POOL_MAX")
+
+    renderizadores = workers * int(os.environ['RENDER_WORKERS'])
+    server.log.info(f"RENDER_WORKERS={os.environ['RENDER_WORKERS']}: até {renderizadores} processos do Kaleido "
+                    f"(orçamento GUNICORN_RENDER_PROCESSOS={RENDER_PROCESSOS})")
+    if renderizadores > RENDER_PROCESSOS:
+        server.log.warning("Processos de renderização acima de GUNICORN_RENDER_PROCESSOS: "
+                           "reduza workers ou RENDER_WORKERS")
+
+    if preload_app:
+        if os.getenv('GRAFICOS_PRELOAD', '1') == '1':
+            import graficos_json
+            graficos_json._carregar_template()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """Cada worker cria o próprio pool (conexões não sobrevivem ao fork)."""
+    import database
+    try:
+        database.init_pool()
+    except Exception as e:
+        # Sem banco o worker sobe mesmo assim; o pool é recriado no primeiro uso
+        server.log.warning(f"Worker {worker.pid}: pool não iniciado ({e})")
+
+
+def worker_exit(server, worker):
+    """No worker que sai: fecha o pool e grava o último retrato das métricas."""
+    import database
+    import metricas
+    database.close_pool()
+    metricas.exportar()
+
+
+def child_exit(server, worker):
+    """No master: soma as métricas do worker encerrado e apaga o retrato dele."""
+    import metricas
+    metricas.encerrar_processo(worker.pid)
@@ -0,0 +1,464 @@
+"""
+Métricas da aplicação no formato texto do Prometheus (GET /metrics).
+
+Contadores e histogramas ficam em fragmentos por thread: quem registra só
+mexe no fragmento da própria thread, sem lock; a leitura em /metrics soma
+os fragmentos (copiar um dict é atômico sob o GIL). O custo por requisição
+é de algumas operações de dicionário e chamadas a perf_counter. Os
+fragmentos de threads encerradas são somados a um total do processo e
+descartados, então a lista acompanha as threads vivas.
+
+Cada processo tem as suas métricas. Com vários workers do gunicorn, defina
+METRICAS_DIR (um diretório local compartilhado): cada processo grava seu
+retrato lá (<pid>.json) a cada METRICAS_INTERVALO segundos e /metrics soma
+os de todos. Quando um worker sai, o master (hook child_exit em
+gunicorn.conf.py) soma os contadores e histogramas dele em encerrados.json
+e apaga o retrato, para que os totais não diminuam quando um worker é
+reciclado e o diretório não cresça; medidores (em andamento, pool) só
+contam processos vivos. Retratos sem atualização há mais de
+METRICAS_EXPIRAR segundos (processo que morreu sem passar pelo hook) são
+ignorados. gunicorn.conf.py limpa o diretório ao iniciar.
+
+O tempo de banco por requisição vem das conexões do pool (database.py e
+database_async.py), que registram cada consulta na requisição corrente.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+
+METRICAS_DIR = os.getenv('METRICAS_DIR')
+METRICAS_INTERVALO = float(os.getenv('METRICAS_INTERVALO', 5))
+# Bem acima de METRICAS_INTERVALO: um processo vivo regrava o seu a cada intervalo
+METRICAS_EXPIRAR = float(os.getenv('METRICAS_EXPIRAR', 60))
+ARQUIVO_ENCERRADOS = 'encerrados.json'
+PREFIXO = 'entomotrack_'
+
+# Limites (segundos) dos histogramas de duração
+BUCKETS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+DESCRICOES = {
+    'http_requisicoes_total': ('counter', 'Requisições atendidas por rota, método e status'),
+    'http_duracao_segundos': ('histogram', 'Latência das requisições por rota'),
+    'http_em_andamento': ('gauge', 'Requisições em andamento'),
+    'db_duracao_segundos': ('histogram', 'Tempo de banco por requisição'),
+    'db_consultas_por_requisicao': ('histogram', 'Consultas ao banco por requisição'),
+    'db_consultas_total': ('counter', 'Consultas ao banco por rota'),
+    'db_erros_conexao_total': ('counter', 'Falhas ao obter conexão do banco'),
+    'render_duracao_segundos': ('histogram', 'Tempo de montagem/renderização de gráficos'),
+    'cache_graficos_total': ('counter', 'Consultas ao cache de gráficos por resultado'),
+    'pool_conexoes': ('gauge', 'Conexões do pool por estado'),
+}
+
+_BUCKETS = {
+    'db_consultas_por_requisicao': BUCKETS_CONSULTAS,
+}
+
+
+class _Fragmento:
+    """Métricas registradas por uma thread."""
+
+    __slots__ = ('contadores', 'histogramas', 'medidores')
+
+    def __init__(self):
+        self.contadores = {}
+        self.histogramas = {}
+        self.medidores = {}
+
+
+_local = threading.local()
+_fragmentos = []  # [(weakref da thread, fragmento)]
+_fragmentos_lock = threading.Lock()
+# Soma dos fragmentos de threads que já terminaram
+_encerradas = _Fragmento()
+_coletores = []
+
+
+def _fragmento():
+    fragmento = getattr(_local, 'fragmento', None)
+    if fragmento is None:
+        fragmento = _local.fragmento = _Fragmento()
+        # Só na primeira métrica de cada thread
+        with _fragmentos_lock:
+            _recolher_encerradas()
+            _fragmentos.append((weakref.ref(threading.current_thread()), fragmento))
+        _garantir_exportador()
+    return fragmento
+
+
+def _somar_fragmento(destino, origem):
+    for chave, valor in list(origem.contadores.items()):
+        destino.contadores[chave] = destino.contadores.get(chave, 0) + valor
+    for chave, valor in list(origem.medidores.items()):
+        destino.medidores[chave] = destino.medidores.get(chave, 0) + valor
+    for chave, dados in list(origem.histogramas.items()):
+        total = destino.histogramas.get(chave)
+        destino.histogramas[chave] = list(dados) if total is None else [a + b for a, b in zip(total, dados)]
+
+
+def _recolher_encerradas():
+    """Soma em _encerradas os fragmentos de threads que terminaram (com _fragmentos_lock)."""
+    vivos = []
+    for ref, fragmento in _fragmentos:
+        thread = ref()
+        if thread is not None and thread.is_alive():
+            vivos.append((ref, fragmento))
+        else:
+            # A thread não registra mais nada: o fragmento não muda
+            _somar_fragmento(_encerradas, fragmento)
+    _fragmentos[:] = vivos
+
+
+def _chave(nome, rotulos):
+    return (nome, tuple(sorted(rotulos.items())) if rotulos else ())
+
+
+def contar(nome, valor=1, **rotulos):
+    contadores = _fragmento().contadores
+    chave = _chave(nome, rotulos)
+    contadores[chave] = contadores.get(chave, 0) + valor
+
+
+def somar_medidor(nome, valor, **rotulos):
+    """Soma (ou subtrai) em um medidor; o total é a soma dos fragmentos."""
+    medidores = _fragmento().medidores
+    chave = _chave(nome, rotulos)
+    medidores[chave] = medidores.get(chave, 0) + valor
+
+
+def observar(nome, valor, **rotulos):
+    histogramas = _fragmento().histogramas
+    chave = _chave(nome, rotulos)
+    dados = histogramas.get(chave)
+    limites = _BUCKETS.get(nome, BUCKETS_DURACAO)
+    if dados is None:
+        # [contagem por bucket..., +Inf, soma]
+        dados = histogramas[chave] = [0] * (len(limites) + 1) + [0.0]
+    for i, limite in enumerate(limites):
+        if valor <= limite:
+            dados[i] += 1
+            break
+    else:
+        dados[len(limites)] += 1
+    dados[-1] += valor
+
+
+class medir:
+    """Context manager que observa a duração do bloco: `with medir('render_duracao_segundos', tipo='png')`."""
+
+    __slots__ = ('nome', 'rotulos', 'inicio')
+
+    def __init__(self, nome, **rotulos):
+        self.nome = nome
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observar(self.nome, time.perf_counter() - self.inicio, **self.rotulos)
+
+
+def registrar_coletor(funcao):
+    """
+    Registra uma função chamada a cada leitura que devolve medidores
+    instantâneos como [(nome, {rótulos}, valor)] (ex.: estado do pool).
+    """
+    _coletores.append(funcao)
+
+
+# --- Requisição corrente --------------------------------------------------------
+
+class Requisicao:
+    """Tempo de banco e número de consultas da requisição em andamento."""
+
+    __slots__ = ('consultas', 'tempo_db')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+
+
+_requisicao = ContextVar('metricas_requisicao', default=None)
+
+
+def iniciar_requisicao():
+    """Marca o início de uma requisição no contexto atual (thread ou tarefa asyncio)."""
+    somar_medidor('http_em_andamento', 1)
+    return _requisicao.set(Requisicao()), time.perf_counter()
+
+
+def finalizar_requisicao(inicio, rota, metodo, status):
+    token, comeco = inicio
+    duracao = time.perf_counter() - comeco
+    requisicao = _requisicao.get()
+    _requisicao.reset(token)
+
+    somar_medidor('http_em_andamento', -1)
+    contar('http_requisicoes_total', rota=rota, metodo=metodo, status=str(status))
+    observar('http_duracao_segundos', duracao, rota=rota, metodo=metodo)
+    if requisicao is not None and requisicao.consultas:
+        contar('db_consultas_total', requisicao.consultas, rota=rota)
+        observar('db_duracao_segundos', requisicao.tempo_db, rota=rota)
+    observar('db_consultas_por_requisicao', requisicao.consultas if requisicao else 0, rota=rota)
+
+
+def registrar_consulta(duracao):
+    """Chamado pelas conexões instrumentadas após cada consulta."""
+    requisicao = _requisicao.get()
+    if requisicao is not None:
+        requisicao.consultas += 1
+        requisicao.tempo_db += duracao
+
+
+# --- Leitura -------------------------------------------------------------------
+
+def retrato():
+    """Soma dos fragmentos deste processo, em formato serializável."""
+    soma = _Fragmento()
+    with _fragmentos_lock:
+        _recolher_encerradas()
+        _somar_fragmento(soma, _encerradas)
+        fragmentos = [fragmento for _, fragmento in _fragmentos]
+    for fragmento in fragmentos:
+        _somar_fragmento(soma, fragmento)
+    for coletor in _coletores:
+        try:
+            for nome, rotulos, valor in coletor():
+                chave = _chave(nome, rotulos)
+                soma.medidores[chave] = soma.medidores.get(chave, 0) + valor
+        except Exception as e:
+            print(f"Aviso: coletor de métricas falhou: {e}")
+
+    return {
+        'pid': os.getpid(),
+        'contadores': _serializar(soma.contadores),
+        'histogramas': _serializar(soma.histogramas),
+        'medidores': _serializar(soma.medidores),
+    }
+
+
+def _serializar(itens):
+    return [[nome, list(rotulos), valor] for (nome, rotulos), valor in itens.items()]
+
+
+def _combinar(retratos):
+    """(contadores, histogramas, medidores) somados de vários retratos."""
+    contadores, histogramas, medidores = {}, {}, {}
+    for item in retratos:
+        for destino, chave_item in ((contadores, 'contadores'), (medidores, 'medidores')):
+            for nome, rotulos, valor in item[chave_item]:
+                chave = (nome, tuple(tuple(r) for r in rotulos))
+                destino[chave] = destino.get(chave, 0) + valor
+        for nome, rotulos, dados in item['histogramas']:
+            chave = (nome, tuple(tuple(r) for r in rotulos))
+            total = histogramas.get(chave)
+            histogramas[chave] = list(dados) if total is None else [a + b for a, b in zip(total, dados)]
+    return contadores, histogramas, medidores
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _retratos():
+    """Retrato deste processo e, com METRICAS_DIR, os dos demais."""
+    retratos = [retrato()]
+    if not METRICAS_DIR:
+        return retratos
+    try:
+        nomes = os.listdir(METRICAS_DIR)
+    except OSError:
+        return retratos
+    agora = time.time()
+    for nome in nomes:
+        if not nome.endswith('.json') or nome == f'{os.getpid()}.json':
+            continue
+        caminho = os.path.join(METRICAS_DIR, nome)
+        try:
+            if nome != ARQUIVO_ENCERRADOS and agora - os.path.getmtime(caminho) > METRICAS_EXPIRAR:
+                continue
+            with open(caminho) as arquivo:
+                outro = json.load(arquivo)
+        except (OSError, ValueError):
+            continue
+        if outro['pid'] is None or not _processo_vivo(outro['pid']):
+            outro['medidores'] = []
+        retratos.append(outro)
+    return retratos
+
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ''
+    partes = []
+    for nome, valor in rotulos:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nome}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def texto_prometheus():
+    """Todas as métricas no formato de exposição texto 0.0.4."""
+    contadores, histogramas, medidores = _combinar(_retratos())
+
+    por_nome = {}
+    for origem in (contadores, medidores, histogramas):
+        for (nome, rotulos), valor in origem.items():
+            por_nome.setdefault(nome, []).append((rotulos, valor))
+
+    linhas = []
+    for nome in sorted(por_nome):
+        tipo, descricao = DESCRICOES.get(nome, ('untyped', nome))
+        completo = PREFIXO + nome
+        linhas.append(f'# HELP {completo} {descricao}')
+        linhas.append(f'# TYPE {completo} {tipo}')
+        for rotulos, valor in sorted(por_nome[nome]):
+            if tipo != 'histogram':
+                linhas.append(f'{completo}{_rotulos_texto(rotulos)} {_numero(valor)}')
+                continue
+            limites = _BUCKETS.get(nome, BUCKETS_DURACAO)
+            acumulado = 0
+            for limite, quantidade in zip(limites + ('+Inf',), valor[:-1]):
+                acumulado += quantidade
+                rotulos_bucket = rotulos + (('le', str(limite)),)
+                linhas.append(f'{completo}_bucket{_rotulos_texto(rotulos_bucket)} {acumulado}')
+            linhas.append(f'{completo}_sum{_rotulos_texto(rotulos)} {_numero(valor[-1])}')
+            linhas.append(f'{completo}_count{_rotulos_texto(rotulos)} {acumulado}')
+    return '\n'.join(linhas) + '\n'
+
+
+# --- Exportação para METRICAS_DIR ------------------------------------------------
+
+_exportador_pid = None
+_exportador_lock = threading.Lock()
+
+
+def _gravar(nome, dados):
+    """Grava o JSON em METRICAS_DIR de forma atômica (quem lê nunca vê metade)."""
+    fd, temporario = tempfile.mkstemp(dir=METRICAS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, os.path.join(METRICAS_DIR, nome))
+
+
+def exportar():
+    """Grava o retrato deste processo agora (também no hook worker_exit)."""
+    if not METRICAS_DIR:
+        return
+    try:
+        _gravar(f'{os.getpid()}.json', retrato())
+    except Exception as e:
+        print(f"Aviso: não foi possível gravar métricas em {METRICAS_DIR}: {e}")
+
+
+def _exportar():
+    while True:
+        time.sleep(METRICAS_INTERVALO)
+        exportar()
+
+
+def _garantir_exportador():
+    """Uma thread de exportação por processo (a do master não sobrevive ao fork)."""
+    global _exportador_pid
+    if not METRICAS_DIR or _exportador_pid == os.getpid():
+        return
+    with _exportador_lock:
+        if _exportador_pid == os.getpid():
+            return
+        os.makedirs(METRICAS_DIR, exist_ok=True)
+        threading.Thread(target=_exportar, name='metricas', daemon=True).start()
+        _exportador_pid = os.getpid()
+
+
+def encerrar_processo(pid):
+    """
+    Soma os contadores e histogramas do retrato de um processo que saiu em
+    encerrados.json e apaga o retrato. Chamado pelo master do gunicorn
+    (child_exit), um worker por vez, antes que o pid possa ser reutilizado.
+    """
+    if not METRICAS_DIR:
+        return
+    caminho = os.path.join(METRICAS_DIR, f'{pid}.json')
+    try:
+        with open(caminho) as arquivo:
+            encerrado = json.load(arquivo)
+    except (OSError, ValueError):
+        encerrado = None
+
+    if encerrado is not None:
+        try:
+            with open(os.path.join(METRICAS_DIR, ARQUIVO_ENCERRADOS)) as arquivo:
+                acumulado = json.load(arquivo)
+        except (OSError, ValueError):
+            acumulado = {'contadores': [], 'histogramas': [], 'medidores': []}
+        contadores, histogramas, _ = _combinar([acumulado, encerrado])
+        try:
+            _gravar(ARQUIVO_ENCERRADOS, {
+                'pid': None,
+                'contadores': _serializar(contadores),
+                'histogramas': _serializar(histogramas),
+                'medidores': [],
+            })
+        except Exception as e:
+            print(f"Aviso: não foi possível gravar métricas em {METRICAS_DIR}: {e}")
+            return
+
+    try:
+        os.unlink(caminho)
+    except OSError:
+        pass
+
+
+def limpar_diretorio():
+    """Remove retratos de execuções anteriores (chamado pelo master do gunicorn)."""
+    if not METRICAS_DIR or not os.path.isdir(METRICAS_DIR):
+        return
+    for nome in os.listdir(METRICAS_DIR):
+        if nome.endswith(('.json', '.tmp')):
+            try:
+                os.unlink(os.path.join(METRICAS_DIR, nome))
+            except OSError:
+                pass
+
+
+# --- Flask ------------------------------------------------------------------------
+
+def instrumentar_flask(app):
+    """Mede todas as requisições do app e expõe GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _iniciar_metricas():
+        g._metricas = iniciar_requisicao()
+
+    @app.teardown_request
+    def _finalizar_metricas(exc):
+        inicio = g.pop('_metricas', None)
+        if inicio is None:
+            return
+        rota = request.url_rule.rule if request.url_rule is not None else '<sem rota>'
+        status = 500 if exc is not None else getattr(g, '_metricas_status', 0)
+        finalizar_requisicao(inicio, rota, request.method, status)
+
+    @app.after_request
+    def _status_metricas(resposta):
+        g._metricas_status = resposta.status_code
+        return resposta
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
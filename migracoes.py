@@ -0,0 +1,124 @@
+"""
+Migrações do esquema: os arquivos sql/NNN_*.sql, aplicados em ordem de nome.
+
+Cada arquivo roda em uma transação junto com o registro do seu nome em
+migracao_aplicada, então uma migração que falha não deixa nada pela metade
+e é tentada de novo na próxima execução. Os arquivos não devem ter
+BEGIN/COMMIT próprios.
+
+Uso:  flask --app app migrar            (aplica as pendentes)
+      flask --app app migrar --listar   (só mostra o estado)
+
+Bancos criados antes deste módulo, com os arquivos aplicados à mão via
+psql, podem rodar `flask migrar` normalmente: as migrações existentes são
+idempotentes e só passam a constar como aplicadas. Migrações novas também
+devem ser (IF NOT EXISTS, CREATE OR REPLACE).
+
+Uma trava consultiva serializa execuções simultâneas (vários deploys ou
+réplicas subindo ao mesmo tempo): a segunda espera e encontra as
+migrações já registradas.
+"""
+import glob
+import hashlib
+import os
+import time
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+
+# Chave de pg_advisory_xact_lock das migrações
+_TRAVA_MIGRACOES = 7301520152
+
+SQL_TABELA_CONTROLE = """
+    CREATE TABLE IF NOT EXISTS migracao_aplicada (
+        nome TEXT PRIMARY KEY,
+        checksum TEXT NOT NULL,
+        aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+        duracao_ms INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+def arquivos_migracao(diretorio=DIRETORIO_MIGRACOES):
+    """[(nome, caminho)] dos arquivos .sql do diretório, em ordem."""
+    return [(os.path.basename(caminho), caminho)
+            for caminho in sorted(glob.glob(os.path.join(diretorio, '*.sql')))]
+
+
+def _ler(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        conteudo = arquivo.read()
+    return conteudo, hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _travar(cursor):
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_TRAVA_MIGRACOES,))
+
+
+def _aplicadas(cursor):
+    cursor.execute("SELECT nome, checksum, aplicada_em FROM migracao_aplicada")
+    return {nome: (checksum, aplicada_em) for nome, checksum, aplicada_em in cursor.fetchall()}
+
+
+def estado(conn, diretorio=DIRETORIO_MIGRACOES):
+    """
+    Situação de cada arquivo: [{"nome", "aplicada_em", "alterada"}], com
+    aplicada_em None para as pendentes e alterada=True se o arquivo mudou
+    depois de aplicado.
+    """
+    with conn.cursor() as cursor:
+        _travar(cursor)
+        cursor.execute(SQL_TABELA_CONTROLE)
+        aplicadas = _aplicadas(cursor)
+    conn.commit()
+
+    situacao = []
+    for nome, caminho in arquivos_migracao(diretorio):
+        _, checksum = _ler(caminho)
+        registro = aplicadas.get(nome)
+        situacao.append({
+            "nome": nome,
+            "aplicada_em": registro[1] if registro else None,
+            "alterada": bool(registro) and registro[0] != checksum,
+        })
+    return situacao
+
+
+def migrar(conn, diretorio=DIRETORIO_MIGRACOES, progresso=print):
+    """
+    Aplica as migrações pendentes, uma transação por arquivo. Devolve
+    [{"nome", "duracao_ms"}] das aplicadas nesta execução; a primeira que
+    falhar é desfeita e a exceção é propagada.
+    """
+    aplicadas_agora = []
+    for item in estado(conn, diretorio):
+        if item["alterada"]:
+            progresso(f"Aviso: {item['nome']} foi alterado depois de aplicado; "
+                      "crie uma migração nova em vez de editar uma antiga")
+        if item["aplicada_em"] is not None:
+            continue
+
+        conteudo, checksum = _ler(os.path.join(diretorio, item["nome"]))
+        comeco = time.monotonic()
+        try:
+            with conn.cursor() as cursor:
+                _travar(cursor)
+                # Outro processo pode ter aplicado enquanto esperávamos a trava
+                cursor.execute("SELECT 1 FROM migracao_aplicada WHERE nome = %s", (item["nome"],))
+                if cursor.fetchone():
+                    conn.rollback()
+                    continue
+                # Em bytes, como o psql envia: o arquivo é UTF-8 qualquer que
+                # seja a codificação da conexão
+                cursor.execute(conteudo.encode('utf-8'))
+                duracao_ms = round((time.monotonic() - comeco) * 1000)
+                cursor.execute(
+                    "INSERT INTO migracao_aplicada (nome, checksum, duracao_ms) VALUES (%s, %s, %s)",
+                    (item["nome"], checksum, duracao_ms),
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        progresso(f"{item['nome']} aplicada em {duracao_ms} ms")
+        aplicadas_agora.append({"nome": item["nome"], "duracao_ms": duracao_ms})
+    return aplicadas_agora
@@ -0,0 +1,283 @@
+"""
+Particionamento opcional de formularioporcasa por mês (RANGE em data).
+
+Com a tabela particionada, as consultas que filtram por data (resumo de um
+dia/agente, reprocessamento por intervalo, páginas da listagem) só leem as
+partições do período, e o VACUUM de cada mês antigo para de ser refeito
+a cada ciclo. O custo de inserir e de agregar um dia não cresce com os
+anos de histórico.
+
+    flask particionar-formularios   converte a tabela (uma vez)
+    flask manter-particoes          cria os próximos meses e, com
+                                    --reter-meses, arquiva os antigos
+
+A conversão reescreve a tabela inteira em uma transação, com a tabela
+travada (ACCESS EXCLUSIVE) do começo ao fim: faça fora do horário de envio.
+As partições mensais se chamam formularioporcasa_AAAA_MM. Datas fora delas
+caem em formularioporcasa_padrao, e as linhas são movidas para a partição
+certa quando o mês dela é criado.
+
+O líder do agendador chama manter_particoes uma vez por dia, criando
+PARTICOES_MESES_FUTUROS meses à frente. Com PARTICOES_RETER_MESES > 0, as
+partições que terminaram antes desse número de meses são desanexadas e
+movidas para o esquema PARTICOES_ESQUEMA_ARQUIVO, onde ainda podem ser
+consultadas, exportadas com pg_dump e apagadas. Os resumos dos meses
+arquivados são mantidos. Não arquive meses que ainda podem ser editados:
+recalcular o resumo de um deles sem os formulários o apagaria.
+
+Em uma tabela particionada, índices únicos precisam conter a data: a
+unicidade da chave de idempotência fica na tabela chave_idempotencia, que
+não é particionada (sql/011).
+"""
+import os
+import re
+import time
+from datetime import date
+
+from psycopg2 import errors
+
+PARTICOES_MESES_FUTUROS = int(os.getenv('PARTICOES_MESES_FUTUROS', 3))
+PARTICOES_RETER_MESES = int(os.getenv('PARTICOES_RETER_MESES', 0))
+PARTICOES_ESQUEMA_ARQUIVO = os.getenv('PARTICOES_ESQUEMA_ARQUIVO', 'arquivo')
+# A manutenção desiste se não conseguir as travas nesse tempo (e tenta no
+# próximo ciclo) em vez de enfileirar os envios dos agentes atrás dela
+PARTICOES_LOCK_TIMEOUT = os.getenv('PARTICOES_LOCK_TIMEOUT', '5s')
+
+TABELA = 'formularioporcasa'
+PARTICAO_PADRAO = 'formularioporcasa_padrao'
+
+_LIMITES = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+# Índices, restrições e triggers de formularioporcasa criados pelas
+# migrações (sql/000, 002, 006, 007, 009 e 011), refeitos na tabela particionada
+SQL_COMPLEMENTOS_PARTICIONADA = """
+    ALTER TABLE formularioporcasa ADD CONSTRAINT formularioporcasa_pkey PRIMARY KEY (idboletimdiario, data);
+    ALTER TABLE formularioporcasa ADD CONSTRAINT formularioporcasa_idagente_fkey
+        FOREIGN KEY (idagente) REFERENCES agente(idagente);
+
+    CREATE INDEX formularioporcasa_sync_xid_idx ON formularioporcasa (sync_xid, idboletimdiario);
+    CREATE INDEX formularioporcasa_data_id_idx ON formularioporcasa (data, idboletimdiario);
+    CREATE INDEX formularioporcasa_data_idagente_idx ON formularioporcasa (data, idagente);
+    CREATE INDEX formularioporcasa_idagente_data_id_idx ON formularioporcasa (idagente, data, idboletimdiario);
+    CREATE INDEX formularioporcasa_bairro_data_id_idx ON formularioporcasa (bairro, data, idboletimdiario);
+    CREATE INDEX formularioporcasa_casos_suspeitos_idx
+        ON formularioporcasa (data, idboletimdiario) WHERE casos_suspeitos > 0;
+
+    CREATE TRIGGER formularioporcasa_sync_xid
+        BEFORE INSERT OR UPDATE ON formularioporcasa
+        FOR EACH ROW EXECUTE FUNCTION marcar_sync_xid();
+    CREATE TRIGGER formularioporcasa_versao
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON formularioporcasa
+        FOR EACH STATEMENT EXECUTE FUNCTION incrementar_versao_tabela();
+    CREATE TRIGGER formularioporcasa_sujo_insert
+        AFTER INSERT ON formularioporcasa
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
+    CREATE TRIGGER formularioporcasa_sujo_update
+        AFTER UPDATE ON formularioporcasa
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
+    CREATE TRIGGER formularioporcasa_sujo_delete
+        AFTER DELETE ON formularioporcasa
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
+    CREATE TRIGGER formularioporcasa_liberar_chaves
+        AFTER DELETE ON formularioporcasa
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT EXECUTE FUNCTION liberar_chaves_idempotencia();
+"""
+
+# O DETACH não dispara os triggers de versão (ETag da listagem)
+SQL_INCREMENTAR_VERSAO = "SELECT incrementar_versao(%s)"
+
+
+def inicio_mes(dia):
+    return dia.replace(day=1)
+
+
+def somar_meses(mes, quantidade):
+    indice = mes.year * 12 + mes.month - 1 + quantidade
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(mes):
+    return f"{TABELA}_{mes:%Y_%m}"
+
+
+def particionada(cursor):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (TABELA,))
+    linha = cursor.fetchone()
+    return bool(linha and linha[0])
+
+
+def listar_particoes(cursor):
+    """[(nome, inicio, fim)] das partições mensais em ordem, sem a padrão."""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        (TABELA,),
+    )
+    particoes = []
+    for nome, limites in cursor.fetchall():
+        casamento = _LIMITES.search(limites)
+        if casamento:
+            particoes.append((nome, date.fromisoformat(casamento[1]), date.fromisoformat(casamento[2])))
+    return sorted(particoes, key=lambda particao: particao[1])
+
+
+def criar_particao(cursor, mes):
+    """
+    Cria a partição do mês se ela não existe. Devolve True se criou.
+    Formulários do mês que estavam na partição padrão passam para a nova.
+    """
+    nome = nome_particao(mes)
+    fim = somar_meses(mes, 1)
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (nome,))
+    if cursor.fetchone()[0]:
+        return False
+
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (PARTICAO_PADRAO,))
+    mover = False
+    if cursor.fetchone()[0]:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE data >= %s AND data < %s)", (mes, fim)
+        )
+        mover = cursor.fetchone()[0]
+
+    if not mover:
+        cursor.execute(f"CREATE TABLE {nome} PARTITION OF {TABELA} FOR VALUES FROM (%s) TO (%s)", (mes, fim))
+        return True
+
+    # Com linhas do mês na partição padrão o PARTITION OF falharia: monta a
+    # partição à parte, move as linhas (sem passar pelos triggers da tabela,
+    # os dados não mudam) e a anexa. O CHECK dispensa a varredura do ATTACH.
+    cursor.execute(f"CREATE TABLE {nome} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cursor.execute(f"ALTER TABLE {nome} ADD CONSTRAINT {nome}_mes CHECK (data >= %s AND data < %s)", (mes, fim))
+    cursor.execute(
+        f"""
+        WITH movidas AS (
+            DELETE FROM {PARTICAO_PADRAO} WHERE data >= %s AND data < %s RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidas
+        """,
+        (mes, fim),
+    )
+    cursor.execute(f"ALTER TABLE {TABELA} ATTACH PARTITION {nome} FOR VALUES FROM (%s) TO (%s)", (mes, fim))
+    cursor.execute(f"ALTER TABLE {nome} DROP CONSTRAINT {nome}_mes")
+    return True
+
+
+def criar_particoes(cursor, inicio, fim):
+    """Garante as partições de todos os meses de `inicio` a `fim`. Devolve as criadas."""
+    criadas = []
+    mes = inicio_mes(inicio)
+    while mes <= fim:
+        if criar_particao(cursor, mes):
+            criadas.append(nome_particao(mes))
+        mes = somar_meses(mes, 1)
+    return criadas
+
+
+def arquivar_particoes(cursor, antes_de):
+    """
+    Desanexa as partições que terminam até `antes_de` e as move para o
+    esquema de arquivo. Devolve os nomes arquivados.
+    """
+    antigas = [nome for nome, _, fim in listar_particoes(cursor) if fim <= antes_de]
+    if not antigas:
+        return []
+    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {PARTICOES_ESQUEMA_ARQUIVO}")
+    for nome in antigas:
+        cursor.execute(f"ALTER TABLE {TABELA} DETACH PARTITION {nome}")
+        cursor.execute(f"ALTER TABLE {nome} SET SCHEMA {PARTICOES_ESQUEMA_ARQUIVO}")
+    # Marcas pendentes desses meses refariam os resumos sem os formulários
+    cursor.execute("DELETE FROM periodo_sujo WHERE data < %s", (antes_de,))
+    cursor.execute(SQL_INCREMENTAR_VERSAO, (TABELA,))
+    return antigas
+
+
+def manter_particoes(conn, meses_futuros=PARTICOES_MESES_FUTUROS, reter_meses=PARTICOES_RETER_MESES, hoje=None):
+    """
+    Cria as partições do mês atual e dos `meses_futuros` seguintes e, com
+    reter_meses > 0, arquiva as que terminaram antes disso. Devolve o
+    relatório, ou None se a tabela não é particionada. Se as travas não
+    vierem em PARTICOES_LOCK_TIMEOUT, nada é alterado e o relatório traz
+    adiada=True.
+    """
+    comeco = time.monotonic()
+    atual = inicio_mes(hoje or date.today())
+    relatorio = {"criadas": [], "arquivadas": [], "adiada": False}
+    try:
+        with conn.cursor() as cursor:
+            if not particionada(cursor):
+                conn.rollback()
+                return None
+            cursor.execute("SET LOCAL lock_timeout = %s", (PARTICOES_LOCK_TIMEOUT,))
+            relatorio["criadas"] = criar_particoes(cursor, atual, somar_meses(atual, meses_futuros))
+            if reter_meses > 0:
+                relatorio["arquivadas"] = arquivar_particoes(cursor, somar_meses(atual, -reter_meses))
+        conn.commit()
+    except errors.LockNotAvailable:
+        conn.rollback()
+        relatorio["adiada"] = True
+    relatorio["duracao_ms"] = round((time.monotonic() - comeco) * 1000)
+    return relatorio
+
+
+def converter(conn, meses_futuros=PARTICOES_MESES_FUTUROS, hoje=None):
+    """
+    Converte formularioporcasa em tabela particionada por mês, com os
+    mesmos ids, sync_xid, índices e triggers. Devolve o relatório, ou None
+    se ela já é particionada. Tudo ocorre em uma transação: em caso de erro
+    a tabela original fica intacta.
+    """
+    comeco = time.monotonic()
+    atual = inicio_mes(hoje or date.today())
+    try:
+        with conn.cursor() as cursor:
+            if particionada(cursor):
+                conn.rollback()
+                return None
+            cursor.execute(f"LOCK TABLE {TABELA} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'idboletimdiario')", (TABELA,))
+            sequencia = cursor.fetchone()[0]
+            cursor.execute(f"SELECT MIN(data) FROM {TABELA}")
+            primeiro = cursor.fetchone()[0] or atual
+
+            # A original sai do caminho com seus índices (os nomes são reaproveitados)
+            legado = f"{TABELA}_legado"
+            cursor.execute(f"ALTER TABLE {TABELA} RENAME TO {legado}")
+            cursor.execute(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = %s::regclass",
+                (legado,),
+            )
+            for (indice,) in cursor.fetchall():
+                cursor.execute(f'ALTER INDEX "{indice}" RENAME TO "{indice[:50]}_legado"')
+
+            cursor.execute(f"CREATE TABLE {TABELA} (LIKE {legado} INCLUDING DEFAULTS) PARTITION BY RANGE (data)")
+            criadas = criar_particoes(cursor, primeiro, somar_meses(atual, meses_futuros))
+            cursor.execute(f"CREATE TABLE {PARTICAO_PADRAO} PARTITION OF {TABELA} DEFAULT")
+
+            # Sem triggers na nova tabela durante a cópia: sync_xid e as
+            # marcas de periodo_sujo das linhas são preservados
+            cursor.execute(f"INSERT INTO {TABELA} SELECT * FROM {legado}")
+            linhas = cursor.rowcount
+            cursor.execute(SQL_COMPLEMENTOS_PARTICIONADA)
+            if sequencia:
+                cursor.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {TABELA}.idboletimdiario")
+            cursor.execute(f"DROP TABLE {legado}")
+            cursor.execute(SQL_INCREMENTAR_VERSAO, (TABELA,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"ANALYZE {TABELA}")
+    conn.commit()
+    return {"linhas": linhas, "particoes": len(criadas),
+            "duracao_ms": round((time.monotonic() - comeco) * 1000)}
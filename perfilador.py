@@ -0,0 +1,278 @@
+"""
+Perfil das consultas ao banco: log de consultas lentas e detecção de N+1.
+
+Toda consulta feita pelas conexões do pool (database.py e database_async.py)
+passa por `registrar`. Com o perfilador ativo:
+
+- consultas acima de PERFIL_LIMITE_MS são impressas com os literais e os
+  parâmetros redigidos (só os tipos aparecem) e ficam nas últimas
+  ocorrências de GET /perfil;
+- com PERFIL_EXPLAIN=1, consultas lentas somente de leitura são repetidas
+  com EXPLAIN (ANALYZE, BUFFERS) e o plano acompanha o registro. O ANALYZE
+  executa a consulta de novo, então deixe desligado fora de investigações;
+- uma mesma consulta executada PERFIL_N_MAIS_UM vezes ou mais na mesma
+  requisição é reportada como provável N+1;
+- cada resposta leva o cabeçalho Server-Timing com o tempo de banco e o
+  número de consultas da requisição.
+
+PUT /perfil altera a configuração em tempo de execução. A mudança é gravada
+em PERFIL_ARQUIVO e os demais processos da máquina (workers do gunicorn) a
+leem em até um segundo.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+PERFIL_ARQUIVO = os.getenv('PERFIL_ARQUIVO', os.path.join(tempfile.gettempdir(), 'entomotrack-perfil.json'))
+PERFIL_OCORRENCIAS = int(os.getenv('PERFIL_OCORRENCIAS', 100))
+
+CONFIG = {
+    'ativo': os.getenv('PERFIL_ATIVO', '1') == '1',
+    'limite_ms': float(os.getenv('PERFIL_LIMITE_MS', 500)),
+    'explain': os.getenv('PERFIL_EXPLAIN', '0') == '1',
+    'n_mais_um': int(os.getenv('PERFIL_N_MAIS_UM', 10)),
+}
+
+TIPOS_CONFIG = {'ativo': bool, 'limite_ms': (int, float), 'explain': bool, 'n_mais_um': int}
+
+# Últimas consultas lentas e N+1 deste processo
+_lentas = deque(maxlen=PERFIL_OCORRENCIAS)
+_repeticoes = deque(maxlen=PERFIL_OCORRENCIAS)
+
+# Arquivos de configuração anteriores ao processo não valem: o ambiente manda
+_INICIO = time.time()
+_arquivo_mtime = None
+_proxima_leitura = 0.0
+
+
+# --- Configuração ---------------------------------------------------------------
+
+def validar_config(valores):
+    """Lista de erros da configuração parcial recebida (vazia se válida)."""
+    erros = []
+    if not isinstance(valores, dict):
+        return ["Envie um objeto JSON com as opções a alterar"]
+    for chave, valor in valores.items():
+        tipo = TIPOS_CONFIG.get(chave)
+        if tipo is None:
+            erros.append(f"Opção desconhecida: {chave}")
+        elif not isinstance(valor, tipo) or (tipo is not bool and isinstance(valor, bool)):
+            erros.append(f"Valor inválido para '{chave}'")
+        elif tipo is not bool and valor < 0:
+            erros.append(f"'{chave}' não pode ser negativo")
+    return erros
+
+
+def configurar(valores):
+    """Aplica a configuração neste processo e a publica para os demais."""
+    global _arquivo_mtime
+    CONFIG.update(valores)
+    try:
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(PERFIL_ARQUIVO) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as arquivo:
+            json.dump(CONFIG, arquivo)
+        os.replace(temporario, PERFIL_ARQUIVO)
+        _arquivo_mtime = os.stat(PERFIL_ARQUIVO).st_mtime
+    except OSError as e:
+        print(f"Aviso: configuração do perfilador não publicada em {PERFIL_ARQUIVO}: {e}")
+    return dict(CONFIG)
+
+
+def sincronizar():
+    """Relê PERFIL_ARQUIVO se outro processo o alterou (no máximo uma vez por segundo)."""
+    global _arquivo_mtime, _proxima_leitura
+    agora = time.monotonic()
+    if agora < _proxima_leitura:
+        return
+    _proxima_leitura = agora + 1
+    try:
+        mtime = os.stat(PERFIL_ARQUIVO).st_mtime
+    except OSError:
+        return
+    if mtime == _arquivo_mtime or mtime < _INICIO:
+        return
+    try:
+        with open(PERFIL_ARQUIVO) as arquivo:
+            valores = json.load(arquivo)
+    except (OSError, ValueError):
+        return
+    _arquivo_mtime = mtime
+    if not validar_config(valores):
+        CONFIG.update(valores)
+
+
+# --- Redação ----------------------------------------------------------------------
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?\b")
+_ESPACOS = re.compile(r"\s+")
+# Linhas do plano que repetem valores da consulta (condições, filtros, chaves)
+_LINHA_COM_VALORES = re.compile(r"^(?!\s*Rows Removed)\s*(->\s*)?[\w\s-]*(Cond|Filter|Key|Output|Params):")
+_SOMENTE_LEITURA = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_ESCRITA = re.compile(r"\b(insert|update|delete|merge)\b|\bfor\s+(update|share|no\s+key)\b|\bnextval\s*\(",
+                      re.IGNORECASE)
+
+
+def _texto(query):
+    return query.decode('utf-8', 'replace') if isinstance(query, (bytes, bytearray)) else str(query)
+
+
+@lru_cache(maxsize=512)
+def redigir(query):
+    """Consulta em uma linha, com literais de texto e números trocados por ?."""
+    texto = _LITERAL_TEXTO.sub("'?'", _texto(query))
+    texto = _LITERAL_NUMERO.sub('?', texto)
+    return _ESPACOS.sub(' ', texto).strip()
+
+
+def redigir_plano(linhas):
+    """Plano do EXPLAIN com os literais das condições e filtros redigidos."""
+    redigidas = []
+    for linha in linhas:
+        if _LINHA_COM_VALORES.match(linha):
+            linha = _LITERAL_NUMERO.sub('?', _LITERAL_TEXTO.sub("'?'", linha))
+        redigidas.append(linha)
+    return redigidas
+
+
+def _tipos_parametros(parametros):
+    if parametros is None:
+        return []
+    if isinstance(parametros, dict):
+        return {chave: type(valor).__name__ for chave, valor in parametros.items()}
+    return [type(valor).__name__ for valor in parametros]
+
+
+def explicavel(query):
+    """Só consultas de leitura são repetidas com EXPLAIN ANALYZE."""
+    texto = _texto(query)
+    return bool(_SOMENTE_LEITURA.match(texto)) and not _ESCRITA.search(texto)
+
+
+# --- Requisição corrente ----------------------------------------------------------
+
+class Perfil:
+    """Consultas da requisição em andamento."""
+
+    __slots__ = ('rota', 'consultas', 'tempo_db', 'repeticoes')
+
+    def __init__(self, rota):
+        self.rota = rota
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.repeticoes = {}
+
+    def server_timing(self):
+        return f'db;dur={self.tempo_db * 1000:.1f};desc="{self.consultas} consultas"'
+
+
+_perfil = ContextVar('perfil_requisicao', default=None)
+
+
+def iniciar(rota):
+    sincronizar()
+    if not CONFIG['ativo']:
+        return None
+    return _perfil.set(Perfil(rota))
+
+
+def atual():
+    return _perfil.get()
+
+
+def finalizar(token):
+    """Encerra o perfil da requisição e reporta consultas repetidas (N+1)."""
+    if token is None:
+        return None
+    perfil = _perfil.get()
+    _perfil.reset(token)
+    limite = CONFIG['n_mais_um']
+    if perfil is None or not limite:
+        return perfil
+    for query, vezes in perfil.repeticoes.items():
+        if vezes >= limite:
+            ocorrencia = {
+                "momento": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "rota": perfil.rota,
+                "vezes": vezes,
+                "consulta": redigir(query),
+            }
+            _repeticoes.append(ocorrencia)
+            print(f"Possível N+1 em {perfil.rota}: consulta executada {vezes} vezes: {ocorrencia['consulta']}")
+    return perfil
+
+
+def registrar(query, parametros, duracao):
+    """
+    Contabiliza uma consulta. Devolve o registro da consulta lenta quando ela
+    deve ser explicada (o chamador executa o EXPLAIN e chama anexar_plano).
+    """
+    if not CONFIG['ativo']:
+        return None
+    perfil = _perfil.get()
+    if perfil is not None:
+        perfil.consultas += 1
+        perfil.tempo_db += duracao
+        # Só modelos (str) contam para N+1; execute_values envia bytes já montados
+        if isinstance(query, str):
+            perfil.repeticoes[query] = perfil.repeticoes.get(query, 0) + 1
+
+    duracao_ms = duracao * 1000
+    if duracao_ms < CONFIG['limite_ms']:
+        return None
+    registro = {
+        "momento": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "rota": perfil.rota if perfil is not None else None,
+        "duracao_ms": round(duracao_ms, 1),
+        "consulta": redigir(query),
+        "parametros": _tipos_parametros(parametros),
+    }
+    _lentas.append(registro)
+    print(f"Consulta lenta ({registro['duracao_ms']} ms) em {registro['rota'] or '-'}: "
+          f"{registro['consulta']} parâmetros={registro['parametros']}")
+    if CONFIG['explain'] and explicavel(query):
+        return registro
+    return None
+
+
+def anexar_plano(registro, linhas):
+    registro["plano"] = redigir_plano(linhas)
+    print("Plano:\n  " + "\n  ".join(registro["plano"]))
+
+
+def ocorrencias():
+    """Configuração e últimas ocorrências deste processo (GET /perfil)."""
+    return {
+        "pid": os.getpid(),
+        "config": dict(CONFIG),
+        "lentas": list(_lentas),
+        "n_mais_um": list(_repeticoes),
+    }
+
+
+# --- Flask ------------------------------------------------------------------------
+
+def instrumentar_flask(app):
+    """Perfil por requisição e cabeçalho Server-Timing nas respostas do app."""
+    from flask import g, request
+
+    @app.before_request
+    def _iniciar_perfil():
+        rota = request.url_rule.rule if request.url_rule is not None else '<sem rota>'
+        g._perfil = iniciar(rota)
+
+    @app.after_request
+    def _server_timing(resposta):
+        perfil = atual()
+        if perfil is not None and getattr(g, '_perfil', None) is not None:
+            resposta.headers.add('Server-Timing', perfil.server_timing())
+        return resposta
+
+    @app.teardown_request
+    def _finalizar_perfil(exc):
+        finalizar(g.pop('_perfil', None))
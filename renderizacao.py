@@ -0,0 +1,314 @@
+"""
+Renderização de gráficos em imagem fora dos workers web.
+
+A exportação PNG do Plotly (Kaleido) leva segundos a frio, então ela roda
+em um pool limitado de processos (RENDER_WORKERS) que aquecem o Kaleido ao
+iniciar e continuam vivos entre as tarefas. Os jobs (submeter_job) só
+enfileiram a tarefa e devolvem um id; as rotas síncronas (renderizar e
+exportar_zip) esperam o pool, com RENDER_TIMEOUT, enquanto respondem.
+
+Cada worker do gunicorn tem o seu pool: gunicorn.conf.py divide entre os
+workers o total de processos de renderização da máquina
+(GUNICORN_RENDER_PROCESSOS) ao definir RENDER_WORKERS.
+
+Estado e artefatos dos jobs ficam em RENDER_JOBS_DIR, de modo que qualquer
+worker do gunicorn na mesma máquina consegue consultar um job criado por
+outro.
+"""
+import json
+import math
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from io import BytesIO
+
+import metricas
+
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+RENDER_JOBS_DIR = os.getenv('RENDER_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'entomotrack-render'))
+RENDER_JOBS_TTL = int(os.getenv('RENDER_JOBS_TTL', 3600))
+# Espera máxima do long-poll de status (?aguardar=)
+AGUARDAR_MAXIMO = 30
+# Espera máxima das rotas síncronas (/imagem, /zip, /exportar) pelo resultado do pool
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 90))
+
+TIPOS_JOB = {
+    'imagem': ('image/png', 'grafico_{periodo}.png'),
+    'zip': ('application/zip', 'graficos_{periodo}.zip'),
+}
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+# --- Executado nos processos de renderização ---------------------------------
+
+def _aquecer_renderizador():
+    """Inicializador do pool: importa o Plotly e sobe o Kaleido uma vez."""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    try:
+        pio.to_image(go.Figure(), format='png', width=10, height=10)
+    except Exception as e:
+        print(f"Aviso: não foi possível aquecer o Kaleido: {e}")
+
+
+def _png(fig):
+    import plotly.io as pio
+    import graficos
+    return pio.to_image(fig, format='png', width=graficos.LARGURA_PNG, height=graficos.ALTURA_PNG)
+
+
+def _gravar_atomico(caminho, conteudo):
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _gravar_status(job_id, status, **extras):
+    conteudo = json.dumps(dict(extras, job_id=job_id, status=status, atualizado_em=time.time()))
+    _gravar_atomico(os.path.join(RENDER_JOBS_DIR, f'{job_id}.json'), conteudo.encode())
+
+
+def renderizar_diario(tipo, data_iso, dados_list, destino):
+    """Escreve em `destino` o PNG ('imagem') ou o ZIP ('zip') dos gráficos de um dia."""
+    import graficos
+    data_selecionada = date.fromisoformat(data_iso)
+
+    if tipo == 'imagem':
+        destino.write(_png(graficos.figura_diaria_imagem(data_selecionada, dados_list)))
+        return
+
+    with zipfile.ZipFile(destino, 'w') as zip_file:
+        for nome, fig in graficos.figuras_diarias_zip(data_selecionada, dados_list):
+            zip_file.writestr(nome, _png(fig))
+
+
+def _renderizar_bytes(tipo, data_iso, dados_list):
+    destino = BytesIO()
+    renderizar_diario(tipo, data_iso, dados_list, destino)
+    return destino.getvalue()
+
+
+def renderizar_periodo(nivel, inicio_iso, dados_list):
+    """Lista de (nome do arquivo, PNG) com os gráficos de um período da exportação."""
+    import graficos
+    figuras = graficos.figuras_exportacao(nivel, date.fromisoformat(inicio_iso), dados_list)
+    return [(nome, _png(fig)) for nome, fig in figuras]
+
+
+def _executar_job(job_id, tipo, data_iso, dados_list):
+    inicio = time.monotonic()
+    _gravar_status(job_id, 'executando', tipo=tipo, periodo=data_iso)
+    try:
+        # O artefato é escrito direto no diretório de jobs e publicado com rename
+        fd, temporario = tempfile.mkstemp(dir=RENDER_JOBS_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as arquivo:
+            renderizar_diario(tipo, data_iso, dados_list, arquivo)
+        os.replace(temporario, caminho_artefato(job_id))
+        mimetype, nome = TIPOS_JOB[tipo]
+        _gravar_status(job_id, 'concluido', tipo=tipo, periodo=data_iso, mimetype=mimetype,
+                       arquivo=nome.format(periodo=data_iso),
+                       duracao_ms=round((time.monotonic() - inicio) * 1000))
+    except Exception as e:
+        _gravar_status(job_id, 'erro', tipo=tipo, periodo=data_iso, erro=str(e))
+
+
+# --- Executado nos workers web -----------------------------------------------
+
+def executor():
+    """Pool de renderização do processo atual (criado no primeiro uso)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        # Recria o pool após o fork ou se algum processo de renderização morreu
+        if _executor is None or _executor_pid != os.getpid() or getattr(_executor, '_broken', False):
+            # spawn: os processos de renderização não herdam conexões nem
+            # threads do worker web
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_aquecer_renderizador,
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def encerrar():
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _limpar_jobs_antigos():
+    """
+    Apaga os jobs cujo status não muda há mais de RENDER_JOBS_TTL. Status
+    (.json) e artefato (.bin) saem juntos, o status primeiro: o .bin é
+    gravado antes do status 'concluido' e, pelo próprio mtime, expiraria
+    enquanto o status ainda diz que o arquivo existe. Temporários e
+    artefatos sem status expiram pelo próprio mtime.
+    """
+    limite = time.time() - RENDER_JOBS_TTL
+    try:
+        entradas = {entrada.name: entrada for entrada in os.scandir(RENDER_JOBS_DIR)}
+    except OSError:
+        return
+    for nome, entrada in entradas.items():
+        job_id, extensao = os.path.splitext(nome)
+        if extensao == '.bin' and f'{job_id}.json' in entradas:
+            continue
+        try:
+            if entrada.stat().st_mtime >= limite:
+                continue
+            os.unlink(entrada.path)
+            if extensao == '.json':
+                os.unlink(caminho_artefato(job_id))
+        except OSError:
+            pass
+
+
+def submeter_job(tipo, data_selecionada, dados_list):
+    """Enfileira a renderização e devolve o id do job."""
+    if tipo not in TIPOS_JOB:
+        raise ValueError(f"Tipo de job inválido: {tipo}")
+    os.makedirs(RENDER_JOBS_DIR, exist_ok=True)
+    _limpar_jobs_antigos()
+
+    job_id = uuid.uuid4().hex
+    data_iso = data_selecionada.isoformat()
+    _gravar_status(job_id, 'pendente', tipo=tipo, periodo=data_iso)
+    inicio = time.perf_counter()
+    futuro = executor().submit(_executar_job, job_id, tipo, data_iso, dados_list)
+
+    def _ao_terminar(f):
+        # Inclui a espera na fila do pool, que é o que o cliente percebe
+        metricas.observar('render_duracao_segundos', time.perf_counter() - inicio, tipo=tipo, formato='job')
+        # Falhas do próprio pool (ex.: processo morto) não passam por _executar_job
+        if f.exception() is not None:
+            _gravar_status(job_id, 'erro', tipo=tipo, periodo=data_iso, erro=str(f.exception()))
+
+    futuro.add_done_callback(_ao_terminar)
+    return job_id
+
+
+def status_job(job_id):
+    """Estado do job (dicionário) ou None se o id não existir."""
+    if not _ID_VALIDO.match(job_id):
+        return None
+    try:
+        with open(os.path.join(RENDER_JOBS_DIR, f'{job_id}.json'), 'rb') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def ler_aguardar(valor):
+    """
+    Segundos de ?aguardar=, limitados a AGUARDAR_MAXIMO. ValueError se não
+    for um número finito: com nan o prazo do long-poll nunca venceria.
+    """
+    segundos = float(valor)
+    if not math.isfinite(segundos):
+        raise ValueError(f"Valor não finito: {valor}")
+    return min(max(segundos, 0), AGUARDAR_MAXIMO)
+
+
+def aguardar_job(job_id, timeout):
+    """Consulta o job até ele terminar ou o timeout (long-poll)."""
+    prazo = time.monotonic() + timeout
+    intervalo = 0.05
+    while True:
+        status = status_job(job_id)
+        if status is None or status['status'] in ('concluido', 'erro') or time.monotonic() >= prazo:
+            return status
+        time.sleep(min(intervalo, max(prazo - time.monotonic(), 0)))
+        intervalo = min(intervalo * 2, 0.5)
+
+
+def caminho_artefato(job_id):
+    return os.path.join(RENDER_JOBS_DIR, f'{job_id}.bin')
+
+
+def renderizar(tipo, data_selecionada, dados_list, timeout=RENDER_TIMEOUT):
+    """Renderiza no pool e espera o resultado (rotas síncronas)."""
+    with metricas.medir('render_duracao_segundos', tipo=tipo, formato='png'):
+        return executor().submit(_renderizar_bytes, tipo, data_selecionada.isoformat(), dados_list).result(timeout)
+
+
+class _SaidaZip:
+    """
+    Destino não-posicionável para o zipfile: acumula o que foi escrito até
+    ser esvaziado. Sem seek/tell o zipfile grava cada entrada com data
+    descriptor, o que permite enviar o arquivo à medida que é montado.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def exportar_zip(nivel, periodos, timeout=RENDER_TIMEOUT):
+    """
+    Gerador com os bytes de um ZIP dos gráficos de vários períodos.
+
+    `periodos` é uma lista de (data de início, linhas do resumo). Cada
+    período é renderizado em um processo do pool; no máximo
+    RENDER_WORKERS + 1 períodos ficam em andamento ao mesmo tempo, e cada
+    entrada é escrita (e devolvida) assim que seu período termina, então a
+    memória fica limitada a poucas imagens. A ordem das entradas no ZIP é a
+    de conclusão.
+    """
+    pool = executor()
+    pendentes = iter(periodos)
+    em_andamento = set()
+    saida = _SaidaZip()
+
+    def _submeter_proximo():
+        for inicio, dados_list in pendentes:
+            em_andamento.add(pool.submit(renderizar_periodo, nivel, inicio.isoformat(), dados_list))
+            return
+
+    try:
+        for _ in range(RENDER_WORKERS + 1):
+            _submeter_proximo()
+
+        # PNG já é comprimido: ZIP_STORED evita gastar CPU no worker web
+        with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+            while em_andamento:
+                prontos, em_andamento = wait(em_andamento, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not prontos:
+                    raise TimeoutError("Tempo esgotado na renderização da exportação")
+                for futuro in prontos:
+                    for nome, png in futuro.result():
+                        zip_file.writestr(nome, png)
+                        yield saida.esvaziar()
+                    _submeter_proximo()
+        # Diretório central, escrito ao fechar o ZIP
+        yield saida.esvaziar()
+    finally:
+        # Cliente desconectou ou houve erro: descarta o que ainda não começou
+        for futuro in em_andamento:
+            futuro.cancel()
@@ -1,79 +1,377 @@
-from flask import Blueprint, request, jsonify
-from database import get_connection
-from psycopg2.extras import RealDictCursor
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
+from database import connection
+from cache_http import condicional
+from agregacao import DELTA_RESUMO_DIARIO
+import cache_graficos
+from psycopg2.extras import RealDictCursor, execute_values
+from contextlib import ExitStack
 from datetime import datetime
+import base64
+import json
 
 formularios_bp = Blueprint('formularios', __name__)
 
+# Paginação por chave (keyset) em (data, idboletimdiario): cada página
+# continua exatamente de onde a anterior parou, sem OFFSET.
+LIMITE_MAXIMO = 1000
+# Linhas buscadas por ida ao banco no cursor nomeado (server-side) dos streams
+LINHAS_POR_LOTE_STREAM = 2000
+
+# Filtros da listagem: parâmetro de query -> predicado. Cada um usa um
+# índice de sql/007 ou sql/009 e, com data_inicio/data_fim, a tabela
+# particionada só lê os meses do intervalo (particoes.py).
+FILTROS_LISTAGEM = {
+    "data_inicio": "f.data >= %s",
+    "data_fim": "f.data <= %s",
+    "bairro": "f.bairro = %s",
+    "idagente": "f.idagente = %s",
+    # Subconsulta em vez de ag.matricula: o filtro chega em formularioporcasa
+    # como idagente e usa o mesmo índice
+    "matricula": "f.idagente = (SELECT idagente FROM agente WHERE matricula = %s)",
+    "tipo_inseto": "f.tipo_inseto = %s",
+}
+TAMANHO_MAXIMO_FILTRO = 200
+
+
+def codificar_cursor(data, id_formulario):
+    bruto = json.dumps([data.isoformat(), id_formulario]).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Converte o cursor opaco em (data, idboletimdiario); ValueError se inválido."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data, id_formulario = json.loads(bruto)
+        return datetime.strptime(data, '%Y-%m-%d').date(), int(id_formulario)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def consulta_listagem(posicao=None, limite=None, filtros=None):
+    """
+    Monta o SELECT da listagem a partir da posição (data, id) do cursor e
+    dos filtros já validados por ler_parametros_listagem.
+    """
+    sql = """
+        SELECT f.*, ag.matricula AS agente_matricula
+        FROM formularioporcasa f
+        JOIN agente ag ON f.idagente = ag.idagente
+    """
+    condicoes = []
+    params = []
+    for campo, valor in (filtros or {}).items():
+        if campo == "casos_suspeitos":
+            # A forma `> 0` é a do índice parcial de sql/009
+            condicoes.append("f.casos_suspeitos > 0" if valor else "COALESCE(f.casos_suspeitos, 0) = 0")
+        else:
+            condicoes.append(FILTROS_LISTAGEM[campo])
+            params.append(valor)
+    if posicao:
+        # A comparação de linha sozinha não elimina partições (particoes.py):
+        # o f.data <= repetido deixa de fora os meses posteriores ao cursor
+        condicoes.append("f.data <= %s AND (f.data, f.idboletimdiario) < (%s, %s)")
+        params.extend((posicao[0], *posicao))
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += " ORDER BY f.data DESC, f.idboletimdiario DESC"
+    if limite:
+        sql += " LIMIT %s"
+        params.append(limite)
+    return sql, params
+
+
+def _ler_filtros(args, erros_campo):
+    """Filtros presentes em `args`, já convertidos; erros vão para erros_campo."""
+    filtros = {}
+    for campo in ("data_inicio", "data_fim"):
+        if args.get(campo):
+            try:
+                filtros[campo] = datetime.strptime(args[campo], '%Y-%m-%d').date()
+            except ValueError:
+                erros_campo[campo] = "Use o formato YYYY-MM-DD"
+    if "data_inicio" in filtros and "data_fim" in filtros and filtros["data_inicio"] > filtros["data_fim"]:
+        erros_campo["data_fim"] = "Deve ser igual ou posterior a data_inicio"
+
+    for campo in ("bairro", "matricula", "tipo_inseto"):
+        valor = (args.get(campo) or "").strip()
+        if len(valor) > TAMANHO_MAXIMO_FILTRO:
+            erros_campo[campo] = f"Use no máximo {TAMANHO_MAXIMO_FILTRO} caracteres"
+        elif valor:
+            filtros[campo] = valor
+
+    if args.get("idagente"):
+        try:
+            filtros["idagente"] = int(args["idagente"])
+            if filtros["idagente"] < 1:
+                raise ValueError
+        except ValueError:
+            erros_campo["idagente"] = "Use um inteiro positivo"
+
+    casos = (args.get("casos_suspeitos") or "").strip().lower()
+    if casos in ("1", "true", "sim"):
+        filtros["casos_suspeitos"] = True
+    elif casos in ("0", "false", "nao", "não"):
+        filtros["casos_suspeitos"] = False
+    elif casos:
+        erros_campo["casos_suspeitos"] = "Use 'true' ou 'false'"
+    return filtros
+
+
+def ler_parametros_listagem(args):
+    """
+    Valida os parâmetros de query da listagem (limite, cursor, formato e
+    filtros). Devolve (limite, posicao, formato, filtros, erros por campo).
+    Compartilhado com o modo assíncrono (asgi.py).
+    """
+    erros_campo = {}
+    limite = args.get("limite")
+    if limite is not None:
+        try:
+            limite = int(limite)
+            if not 1 <= limite <= LIMITE_MAXIMO:
+                raise ValueError
+        except ValueError:
+            erros_campo["limite"] = f"Use um inteiro entre 1 e {LIMITE_MAXIMO}"
+
+    posicao = None
+    if args.get("cursor"):
+        try:
+            posicao = decodificar_cursor(args["cursor"])
+        except ValueError as e:
+            erros_campo["cursor"] = str(e)
+
+    formato = args.get("formato")
+    if formato not in (None, "json", "ndjson", "stream"):
+        erros_campo["formato"] = "Use 'json', 'ndjson' ou 'stream'"
+
+    filtros = _ler_filtros(args, erros_campo)
+    return limite, posicao, formato, filtros, erros_campo
+
+
+def _stream_formularios(conn, pilha, sql, params, formato):
+    """
+    Gera a listagem linha a linha a partir de um cursor nomeado, de forma que
+    a memória fique constante independente do tamanho da tabela.
+    """
+    dumps = current_app.json.dumps
+    try:
+        with conn.cursor(name="listar_formularios", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = LINHAS_POR_LOTE_STREAM
+            cursor.execute(sql, params)
+
+            if formato == "ndjson":
+                for formulario in cursor:
+                    yield dumps(formulario) + "\n"
+            else:
+                yield '{"success": true, "data": ['
+                separador = ""
+                for formulario in cursor:
+                    yield separador + dumps(formulario)
+                    separador = ","
+                yield "]}"
+    finally:
+        pilha.close()
+
+
 @formularios_bp.route("", methods=["GET", "OPTIONS"])
+@condicional("formularioporcasa", "agente")
 def listar_formularios():
+    """
+    Lista formulários. Parâmetros opcionais:
+      - limite / cursor: paginação por chave; a resposta traz `proximo_cursor`
+      - formato=ndjson | stream: envia as linhas em streaming (NDJSON ou o
+        mesmo JSON de sempre, em partes) usando um cursor no servidor
+      - data_inicio / data_fim (YYYY-MM-DD), bairro, idagente, matricula,
+        tipo_inseto e casos_suspeitos=true|false: filtros aplicados no
+        banco, combináveis entre si e com a paginação (repita os filtros
+        junto com o cursor)
+    Sem parâmetros a resposta continua sendo a lista completa.
+    """
     if request.method == "OPTIONS":
         return ("", 200)
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+    limite, posicao, formato, filtros, erros_campo = ler_parametros_listagem(request.args)
+    if erros_campo:
+        return jsonify({"success": False, "errors": erros_campo}), 400
 
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT f.*, ag.matricula AS agente_matricula
-                FROM formularioporcasa f
-                JOIN agente ag ON f.idagente = ag.idagente
-                ORDER BY f.data DESC;
-            """)
-            formularios = cursor.fetchall()
-
-        # normaliza campos de hora para string
-        for formulario in formularios:
-            if formulario.get('hora_inicio'):
-                formulario['hora_inicio'] = str(formulario['hora_inicio'])
-            if formulario.get('hora_saida'):
-                formulario['hora_saida'] = str(formulario['hora_saida'])
-
-        conn.close()
-        return jsonify({"success": True, "data": formularios}), 200
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao listar formulários: {str(e)}"}), 500
+    if formato in ("ndjson", "stream"):
+        # A conexão fica emprestada até o fim do streaming
+        pilha = ExitStack()
+        conn = pilha.enter_context(connection())
+        if not conn:
+            pilha.close()
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        sql, params = consulta_listagem(posicao, limite, filtros)
+        resposta = Response(
+            stream_with_context(_stream_formularios(conn, pilha, sql, params, formato)),
+            mimetype="application/x-ndjson" if formato == "ndjson" else "application/json",
+        )
+        # Garante a devolução da conexão mesmo se o stream nunca for iniciado
+        resposta.call_on_close(pilha.close)
+        return resposta
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            paginado = limite is not None or posicao is not None
+            if paginado:
+                limite = limite or LIMITE_MAXIMO
+                # Busca uma linha a mais para saber se existe próxima página
+                sql, params = consulta_listagem(posicao, limite + 1, filtros)
+            else:
+                sql, params = consulta_listagem(filtros=filtros)
+
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(sql, params)
+                formularios = cursor.fetchall()
+
+            if not paginado:
+                return jsonify({"success": True, "data": formularios}), 200
+
+            proximo_cursor = None
+            if len(formularios) > limite:
+                formularios = formularios[:limite]
+                ultimo = formularios[-1]
+                proximo_cursor = codificar_cursor(ultimo['data'], ultimo['idboletimdiario'])
+
+            return jsonify({"success": True, "data": formularios, "proximo_cursor": proximo_cursor}), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao listar formulários: {str(e)}"}), 500
+
+SQL_OBTER_FORMULARIO = """
+    SELECT f.*, ag.matricula AS agente_matricula
+    FROM formularioporcasa f
+    JOIN agente ag ON f.idagente = ag.idagente
+    WHERE f.idboletimdiario = %s;
+"""
 
 @formularios_bp.route("/<int:id_formulario>", methods=["GET"])
 def obter_formulario(id_formulario):
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
 
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT f.*, ag.matricula AS agente_matricula
-                FROM formularioporcasa f
-                JOIN agente ag ON f.idagente = ag.idagente
-                WHERE f.idboletimdiario = %s;
-            """, (id_formulario,))
-            formulario = cursor.fetchone()
-
-        conn.close()
-        if formulario:
-            if formulario.get('hora_inicio'):
-                formulario['hora_inicio'] = str(formulario['hora_inicio'])
-            if formulario.get('hora_saida'):
-                formulario['hora_saida'] = str(formulario['hora_saida'])
-            return jsonify({"success": True, "data": formulario}), 200
-        return jsonify({"success": False, "erro": "Formulário não encontrado"}), 404
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao obter formulário: {str(e)}"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(SQL_OBTER_FORMULARIO, (id_formulario,))
+                formulario = cursor.fetchone()
 
-@formularios_bp.route("", methods=["POST", "OPTIONS"])
-def criar_formulario():
-    if request.method == "OPTIONS":
-        return ("", 200)
+            if formulario:
+                return jsonify({"success": True, "data": formulario}), 200
+            return jsonify({"success": False, "erro": "Formulário não encontrado"}), 404
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao obter formulário: {str(e)}"}), 500
 
-    dados = request.get_json() or {}
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+# Colunas gravadas a partir do corpo da requisição, com o valor padrão de
+# cada uma quando o campo não é enviado
+CAMPOS_FORMULARIO = (
+    ('data', None),
+    ('bairro', ''),
+    ('endereco', ''),
+    ('tipo_inseto', None),
+    ('hora_inicio', None),
+    ('hora_saida', None),
+    ('num_pontos_criticos', 0),
+    ('total_criaduros_encontrados', 0),
+    ('criaduros_eliminados', 0),
+    ('tipos_criaduros', ''),
+    ('num_locos_larva', 0),
+    ('num_locos_positivos', 0),
+    ('num_adultos_encontrados', 0),
+    ('num_adultos_coletados', 0),
+    ('acaorealizada', ''),
+    ('inseticida_usado', ''),
+    ('quantidade_inseticida', ''),
+    ('casos_suspeitos', 0),
+    ('nome_pessoa', ''),
+    ('telefone_pessoa', ''),
+    ('observacoes', ''),
+    ('idagente', None),
+    ('chave_idempotencia', None),
+)
+
+# Tipo de cada coluna no VALUES: fora de um INSERT direto o PostgreSQL não
+# deduz os tipos pela tabela (texto ficaria text, NULL também)
+TIPOS_FORMULARIO = {
+    'data': 'date', 'hora_inicio': 'time', 'hora_saida': 'time',
+    'num_pontos_criticos': 'integer', 'total_criaduros_encontrados': 'integer',
+    'criaduros_eliminados': 'integer', 'num_locos_larva': 'integer',
+    'num_locos_positivos': 'integer', 'num_adultos_encontrados': 'integer',
+    'num_adultos_coletados': 'integer', 'casos_suspeitos': 'integer', 'idagente': 'integer',
+}
+MODELO_FORMULARIO = "(%s, " + ", ".join(
+    f"%s::{TIPOS_FORMULARIO.get(campo, 'text')}" for campo, _ in CAMPOS_FORMULARIO
+) + ")"
+
+# Insere formulários (VALUES %s com uma ou várias linhas, cada uma com a sua
+# ordem no envio) e soma seus contadores em resumodiario no mesmo comando,
+# uma vez por (data, idagente). O cache de gráficos das datas afetadas é
+# invalidado depois do commit (_invalidar_graficos).
+# A chave de idempotência é registrada em chave_idempotencia (sql/011),
+# única no banco todo, antes do formulário: só são gravados os formulários
+# sem chave ou cuja chave foi registrada por eles. Os demais (reenvios,
+# mesmo com outra data, ou chave repetida no próprio lote) não entram em
+# `novos` e também não alteram o resumo. Os ids são reservados antes para
+# que a chave aponte para o formulário.
+SQL_INSERIR_FORMULARIOS = """
+    WITH entrada AS (
+        SELECT nextval(pg_get_serial_sequence('formularioporcasa', 'idboletimdiario')) AS idboletimdiario, v.*
+        FROM (VALUES %s) AS v(ordem, {colunas})
+    ), chaves AS (
+        INSERT INTO chave_idempotencia (chave, idboletimdiario, data)
+        SELECT chave_idempotencia, idboletimdiario, data FROM entrada
+        WHERE chave_idempotencia IS NOT NULL
+        ORDER BY chave_idempotencia, ordem
+        ON CONFLICT (chave) DO NOTHING
+        RETURNING idboletimdiario
+    ), novos AS (
+        INSERT INTO formularioporcasa (idboletimdiario, {colunas})
+        SELECT idboletimdiario, {colunas} FROM entrada
+        WHERE chave_idempotencia IS NULL OR idboletimdiario IN (SELECT idboletimdiario FROM chaves)
+        ORDER BY ordem
+        RETURNING *
+    ), resumo AS (
+        {delta}
+    )
+    SELECT e.ordem, n.idboletimdiario, n.data, n.idagente, n.chave_idempotencia
+    FROM novos n JOIN entrada e USING (idboletimdiario)
+    ORDER BY e.ordem;
+""".format(
+    colunas=", ".join(campo for campo, _ in CAMPOS_FORMULARIO),
+    delta=DELTA_RESUMO_DIARIO,
+)
+
+# Máximo de formulários aceitos por chamada de /formularios/lote
+LOTE_MAXIMO = 5000
+TAMANHO_MAXIMO_CHAVE = 200
+
+# Colunas INTEGER (contadores e idagente)
+CAMPOS_INTEIROS = tuple(campo for campo, tipo in TIPOS_FORMULARIO.items() if tipo == 'integer')
+INTEIRO_MAXIMO = 2**31 - 1
+
+
+def _inteiro(valor):
+    """O valor como int (aceita texto com dígitos); ValueError se não for um inteiro de 0 a INTEIRO_MAXIMO."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError
+    numero = int(valor)
+    if not 0 <= numero <= INTEIRO_MAXIMO:
+        raise ValueError
+    return numero
+
+
+def _validar_formulario(dados):
+    """
+    Retorna o dicionário de erros por campo (vazio se o formulário é válido).
+    Confere tudo que faria o INSERT falhar, exceto a existência do agente
+    (_agentes_inexistentes, uma consulta para o lote inteiro).
+    """
+    if not isinstance(dados, dict):
+        return {"formulario": "Esperado um objeto JSON"}
 
     # validação básica requerida
     required = ["data", "idagente", "tipo_inseto"]
@@ -81,115 +379,309 @@ def criar_formulario():
     for campo in required:
         if not dados.get(campo):
             erros_campo[campo] = "Campo obrigatório"
-    if erros_campo:
-        conn.close()
-        return jsonify({"success": False, "errors": erros_campo}), 400
 
-    # CORREÇÃO CRÍTICA: Converter strings vazias para None nos campos de hora
-    hora_inicio = dados.get('hora_inicio')
-    hora_saida = dados.get('hora_saida')
+    if dados.get('data') and 'data' not in erros_campo:
+        try:
+            datetime.strptime(dados['data'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            erros_campo['data'] = "Use o formato YYYY-MM-DD"
+
+    for campo in ('hora_inicio', 'hora_saida'):
+        if dados.get(campo) not in (None, ""):
+            try:
+                datetime.strptime(dados[campo], '%H:%M:%S' if dados[campo].count(':') == 2 else '%H:%M')
+            except (AttributeError, TypeError, ValueError):
+                erros_campo[campo] = "Use o formato HH:MM ou HH:MM:SS"
+
+    for campo in CAMPOS_INTEIROS:
+        if dados.get(campo) is not None and campo not in erros_campo:
+            try:
+                _inteiro(dados[campo])
+            except ValueError:
+                erros_campo[campo] = f"Use um inteiro de 0 a {INTEIRO_MAXIMO}"
+
+    for campo, _ in CAMPOS_FORMULARIO:
+        if campo not in CAMPOS_INTEIROS and isinstance(dados.get(campo), (dict, list)):
+            erros_campo.setdefault(campo, "Valor inválido")
+
+    chave = dados.get('chave_idempotencia')
+    if chave is not None and (not isinstance(chave, str) or not 1 <= len(chave) <= TAMANHO_MAXIMO_CHAVE):
+        erros_campo['chave_idempotencia'] = f"Use um texto de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres"
+    return erros_campo
+
+
+def _agentes_inexistentes(cursor, lista_dados):
+    """
+    idagentes dos formulários que não existem em agente, em uma consulta.
+    FOR KEY SHARE impede que os encontrados sejam apagados antes do INSERT.
+    """
+    agentes = {_inteiro(dados['idagente']) for dados in lista_dados}
+    cursor.execute(
+        "SELECT idagente FROM agente WHERE idagente = ANY(%s) ORDER BY idagente FOR KEY SHARE",
+        (sorted(agentes),)
+    )
+    return agentes - {idagente for (idagente,) in cursor.fetchall()}
+
+
+def _valores_formulario(dados):
+    """Tupla de valores na ordem de CAMPOS_FORMULARIO."""
+    valores = []
+    for campo, padrao in CAMPOS_FORMULARIO:
+        valor = dados.get(campo, padrao)
+        # CORREÇÃO CRÍTICA: strings vazias nos campos de hora viram None (NULL no banco)
+        if campo in ('hora_inicio', 'hora_saida') and valor == "":
+            valor = None
+        elif campo in CAMPOS_INTEIROS and valor is not None:
+            valor = _inteiro(valor)
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            # Números em campos de texto (ex.: telefone): no VALUES de várias
+            # linhas um número faria a coluna inteira ser tratada como numérica
+            valor = str(valor)
+        valores.append(valor)
+    return tuple(valores)
+
+
+def _inserir_formularios(cursor, lista_dados):
+    """
+    Insere formulários já validados. Retorna a lista, na mesma ordem, de
+    tuplas (id_formulario, duplicado) e o conjunto de pares (data, idagente)
+    do resumo diário atualizados. Um formulário é duplicado quando sua
+    chave_idempotencia já existia (ou se repete no próprio lote): nesse caso
+    devolve o id original e nada é gravado.
+    """
+    inseridos = execute_values(
+        cursor, SQL_INSERIR_FORMULARIOS,
+        [(ordem, *_valores_formulario(dados)) for ordem, dados in enumerate(lista_dados)],
+        template=MODELO_FORMULARIO, page_size=len(lista_dados), fetch=True
+    )
+
+    por_ordem = {ordem: novo_id for ordem, novo_id, _, _, _ in inseridos}
+    por_chave = {chave: novo_id for _, novo_id, _, _, chave in inseridos if chave is not None}
 
-    # Se for string vazia, converter para None (NULL no banco)
-    if hora_inicio == "":
-        hora_inicio = None
-    if hora_saida == "":
-        hora_saida = None
+    # Chaves que já existiam antes deste lote: o id original vem de
+    # chave_idempotencia (consulta pela chave primária, sem varrer partições)
+    pendentes = {
+        dados['chave_idempotencia'] for ordem, dados in enumerate(lista_dados)
+        if ordem not in por_ordem and dados['chave_idempotencia'] not in por_chave
+    }
+    existentes = {}
+    if pendentes:
+        cursor.execute(
+            "SELECT chave, idboletimdiario FROM chave_idempotencia WHERE chave = ANY(%s)",
+            (list(pendentes),)
+        )
+        existentes = dict(cursor.fetchall())
 
+    resultados = []
+    for ordem, dados in enumerate(lista_dados):
+        if ordem in por_ordem:
+            resultados.append((por_ordem[ordem], False))
+        else:
+            chave = dados['chave_idempotencia']
+            resultados.append((por_chave.get(chave) or existentes[chave], True))
+    return resultados, {(data, idagente) for _, _, data, idagente, _ in inseridos}
+
+
+def _invalidar_graficos(conn, pares):
+    """
+    Incrementa as versões diárias dos gráficos das datas em `pares`, em uma
+    transação própria depois do commit dos formulários: a linha de
+    versao_graficos de um dia é a mesma para todos os envios desse dia, e
+    travá-la na transação do INSERT enfileiraria os agentes (de todos os
+    workers) nela. Um leitor no intervalo apenas guarda dados novos sob a
+    versão antiga. Os formulários já foram gravados, então uma falha aqui
+    só é registrada no log.
+    """
+    if not pares:
+        return
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO formularioporcasa (
-                    data, bairro, endereco, tipo_inseto, hora_inicio, hora_saida,
-                    num_pontos_criticos, total_criaduros_encontrados, criaduros_eliminados, tipos_criaduros,
-                    num_locos_larva, num_locos_positivos, num_adultos_encontrados,
-                    num_adultos_coletados, acaorealizada, inseticida_usado,
-                    quantidade_inseticida, casos_suspeitos, nome_pessoa,
-                    telefone_pessoa, observacoes, idagente
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING idboletimdiario;
-            """, (
-                dados.get('data'), 
-                dados.get('bairro', ''),
-                dados.get('endereco', ''),
-                dados.get('tipo_inseto'),
-                hora_inicio,  # Agora pode ser None em vez de string vazia
-                hora_saida,   # Agora pode ser None em vez de string vazia
-                dados.get('num_pontos_criticos', 0),
-                dados.get('total_criaduros_encontrados', 0),
-                dados.get('criaduros_eliminados', 0),
-                dados.get('tipos_criaduros', ''),
-                dados.get('num_locos_larva', 0),
-                dados.get('num_locos_positivos', 0),
-                dados.get('num_adultos_encontrados', 0),
-                dados.get('num_adultos_coletados', 0),
-                dados.get('acaorealizada', ''),
-                dados.get('inseticida_usado', ''),
-                dados.get('quantidade_inseticida', ''),
-                dados.get('casos_suspeitos', 0),
-                dados.get('nome_pessoa', ''),
-                dados.get('telefone_pessoa', ''),
-                dados.get('observacoes', ''),
-                dados.get('idagente')
-            ))
-            novo_id = cursor.fetchone()[0]
-
-            # Atualiza resumo diário (remoção e inserção com agregação)
-            cursor.execute("""
-                DELETE FROM resumodiario 
-                WHERE data = %s AND idagente = %s;
-                INSERT INTO resumodiario (
-                    data, idagente, total_domicilios_visitados, total_pontos_criticos,
-                    total_criaduros_encontrados, total_criaduros_eliminados,
-                    total_larvas_encontradas, total_larvas_coletadas,
-                    total_adultos_coletados, total_casos_suspeitos
-                )
-                SELECT 
-                    data, idagente, COUNT(*) as total_domicilios_visitados,
-                    SUM(COALESCE(num_pontos_criticos,0)) as total_pontos_criticos,
-                    SUM(COALESCE(total_criaduros_encontrados,0)) as total_criaduros_encontrados,
-                    SUM(COALESCE(criaduros_eliminados,0)) as total_criaduros_eliminados,
-                    SUM(COALESCE(num_locos_larva,0)) as total_larvas_encontradas,
-                    SUM(COALESCE(num_locos_positivos,0)) as total_larvas_coletadas,
-                    SUM(COALESCE(num_adultos_coletados,0)) as total_adultos_coletados,
-                    SUM(COALESCE(casos_suspeitos,0)) as total_casos_suspeitos
-                FROM formularioporcasa 
-                WHERE data = %s AND idagente = %s
-                GROUP BY data, idagente;
-            """, (dados.get('data'), dados.get('idagente'), dados.get('data'), dados.get('idagente')))
-
+            cache_graficos.invalidar_periodos(cursor, 'diario', [data for data, _ in pares])
         conn.commit()
-        conn.close()
-        return jsonify({
-            "success": True,
-            "mensagem": "Formulário criado com sucesso",
-            "id_formulario": novo_id,
-            "resumo_atualizado": True
-        }), 201
-
-    except Exception as e:
+    except Exception:
         conn.rollback()
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao criar formulário: {str(e)}"}), 500
+        current_app.logger.exception("Falha ao invalidar o cache de gráficos")
+
+
+@formularios_bp.route("", methods=["POST", "OPTIONS"])
+def criar_formulario():
+    """
+    Cria um formulário. Clientes que podem reenviar (ex.: sem conexão) devem
+    mandar uma chave única no cabeçalho Idempotency-Key ou no campo
+    chave_idempotencia: reenvios devolvem o formulário original (200) sem
+    gravar de novo nem alterar o resumo diário.
+    """
+    if request.method == "OPTIONS":
+        return ("", 200)
+
+    dados = request.get_json() or {}
+    if isinstance(dados, dict) and request.headers.get('Idempotency-Key'):
+        dados['chave_idempotencia'] = request.headers['Idempotency-Key']
+
+    erros_campo = _validar_formulario(dados)
+    if erros_campo:
+        return jsonify({"success": False, "errors": erros_campo}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                if _agentes_inexistentes(cursor, [dados]):
+                    conn.rollback()
+                    return jsonify({"success": False, "errors": {"idagente": "Agente não encontrado"}}), 400
+                # Insere o formulário e atualiza o resumo diário do agente
+                # (upsert incremental) em um único comando
+                [(novo_id, duplicado)], pares = _inserir_formularios(cursor, [dados])
+
+            conn.commit()
+            _invalidar_graficos(conn, pares)
+            if duplicado:
+                return jsonify({
+                    "success": True,
+                    "mensagem": "Formulário já recebido anteriormente",
+                    "id_formulario": novo_id,
+                    "duplicado": True,
+                    "resumo_atualizado": False
+                }), 200
+            return jsonify({
+                "success": True,
+                "mensagem": "Formulário criado com sucesso",
+                "id_formulario": novo_id,
+                "resumo_atualizado": True
+            }), 201
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao criar formulário: {str(e)}"}), 500
+
+def _ler_lote():
+    """
+    Lê os formulários do corpo: array JSON, objeto {"formularios": [...]} ou
+    NDJSON (Content-Type application/x-ndjson). Linhas NDJSON inválidas
+    viram None e são rejeitadas individualmente.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/ndjson"):
+        registros = []
+        for linha in request.get_data().splitlines():
+            if not linha.strip():
+                continue
+            try:
+                registros.append(json.loads(linha))
+            except ValueError:
+                registros.append(None)
+        return registros
+
+    corpo = request.get_json(silent=True)
+    if isinstance(corpo, dict):
+        corpo = corpo.get("formularios")
+    if not isinstance(corpo, list):
+        raise ValueError("Envie um array de formulários, {\"formularios\": [...]} ou NDJSON")
+    return corpo
+
+
+@formularios_bp.route("/lote", methods=["POST", "OPTIONS"])
+def criar_formularios_lote():
+    """
+    Cria vários formulários em uma única transação (sincronização dos
+    agentes em campo). Cada registro é validado como em criar_formulario;
+    os válidos são inseridos com um INSERT de várias linhas e o resumo
+    diário é atualizado uma vez por (data, idagente). A resposta traz, na
+    ordem do envio, o id criado ou os erros de cada registro.
+    """
+    if request.method == "OPTIONS":
+        return ("", 200)
+
+    try:
+        registros = _ler_lote()
+    except ValueError as e:
+        return jsonify({"success": False, "erro": str(e)}), 400
+
+    if not registros:
+        return jsonify({"success": False, "erro": "Nenhum formulário enviado"}), 400
+    if len(registros) > LOTE_MAXIMO:
+        return jsonify({"success": False, "erro": f"Máximo de {LOTE_MAXIMO} formulários por lote"}), 400
+
+    resultados = []
+    validos = []
+    for indice, dados in enumerate(registros):
+        erros_campo = _validar_formulario(dados)
+        if erros_campo:
+            resultados.append({"indice": indice, "errors": erros_campo})
+        else:
+            resultado = {"indice": indice}
+            resultados.append(resultado)
+            validos.append((resultado, dados))
+
+    if not validos:
+        return jsonify({"success": False, "inseridos": 0, "rejeitados": len(resultados),
+                        "resultados": resultados}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                # Agentes inexistentes rejeitam só os seus registros, não o lote
+                inexistentes = _agentes_inexistentes(cursor, [dados for _, dados in validos])
+                if inexistentes:
+                    for resultado, dados in validos:
+                        if _inteiro(dados['idagente']) in inexistentes:
+                            resultado["errors"] = {"idagente": "Agente não encontrado"}
+                    validos = [(resultado, dados) for resultado, dados in validos if "errors" not in resultado]
+                if not validos:
+                    conn.rollback()
+                    return jsonify({"success": False, "inseridos": 0, "rejeitados": len(resultados),
+                                    "resultados": resultados}), 400
+
+                # Um só comando insere tudo e atualiza os resumos
+                inseridos, pares = _inserir_formularios(cursor, [dados for _, dados in validos])
+
+            conn.commit()
+            _invalidar_graficos(conn, pares)
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao criar formulários: {str(e)}"}), 500
+
+    duplicados = 0
+    for (resultado, _), (novo_id, duplicado) in zip(validos, inseridos):
+        resultado["id_formulario"] = novo_id
+        if duplicado:
+            resultado["duplicado"] = True
+            duplicados += 1
+
+    return jsonify({
+        "success": True,
+        "mensagem": "Formulários criados com sucesso",
+        "inseridos": len(validos) - duplicados,
+        "duplicados": duplicados,
+        "rejeitados": len(resultados) - len(validos),
+        "resumos_atualizados": len(pares),
+        "resultados": resultados
+    }), 201
+
+SQL_RESUMO_DIARIO = """
+    SELECT data, COUNT(*) as total_formularios,
+           SUM(num_pontos_criticos) as total_pontos_criticos,
+           SUM(total_criaduros_encontrados) as total_criaduros_encontrados,
+           SUM(criaduros_eliminados) as total_criaduros_eliminados
+    FROM formularioporcasa
+    GROUP BY data
+    ORDER BY data DESC;
+"""
 
 @formularios_bp.route("/resumo/diario", methods=["GET"])
+@condicional("formularioporcasa")
 def resumo_diario():
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT data, COUNT(*) as total_formularios,
-                       SUM(num_pontos_criticos) as total_pontos_criticos,
-                       SUM(total_criaduros_encontrados) as total_criaduros_encontrados,
-                       SUM(criaduros_eliminados) as total_criaduros_eliminados
-                FROM formularioporcasa
-                GROUP BY data
-                ORDER BY data DESC;
-            """)
-            resumo = cursor.fetchall()
-        conn.close()
-        return jsonify({"success": True, "data": resumo}), 200
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao buscar resumo diário: {str(e)}"}), 500
\ No newline at end of file
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(SQL_RESUMO_DIARIO)
+                resumo = cursor.fetchall()
+            return jsonify({"success": True, "data": resumo}), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao buscar resumo diário: {str(e)}"}), 500
\ No newline at end of file
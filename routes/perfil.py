@@ -0,0 +1,26 @@
+from flask import Blueprint, request, jsonify
+import perfilador
+
+perfil_bp = Blueprint("perfil", __name__)
+
+@perfil_bp.route("", methods=["GET"])
+def obter_perfil():
+    """
+    Configuração do perfilador e últimas consultas lentas e N+1 deste
+    worker (cada processo guarda as suas; o log traz as de todos).
+    """
+    perfilador.sincronizar()
+    return jsonify({"success": True, "data": perfilador.ocorrencias()}), 200
+
+@perfil_bp.route("", methods=["PUT"])
+def alterar_perfil():
+    """
+    Liga/desliga o perfilador em tempo de execução. Corpo com qualquer
+    subconjunto de {"ativo", "limite_ms", "explain", "n_mais_um"}.
+    """
+    data = request.get_json(silent=True)
+    erros = perfilador.validar_config(data)
+    if erros:
+        return jsonify({"success": False, "errors": erros}), 400
+
+    return jsonify({"success": True, "data": perfilador.configurar(data)}), 200
@@ -1,61 +1,68 @@
-from flask import Blueprint, request, jsonify, Response
-from database import get_connection
+from flask import Blueprint, request, jsonify, Response, current_app, send_file, url_for
+from database import connection
+from cache_http import condicional, VERSAO_FORMATO
+from agregacao import (
+    NIVEIS_RESUMO, RESUMOS_MATERIALIZADOS, TABELA_SEMANAL, TABELA_MENSAL,
+    atualizar_materializados, invalidar_diarios, processar_periodos_sujos, recalcular_resumo_diario,
+    reprocessar_diarios, reprocessar_resumos,
+)
+from graficos_json import graficos_diarios, graficos_semanais, graficos_mensais
+import cache_graficos
+import metricas
+import renderizacao
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-import plotly.express as px
-import json
-import plotly.io as pio
-import zipfile
-from io import BytesIO
+from itertools import groupby
+
+# Não importar plotly/pandas aqui: o worker web só carrega o template do
+# Plotly na primeira rota de gráfico (graficos_json.py), e as figuras e o
+# Kaleido vivem nos processos de renderização (renderizacao.py, graficos.py).
+# benchmarks/bench_inicializacao.py falha se isso regredir.
 
 resumos_bp = Blueprint('resumos', __name__)
 
 # Rotas para buscar resumos existentes
 @resumos_bp.route('/diarios', methods=['GET'])
+@condicional('resumodiario')
 def resumos_diarios():
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT * FROM resumodiario ORDER BY data DESC;")
-            resumos = cursor.fetchall()
-        conn.close()
-        return jsonify({"success": True, "data": resumos}), 200
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao buscar resumos diários: {str(e)}"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT * FROM resumodiario ORDER BY data DESC;")
+                resumos = cursor.fetchall()
+            return jsonify({"success": True, "data": resumos}), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao buscar resumos diários: {str(e)}"}), 500
 
 @resumos_bp.route('/semanais', methods=['GET'])
+@condicional(TABELA_SEMANAL)
 def resumos_semanais():
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT * FROM resumosemanal ORDER BY data_inicio DESC;")
-            resumos = cursor.fetchall()
-        conn.close()
-        return jsonify({"success": True, "data": resumos}), 200
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao buscar resumos semanais: {str(e)}"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(f"SELECT * FROM {TABELA_SEMANAL} ORDER BY data_inicio DESC;")
+                resumos = cursor.fetchall()
+            return jsonify({"success": True, "data": resumos}), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao buscar resumos semanais: {str(e)}"}), 500
 
 @resumos_bp.route('/mensais', methods=['GET'])
+@condicional(TABELA_MENSAL)
 def resumos_mensais():
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT * FROM resumomensal ORDER BY data_inicio DESC;")
-            resumos = cursor.fetchall()
-        conn.close()
-        return jsonify({"success": True, "data": resumos}), 200
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao buscar resumos mensais: {str(e)}"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(f"SELECT * FROM {TABELA_MENSAL} ORDER BY data_inicio DESC;")
+                resumos = cursor.fetchall()
+            return jsonify({"success": True, "data": resumos}), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao buscar resumos mensais: {str(e)}"}), 500
 
 # Rota para gerar resumos diários
 @resumos_bp.route('/gerar-diarios', methods=['POST'])
@@ -70,57 +77,221 @@ def gerar_resumos_diarios():
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
 
-    try:
-        with conn.cursor() as cursor:
-            # Verificar se já existe resumo diário para esta data
-            cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data = %s", (data_selecionada,))
-            total_existente = cursor.fetchone()[0]
+        try:
+            with conn.cursor() as cursor:
+                # Verificar se já existe resumo diário para esta data
+                cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data = %s", (data_selecionada,))
+                total_existente = cursor.fetchone()[0]
             
-            if total_existente > 0:
-                acao = data.get('acao', 'manter')
-                if acao == 'pular':
-                    conn.close()
-                    return jsonify({
-                        "success": True,
-                        "mensagem": f"Resumo diário já existe para {data_selecionada}. Ação: pular"
-                    }), 200
-                elif acao == 'sobrescrever':
-                    cursor.execute("DELETE FROM resumodiario WHERE data = %s", (data_selecionada,))
-
-            # Inserir dados de exemplo
-            cursor.execute("""
-                INSERT INTO resumodiario (
-                    data, idagente, total_domicilios_visitados, total_pontos_criticos,
-                    total_criaduros_encontrados, total_criaduros_eliminados,
-                    total_larvas_encontradas, total_larvas_coletadas,
-                    total_adultos_coletados, total_casos_suspeitos
-                ) VALUES 
-                (%s, 1, 15, 3, 8, 6, 12, 9, 7, 2),
-                (%s, 2, 12, 2, 5, 4, 8, 6, 5, 1),
-                (%s, 3, 18, 4, 10, 8, 15, 12, 9, 3)
-            """, (data_selecionada, data_selecionada, data_selecionada))
+                if total_existente > 0:
+                    acao = data.get('acao', 'manter')
+                    if acao == 'pular':
+                        return jsonify({
+                            "success": True,
+                            "mensagem": f"Resumo diário já existe para {data_selecionada}. Ação: pular"
+                        }), 200
+
+                # Agrega os formulários do dia (com 'manter', só os agentes
+                # que ainda não têm resumo)
+                reprocessar_diarios(cursor, data_selecionada, data_selecionada,
+                                    sobrescrever=data.get('acao') == 'sobrescrever')
+
+                conn.commit()
+                invalidar_diarios(conn, data_selecionada, data_selecionada)
+
+                cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data = %s", (data_selecionada,))
+                total_inserido = cursor.fetchone()[0]
+
+            return jsonify({
+                "success": True,
+                "mensagem": f"Resumo diário gerado para {data_selecionada}",
+                "data": data_selecionada.isoformat(),
+                "resumos_gerados": total_inserido
+            }), 201
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao gerar resumo diário: {str(e)}"}), 500
+
+# Reprocessamento em lote de um intervalo de datas
+@resumos_bp.route('/reprocessar', methods=['POST'])
+def reprocessar():
+    """
+    Reconstrói os resumos de um intervalo a partir de formularioporcasa.
+    Corpo: {"inicio": "YYYY-MM-DD", "fim": "YYYY-MM-DD",
+            "niveis": ["diario", "semanal", "mensal"] (opcional, padrão todos)}.
+    Semanas e meses que tocam o intervalo são reconstruídos inteiros. Também
+    disponível como `flask reprocessar-resumos`.
+    """
+    data = request.get_json()
 
-            conn.commit()
+    if not data or 'inicio' not in data or 'fim' not in data:
+        return jsonify({"success": False, "erro": "Informe 'inicio' e 'fim'"}), 400
 
-            cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data = %s", (data_selecionada,))
-            total_inserido = cursor.fetchone()[0]
+    try:
+        inicio = datetime.strptime(data['inicio'], '%Y-%m-%d').date()
+        fim = datetime.strptime(data['fim'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-        conn.close()
-        return jsonify({
-            "success": True,
-            "mensagem": f"Resumo diário gerado para {data_selecionada}",
-            "data": data_selecionada.isoformat(),
-            "resumos_gerados": total_inserido
-        }), 201
+    if inicio > fim:
+        return jsonify({"success": False, "erro": "'inicio' deve ser anterior ou igual a 'fim'"}), 400
+
+    niveis = data.get('niveis') or list(NIVEIS_RESUMO)
+    if not isinstance(niveis, list) or any(n not in NIVEIS_RESUMO for n in niveis):
+        return jsonify({"success": False, "erro": "Níveis válidos: diario, semanal, mensal"}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            relatorio = reprocessar_resumos(conn, inicio, fim, niveis)
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao reprocessar resumos: {str(e)}"}), 500
+
+    return jsonify({
+        "success": True,
+        "periodo": {"inicio": inicio.isoformat(), "fim": fim.isoformat()},
+        "niveis": relatorio
+    }), 200
+
+# Processa os períodos marcados como sujos pelos triggers de formularioporcasa
+@resumos_bp.route('/processar-pendentes', methods=['POST'])
+def processar_pendentes():
+    """
+    Refaz apenas os resumos (diário, semanal e mensal) dos períodos alterados
+    desde o último processamento. Corpo opcional: {"max_lotes": N}. Também
+    disponível como `flask processar-pendentes`.
+    """
+    data = request.get_json(silent=True) or {}
+    max_lotes = data.get('max_lotes')
+    if max_lotes is not None and (not isinstance(max_lotes, int) or max_lotes < 1):
+        return jsonify({"success": False, "erro": "'max_lotes' deve ser um inteiro positivo"}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            relatorio = processar_periodos_sujos(conn, max_lotes=max_lotes)
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao processar períodos pendentes: {str(e)}"}), 500
+
+    return jsonify({"success": True, "data": relatorio}), 200
+
+# Rota de reparo: reconstrói resumodiario a partir dos formulários
+@resumos_bp.route('/recalcular-diario', methods=['POST'])
+def recalcular_diario():
+    """
+    Recalcula o resumo diário de uma data (e opcionalmente de um agente) a
+    partir de formularioporcasa. O caminho normal é o upsert incremental em
+    criar_formulario; use esta rota apenas para corrigir divergências.
+    """
+    data = request.get_json()
 
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar resumo diário: {str(e)}"}), 500
+    if not data or 'data' not in data:
+        return jsonify({"success": False, "erro": "Data é obrigatória"}), 400
+
+    try:
+        data_selecionada = datetime.strptime(data['data'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                if data.get('idagente'):
+                    agentes = [int(data['idagente'])]
+                else:
+                    cursor.execute("""
+                        SELECT idagente FROM formularioporcasa WHERE data = %s
+                        UNION
+                        SELECT idagente FROM resumodiario WHERE data = %s
+                        ORDER BY idagente
+                    """, (data_selecionada, data_selecionada))
+                    agentes = [row[0] for row in cursor.fetchall()]
+
+                recalculados = sum(
+                    1 for idagente in agentes
+                    if recalcular_resumo_diario(cursor, data_selecionada, idagente)
+                )
+                cache_graficos.invalidar_periodo(cursor, 'diario', data_selecionada)
+
+            conn.commit()
+            return jsonify({
+                "success": True,
+                "mensagem": f"Resumo diário recalculado para {data_selecionada}",
+                "data": data_selecionada.isoformat(),
+                "agentes_verificados": len(agentes),
+                "resumos_gerados": recalculados
+            }), 200
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao recalcular resumo diário: {str(e)}"}), 500
+
+# Modo materializado (RESUMOS_MODO=materializado): semanais e mensais são
+# views atualizadas com REFRESH CONCURRENTLY, sem janela com dados faltando
+def _gerar_materializado(nivel, inicio, fim):
+    """gerar-semanais/gerar-mensais no modo materializado: atualiza a view do nível."""
+    tabela = TABELA_SEMANAL if nivel == 'semanal' else TABELA_MENSAL
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            relatorio = atualizar_materializados(conn, (nivel,))
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {tabela} WHERE data_inicio = %s", (inicio,))
+                total = cursor.fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao atualizar resumos {nivel}s: {str(e)}"}), 500
+
+    return jsonify({
+        "success": True,
+        "mensagem": f"View {tabela} atualizada",
+        "periodo": {
+            "data_inicio": inicio.isoformat(),
+            "data_fim": fim.isoformat()
+        },
+        "resumos_gerados": total,
+        "duracao_ms": relatorio[0]["duracao_ms"]
+    }), 201
+
+@resumos_bp.route('/atualizar-materializados', methods=['POST'])
+def atualizar_resumos_materializados():
+    """
+    Atualiza as views materializadas de resumos semanais e mensais.
+    Corpo opcional: {"niveis": ["semanal", "mensal"]}. Também disponível
+    como `flask atualizar-materializados`.
+    """
+    data = request.get_json(silent=True) or {}
+    niveis = data.get('niveis') or ['semanal', 'mensal']
+    if not isinstance(niveis, list) or any(n not in ('semanal', 'mensal') for n in niveis):
+        return jsonify({"success": False, "erro": "Níveis válidos: semanal, mensal"}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            relatorio = atualizar_materializados(conn, niveis)
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao atualizar views materializadas: {str(e)}"}), 500
+
+    return jsonify({"success": True, "modo": "materializado" if RESUMOS_MATERIALIZADOS else "tabela",
+                    "niveis": relatorio}), 200
 
 # Rota para gerar resumos semanais
 @resumos_bp.route('/gerar-semanais', methods=['POST'])
@@ -135,83 +306,87 @@ def gerar_resumos_semanais():
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
+    if RESUMOS_MATERIALIZADOS:
         inicio_semana = data_referencia - timedelta(days=data_referencia.weekday())
-        fim_semana = inicio_semana + timedelta(days=6)
-
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data BETWEEN %s AND %s", 
-                         (inicio_semana, fim_semana))
-            total_diarios = cursor.fetchone()[0]
-
-            if total_diarios == 0:
-                return jsonify({
-                    "success": False, 
-                    "erro": f"Não existem resumos diários para a semana de {inicio_semana} a {fim_semana}"
-                }), 400
-
-            cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
-            total_existente = cursor.fetchone()[0]
-
-            if total_existente > 0:
-                acao = data.get('acao', 'manter')
-                if acao == 'pular':
-                    conn.close()
-                    return jsonify({
-                        "success": True,
-                        "mensagem": f"Resumo semanal já existe para esta semana. Ação: pular"
-                    }), 200
-                elif acao == 'sobrescrever':
-                    cursor.execute("DELETE FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
-
-            cursor.execute("""
-                INSERT INTO resumosemanal (
-                    data_inicio, data_fim, idagente,
-                    total_domicilios_visitados, total_pontos_criticos,
-                    total_criaduros_encontrados, total_criaduros_eliminados,
-                    total_larvas_encontradas, total_larvas_coletadas,
-                    total_adultos_coletados, total_casos_suspeitos
-                )
-                SELECT 
-                    %s, %s, idagente,
-                    SUM(total_domicilios_visitados),
-                    SUM(total_pontos_criticos),
-                    SUM(total_criaduros_encontrados),
-                    SUM(total_criaduros_eliminados),
-                    SUM(total_larvas_encontradas),
-                    SUM(total_larvas_coletadas),
-                    SUM(total_adultos_coletados),
-                    SUM(total_casos_suspeitos)
-                FROM resumodiario 
-                WHERE data BETWEEN %s AND %s
-                GROUP BY idagente;
-            """, (inicio_semana, fim_semana, inicio_semana, fim_semana))
+        return _gerar_materializado('semanal', inicio_semana, inicio_semana + timedelta(days=6))
 
-            conn.commit()
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
 
-            cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
-            total_inserido = cursor.fetchone()[0]
+        try:
+            inicio_semana = data_referencia - timedelta(days=data_referencia.weekday())
+            fim_semana = inicio_semana + timedelta(days=6)
 
-        conn.close()
-        return jsonify({
-            "success": True,
-            "mensagem": f"Resumos semanais gerados para {inicio_semana} a {fim_semana}",
-            "periodo": {
-                "data_inicio": inicio_semana.isoformat(),
-                "data_fim": fim_semana.isoformat()
-            },
-            "dados_encontrados": total_diarios,
-            "resumos_gerados": total_inserido
-        }), 201
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data BETWEEN %s AND %s", 
+                             (inicio_semana, fim_semana))
+                total_diarios = cursor.fetchone()[0]
 
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar resumos semanais: {str(e)}"}), 500
+                if total_diarios == 0:
+                    return jsonify({
+                        "success": False, 
+                        "erro": f"Não existem resumos diários para a semana de {inicio_semana} a {fim_semana}"
+                    }), 400
+
+                cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
+                total_existente = cursor.fetchone()[0]
+
+                if total_existente > 0:
+                    acao = data.get('acao', 'manter')
+                    if acao == 'pular':
+                        return jsonify({
+                            "success": True,
+                            "mensagem": f"Resumo semanal já existe para esta semana. Ação: pular"
+                        }), 200
+                    elif acao == 'sobrescrever':
+                        cursor.execute("DELETE FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
+
+                cursor.execute("""
+                    INSERT INTO resumosemanal (
+                        data_inicio, data_fim, idagente,
+                        total_domicilios_visitados, total_pontos_criticos,
+                        total_criaduros_encontrados, total_criaduros_eliminados,
+                        total_larvas_encontradas, total_larvas_coletadas,
+                        total_adultos_coletados, total_casos_suspeitos
+                    )
+                    SELECT 
+                        %s, %s, idagente,
+                        SUM(total_domicilios_visitados),
+                        SUM(total_pontos_criticos),
+                        SUM(total_criaduros_encontrados),
+                        SUM(total_criaduros_eliminados),
+                        SUM(total_larvas_encontradas),
+                        SUM(total_larvas_coletadas),
+                        SUM(total_adultos_coletados),
+                        SUM(total_casos_suspeitos)
+                    FROM resumodiario 
+                    WHERE data BETWEEN %s AND %s
+                    GROUP BY idagente
+                    -- 'manter': as linhas existentes ficam, só os agentes que faltam entram
+                    ON CONFLICT (data_inicio, idagente) DO NOTHING;
+                """, (inicio_semana, fim_semana, inicio_semana, fim_semana))
+                cache_graficos.invalidar_periodo(cursor, 'semanal', inicio_semana)
+
+                conn.commit()
+
+                cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
+                total_inserido = cursor.fetchone()[0]
+
+            return jsonify({
+                "success": True,
+                "mensagem": f"Resumos semanais gerados para {inicio_semana} a {fim_semana}",
+                "periodo": {
+                    "data_inicio": inicio_semana.isoformat(),
+                    "data_fim": fim_semana.isoformat()
+                },
+                "dados_encontrados": total_diarios,
+                "resumos_gerados": total_inserido
+            }), 201
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao gerar resumos semanais: {str(e)}"}), 500
 
 # Rota para gerar resumos mensais
 @resumos_bp.route('/gerar-mensais', methods=['POST'])
@@ -226,86 +401,225 @@ def gerar_resumos_mensais():
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
+    if RESUMOS_MATERIALIZADOS:
         inicio_mes = data_referencia.replace(day=1)
-        if data_referencia.month == 12:
-            fim_mes = data_referencia.replace(year=data_referencia.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            fim_mes = data_referencia.replace(month=data_referencia.month + 1, day=1) - timedelta(days=1)
-
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio BETWEEN %s AND %s", 
-                         (inicio_mes, fim_mes))
-            total_semanais = cursor.fetchone()[0]
-
-            if total_semanais == 0:
-                return jsonify({
-                    "success": False, 
-                    "erro": f"Não existem resumos semanais para o mês de {inicio_mes.strftime('%B %Y')}"
-                }), 400
-
-            cursor.execute("SELECT COUNT(*) as total FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
-            total_existente = cursor.fetchone()[0]
-
-            if total_existente > 0:
-                acao = data.get('acao', 'manter')
-                if acao == 'pular':
-                    conn.close()
+        fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return _gerar_materializado('mensal', inicio_mes, fim_mes)
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            inicio_mes = data_referencia.replace(day=1)
+            if data_referencia.month == 12:
+                fim_mes = data_referencia.replace(year=data_referencia.year + 1, month=1, day=1) - timedelta(days=1)
+            else:
+                fim_mes = data_referencia.replace(month=data_referencia.month + 1, day=1) - timedelta(days=1)
+
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio BETWEEN %s AND %s", 
+                             (inicio_mes, fim_mes))
+                total_semanais = cursor.fetchone()[0]
+
+                if total_semanais == 0:
                     return jsonify({
-                        "success": True,
-                        "mensagem": f"Resumo mensal já existe para este mês. Ação: pular"
-                    }), 200
-                elif acao == 'sobrescrever':
-                    cursor.execute("DELETE FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
-
-            cursor.execute("""
-                INSERT INTO resumomensal (
-                    data_inicio, data_fim, idagente,
-                    total_domicilios_visitados_mes, total_pontos_criticos_mes,
-                    total_criaduros_encontrados_mes, total_criaduros_eliminados_mes,
-                    total_larvas_encontradas_mes, total_larvas_coletadas_mes,
-                    total_adultos_coletados_mes, total_casos_suspeitos_mes
-                )
-                SELECT 
-                    %s, %s, idagente,
-                    SUM(total_domicilios_visitados),
-                    SUM(total_pontos_criticos),
-                    SUM(total_criaduros_encontrados),
-                    SUM(total_criaduros_eliminados),
-                    SUM(total_larvas_encontradas),
-                    SUM(total_larvas_coletadas),
-                    SUM(total_adultos_coletados),
-                    SUM(total_casos_suspeitos)
-                FROM resumosemanal 
-                WHERE data_inicio BETWEEN %s AND %s
-                GROUP BY idagente;
-            """, (inicio_mes, fim_mes, inicio_mes, fim_mes))
+                        "success": False, 
+                        "erro": f"Não existem resumos semanais para o mês de {inicio_mes.strftime('%B %Y')}"
+                    }), 400
 
-            conn.commit()
+                cursor.execute("SELECT COUNT(*) as total FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
+                total_existente = cursor.fetchone()[0]
+
+                if total_existente > 0:
+                    acao = data.get('acao', 'manter')
+                    if acao == 'pular':
+                        return jsonify({
+                            "success": True,
+                            "mensagem": f"Resumo mensal já existe para este mês. Ação: pular"
+                        }), 200
+                    elif acao == 'sobrescrever':
+                        cursor.execute("DELETE FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
+
+                cursor.execute("""
+                    INSERT INTO resumomensal (
+                        data_inicio, data_fim, idagente,
+                        total_domicilios_visitados_mes, total_pontos_criticos_mes,
+                        total_criaduros_encontrados_mes, total_criaduros_eliminados_mes,
+                        total_larvas_encontradas_mes, total_larvas_coletadas_mes,
+                        total_adultos_coletados_mes, total_casos_suspeitos_mes
+                    )
+                    SELECT 
+                        %s, %s, idagente,
+                        SUM(total_domicilios_visitados),
+                        SUM(total_pontos_criticos),
+                        SUM(total_criaduros_encontrados),
+                        SUM(total_criaduros_eliminados),
+                        SUM(total_larvas_encontradas),
+                        SUM(total_larvas_coletadas),
+                        SUM(total_adultos_coletados),
+                        SUM(total_casos_suspeitos)
+                    FROM resumosemanal 
+                    WHERE data_inicio BETWEEN %s AND %s
+                    GROUP BY idagente
+                    -- 'manter': as linhas existentes ficam, só os agentes que faltam entram
+                    ON CONFLICT (data_inicio, idagente) DO NOTHING;
+                """, (inicio_mes, fim_mes, inicio_mes, fim_mes))
+                cache_graficos.invalidar_periodo(cursor, 'mensal', inicio_mes)
+
+                conn.commit()
 
-            cursor.execute("SELECT COUNT(*) as total FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
-            total_inserido = cursor.fetchone()[0]
+                cursor.execute("SELECT COUNT(*) as total FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
+                total_inserido = cursor.fetchone()[0]
+
+            return jsonify({
+                "success": True,
+                "mensagem": f"Resumos mensais gerados para {inicio_mes.strftime('%B %Y')}",
+                "periodo": {
+                    "data_inicio": inicio_mes.isoformat(),
+                    "data_fim": fim_mes.isoformat()
+                },
+                "dados_encontrados": total_semanais,
+                "resumos_gerados": total_inserido
+            }), 201
+
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "erro": f"Erro ao gerar resumos mensais: {str(e)}"}), 500
+
+# MONTAGEM DOS GRÁFICOS EM JSON (usada pelas rotas abaixo, pelo cache e
+# pelo modo assíncrono em asgi.py, que só troca a leitura das linhas)
+SQL_GRAFICOS = {
+    'diario': "SELECT * FROM resumodiario WHERE data = %s ORDER BY idagente",
+    'semanal': f"SELECT * FROM {TABELA_SEMANAL} WHERE data_inicio = %s ORDER BY idagente",
+    'mensal': f"SELECT * FROM {TABELA_MENSAL} WHERE data_inicio = %s ORDER BY idagente",
+}
+
+def resposta_graficos_diarios(data_selecionada, dados_list):
+    """Resposta dos gráficos diários a partir das linhas de resumodiario"""
+    graficos_json = dict(graficos_diarios(data_selecionada, dados_list))
+    graficos_json["dados"] = dados_list
+
+    return {
+        "success": True,
+        "data": data_selecionada.isoformat(),
+        "graficos": graficos_json
+    }
+
+def resposta_graficos_semanais(inicio_semana, dados_list):
+    """Resposta dos gráficos semanais a partir das linhas do resumo semanal"""
+    fim_semana = inicio_semana + timedelta(days=6)
+
+    graficos_json = dict(graficos_semanais(inicio_semana, fim_semana, dados_list))
+    graficos_json.update({
+        "dados": dados_list,
+        "periodo": {
+            "inicio": inicio_semana.isoformat(),
+            "fim": fim_semana.isoformat()
+        }
+    })
+
+    return {
+        "success": True,
+        "graficos": graficos_json
+    }
+
+def resposta_graficos_mensais(inicio_mes, dados_list):
+    """Resposta dos gráficos mensais a partir das linhas do resumo mensal"""
+    if inicio_mes.month == 12:
+        fim_mes = inicio_mes.replace(year=inicio_mes.year + 1, month=1, day=1) - timedelta(days=1)
+    else:
+        fim_mes = inicio_mes.replace(month=inicio_mes.month + 1, day=1) - timedelta(days=1)
+
+    graficos_json = dict(graficos_mensais(inicio_mes, dados_list))
+    graficos_json.update({
+        "dados": dados_list,
+        "periodo": {
+            "inicio": inicio_mes.isoformat(),
+            "fim": fim_mes.isoformat(),
+            "mes_ano": inicio_mes.strftime("%Y-%m")
+        }
+    })
+
+    return {
+        "success": True,
+        "graficos": graficos_json
+    }
+
+RESPOSTAS_GRAFICOS = {
+    'diario': resposta_graficos_diarios,
+    'semanal': resposta_graficos_semanais,
+    'mensal': resposta_graficos_mensais,
+}
+
+def _montar_graficos(conn, tipo, periodo):
+    """Monta a resposta dos gráficos do período (None se não houver dados)"""
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(SQL_GRAFICOS[tipo], (periodo,))
+        dados = cursor.fetchall()
+
+    if not dados:
+        return None
+
+    with metricas.medir('render_duracao_segundos', tipo=tipo, formato='json'):
+        return RESPOSTAS_GRAFICOS[tipo](periodo, [dict(row) for row in dados])
+
+def _corpo_grafico(conn, tipo, periodo, chave):
+    """Corpo JSON do período: do cache ou montado e guardado (None se não houver dados)"""
+    corpo = cache_graficos.obter(chave)
+    if corpo is None:
+        dados = _montar_graficos(conn, tipo, periodo)
+        if dados is None:
+            return None
+        corpo = current_app.json.dumps(dados).encode()
+        cache_graficos.guardar(chave, corpo)
+    return corpo
+
+def aquecer_grafico(conn, tipo, periodo):
+    """
+    Garante no cache o JSON de gráficos da versão atual do período, para que
+    a primeira leitura já seja servida do cache. Usado pelo agendador;
+    precisa de um contexto de aplicação. Devolve False se não houver dados.
+    """
+    with conn.cursor() as cursor:
+        versao = cache_graficos.versao_periodo(cursor, tipo, periodo)
+    corpo = _corpo_grafico(conn, tipo, periodo, cache_graficos.chave_grafico(tipo, periodo, versao))
+    conn.rollback()
+    return corpo is not None
+
+def _resposta_grafico(tipo, periodo, erro_sem_dados, erro_geracao):
+    """
+    Responde com o JSON de gráficos do período, servindo do cache quando a
+    versão dos dados do período não mudou desde a última montagem.
+    """
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            # A versão é lida antes dos dados: o que for montado é no mínimo
+            # tão novo quanto ela
+            with conn.cursor() as cursor:
+                versao = cache_graficos.versao_periodo(cursor, tipo, periodo)
+            chave = cache_graficos.chave_grafico(tipo, periodo, versao)
+
+            # A mesma versão também serve de ETag: quem já tem o gráfico
+            # recebe 304 sem nem consultar o cache
+            etag = f"{VERSAO_FORMATO}-{versao}"
+            if request.if_none_match.contains(etag):
+                resposta = Response(status=304)
+            else:
+                corpo = _corpo_grafico(conn, tipo, periodo, chave)
+                if corpo is None:
+                    return jsonify({"success": False, "erro": erro_sem_dados}), 404
+                resposta = Response(corpo, mimetype='application/json')
 
-        conn.close()
-        return jsonify({
-            "success": True,
-            "mensagem": f"Resumos mensais gerados para {inicio_mes.strftime('%B %Y')}",
-            "periodo": {
-                "data_inicio": inicio_mes.isoformat(),
-                "data_fim": fim_mes.isoformat()
-            },
-            "dados_encontrados": total_semanais,
-            "resumos_gerados": total_inserido
-        }), 201
+            resposta.set_etag(etag)
+            resposta.cache_control.no_cache = True
+            return resposta
 
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar resumos mensais: {str(e)}"}), 500
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"{erro_geracao}: {str(e)}"}), 500
 
 # ROTAS PARA GRÁFICOS EM JSON
 @resumos_bp.route('/graficos/diarios/<data>', methods=['GET'])
@@ -316,377 +630,254 @@ def grafico_diarios(data):
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT * FROM resumodiario 
-                WHERE data = %s 
-                ORDER BY idagente
-            """, (data_selecionada,))
-            dados = cursor.fetchall()
-
-        if not dados:
-            return jsonify({"success": False, "erro": "Nenhum dado encontrado para esta data"}), 404
-
-        # Converter para lista de dicionários
-        dados_list = [dict(row) for row in dados]
-
-        # Gráfico 1: Comparação entre agentes (métricas principais)
-        fig1 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
-            title=f'Comparação de Agentes - {data_selecionada}',
-            labels={'value': 'Quantidade', 'variable': 'Métrica', 'idagente': 'Agente'},
-            barmode='group'
-        )
-
-        # Gráfico 2: Criaduros encontrados vs eliminados
-        fig2 = go.Figure()
-        for agente in dados_list:
-            fig2.add_trace(go.Bar(
-                name=f'Agente {agente["idagente"]}',
-                x=['Encontrados', 'Eliminados'],
-                y=[agente['total_criaduros_encontrados'], agente['total_criaduros_eliminados']],
-                text=[agente['total_criaduros_encontrados'], agente['total_criaduros_eliminados']],
-                textposition='auto'
-            ))
-        fig2.update_layout(title=f'Criaduros - {data_selecionada}', barmode='group')
-
-        # Gráfico 3: Larvas encontradas vs coletadas
-        fig3 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_larvas_encontradas', 'total_larvas_coletadas'],
-            title=f'Larvas - {data_selecionada}',
-            labels={'value': 'Quantidade', 'variable': 'Tipo'},
-            barmode='group'
-        )
-
-        # Converter gráficos para JSON
-        graficos_json = {
-            "comparacao_agentes": json.loads(pio.to_json(fig1)),
-            "criaduros": json.loads(pio.to_json(fig2)),
-            "larvas": json.loads(pio.to_json(fig3)),
-            "dados": dados_list
-        }
-
-        conn.close()
-        return jsonify({
-            "success": True,
-            "data": data_selecionada.isoformat(),
-            "graficos": graficos_json
-        }), 200
-
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar gráficos: {str(e)}"}), 500
+    return _resposta_grafico('diario', data_selecionada,
+                             "Nenhum dado encontrado para esta data", "Erro ao gerar gráficos")
 
 @resumos_bp.route('/graficos/semanais/<data_inicio>', methods=['GET'])
 def grafico_semanais(data_inicio):
     """Gera gráficos para resumos semanais"""
     try:
         inicio_semana = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-        fim_semana = inicio_semana + timedelta(days=6)
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT * FROM resumosemanal 
-                WHERE data_inicio = %s 
-                ORDER BY idagente
-            """, (inicio_semana,))
-            dados = cursor.fetchall()
-
-        if not dados:
-            return jsonify({"success": False, "erro": "Nenhum dado encontrado para esta semana"}), 404
-
-        dados_list = [dict(row) for row in dados]
-
-        # Gráfico 1: Métricas principais da semana
-        fig1 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
-            title=f'Resumo Semanal - {inicio_semana} a {fim_semana}',
-            labels={'value': 'Quantidade', 'variable': 'Métrica'},
-            barmode='group'
-        )
-
-        # Gráfico 2: Eficiência na eliminação de criaduros
-        eficiencia_data = []
-        for agente in dados_list:
-            if agente['total_criaduros_encontrados'] > 0:
-                eficiencia = (agente['total_criaduros_eliminados'] / agente['total_criaduros_encontrados']) * 100
-            else:
-                eficiencia = 0
-            eficiencia_data.append({
-                'idagente': agente['idagente'],
-                'eficiencia': round(eficiencia, 2)
-            })
-
-        fig2 = px.bar(
-            eficiencia_data,
-            x='idagente',
-            y='eficiencia',
-            title='Eficiência na Eliminação de Criaduros (%)',
-            labels={'eficiencia': 'Eficiência (%)', 'idagente': 'Agente'}
-        )
-
-        # Gráfico 3: Pizza - Distribuição de atividades
-        totais = {
-            'Domicílios Visitados': sum([d['total_domicilios_visitados'] for d in dados_list]),
-            'Pontos Críticos': sum([d['total_pontos_criticos'] for d in dados_list]),
-            'Casos Suspeitos': sum([d['total_casos_suspeitos'] for d in dados_list])
-        }
-
-        fig3 = px.pie(
-            values=list(totais.values()),
-            names=list(totais.keys()),
-            title='Distribuição de Atividades da Semana'
-        )
-
-        graficos_json = {
-            "metricas_principais": json.loads(pio.to_json(fig1)),
-            "eficiencia_criaduros": json.loads(pio.to_json(fig2)),
-            "distribuicao_atividades": json.loads(pio.to_json(fig3)),
-            "dados": dados_list,
-            "periodo": {
-                "inicio": inicio_semana.isoformat(),
-                "fim": fim_semana.isoformat()
-            }
-        }
-
-        conn.close()
-        return jsonify({
-            "success": True,
-            "graficos": graficos_json
-        }), 200
-
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar gráficos semanais: {str(e)}"}), 500
+    return _resposta_grafico('semanal', inicio_semana,
+                             "Nenhum dado encontrado para esta semana", "Erro ao gerar gráficos semanais")
 
 @resumos_bp.route('/graficos/mensais/<data_inicio>', methods=['GET'])
 def grafico_mensais(data_inicio):
     """Gera gráficos para resumos mensais"""
     try:
         inicio_mes = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-        if inicio_mes.month == 12:
-            fim_mes = inicio_mes.replace(year=inicio_mes.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            fim_mes = inicio_mes.replace(month=inicio_mes.month + 1, day=1) - timedelta(days=1)
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("""
-                SELECT * FROM resumomensal 
-                WHERE data_inicio = %s 
-                ORDER BY idagente
-            """, (inicio_mes,))
-            dados = cursor.fetchall()
-
-        if not dados:
-            return jsonify({"success": False, "erro": "Nenhum dado encontrado para este mês"}), 404
-
-        dados_list = [dict(row) for row in dados]
-
-        # Gráfico 1: Comparação mensal entre agentes
-        fig1 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_domicilios_visitados_mes', 'total_pontos_criticos_mes', 'total_casos_suspeitos_mes'],
-            title=f'Resumo Mensal - {inicio_mes.strftime("%B %Y")}',
-            labels={'value': 'Quantidade', 'variable': 'Métrica'},
-            barmode='group'
-        )
-
-        # Gráfico 2: Evolução de larvas e adultos coletados
-        fig2 = go.Figure()
-        fig2.add_trace(go.Bar(name='Larvas Coletadas', 
-                             x=[d['idagente'] for d in dados_list],
-                             y=[d['total_larvas_coletadas_mes'] for d in dados_list]))
-        fig2.add_trace(go.Bar(name='Adultos Coletados', 
-                             x=[d['idagente'] for d in dados_list],
-                             y=[d['total_adultos_coletados_mes'] for d in dados_list]))
-        fig2.update_layout(title='Coleta de Larvas e Adultos', barmode='group')
-
-        # Gráfico 3: Heatmap de produtividade
-        metricas = ['Domicílios', 'Pontos Críticos', 'Criaduros Elim', 'Larvas Colet', 'Adultos Colet']
-        valores = []
-        for agente in dados_list:
-            valores.append([
-                agente['total_domicilios_visitados_mes'],
-                agente['total_pontos_criticos_mes'],
-                agente['total_criaduros_eliminados_mes'],
-                agente['total_larvas_coletadas_mes'],
-                agente['total_adultos_coletados_mes']
-            ])
-
-        fig3 = px.imshow(
-            valores,
-            x=metricas,
-            y=[f'Agente {d["idagente"]}' for d in dados_list],
-            title='Heatmap de Produtividade Mensal',
-            aspect="auto",
-            color_continuous_scale='Viridis'
-        )
-
-        graficos_json = {
-            "comparacao_mensal": json.loads(pio.to_json(fig1)),
-            "coleta_insetos": json.loads(pio.to_json(fig2)),
-            "heatmap_produtividade": json.loads(pio.to_json(fig3)),
-            "dados": dados_list,
-            "periodo": {
-                "inicio": inicio_mes.isoformat(),
-                "fim": fim_mes.isoformat(),
-                "mes_ano": inicio_mes.strftime("%Y-%m")
-            }
-        }
+    return _resposta_grafico('mensal', inicio_mes,
+                             "Nenhum dado encontrado para este mês", "Erro ao gerar gráficos mensais")
 
-        conn.close()
-        return jsonify({
-            "success": True,
-            "graficos": graficos_json
-        }), 200
+# ROTAS PARA GRÁFICOS EM IMAGEM
+# A exportação para PNG roda no pool de renderização (renderizacao.py), nunca
+# no worker web. /imagem, /zip e /exportar esperam o resultado e devolvem o
+# arquivo. Para não prender o worker, /imagem e /zip aceitam o cabeçalho
+# `Prefer: respond-async` (ou ?assincrono=1) e então criam um job como
+# POST /graficos/jobs, respondendo 202.
+def _ler_resumos_diarios(conn, data_selecionada):
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("SELECT * FROM resumodiario WHERE data = %s ORDER BY idagente", (data_selecionada,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def _pede_assincrono():
+    """O cliente pediu a resposta assíncrona (RFC 7240) em /imagem ou /zip"""
+    if request.args.get('assincrono') in ('1', 'true'):
+        return True
+    preferencias = request.headers.get('Prefer', '')
+    return any(p.split(';')[0].strip().lower() == 'respond-async' for p in preferencias.split(','))
+
+def _ler_dia(data_selecionada, erro_geracao):
+    """(linhas do resumo do dia, None) ou (None, resposta de erro)"""
+    with connection() as conn:
+        if not conn:
+            return None, (jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500)
+
+        try:
+            dados_list = _ler_resumos_diarios(conn, data_selecionada)
+        except Exception as e:
+            return None, (jsonify({"success": False, "erro": f"{erro_geracao}: {str(e)}"}), 500)
+
+    if not dados_list:
+        return None, (jsonify({"success": False, "erro": "Nenhum dado encontrado para esta data"}), 404)
+    return dados_list, None
+
+def _criar_job(tipo, data_selecionada, erro_geracao, cabecalhos=None):
+    """Enfileira a renderização do dia e responde 202 com o id e as URLs do job."""
+    dados_list, erro = _ler_dia(data_selecionada, erro_geracao)
+    if erro:
+        return erro
 
+    try:
+        job_id = renderizacao.submeter_job(tipo, data_selecionada, dados_list)
     except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar gráficos mensais: {str(e)}"}), 500
+        return jsonify({"success": False, "erro": f"{erro_geracao}: {str(e)}"}), 500
+
+    status_url = url_for('resumos.status_job_grafico', job_id=job_id)
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "pendente",
+        "status_url": status_url,
+        "arquivo_url": url_for('resumos.arquivo_job_grafico', job_id=job_id)
+    }), 202, {"Location": status_url, "Retry-After": "1", **(cabecalhos or {})}
 
-# ROTAS PARA GRÁFICOS EM IMAGEM
 @resumos_bp.route('/graficos/diarios/<data>/imagem', methods=['GET'])
 def grafico_diarios_imagem(data):
-    """Gera e retorna imagem PNG dos gráficos diários"""
+    """
+    Gera e retorna imagem PNG dos gráficos diários. Com `Prefer:
+    respond-async` ou ?assincrono=1 cria um job e responde 202; o PNG fica
+    em `arquivo_url` quando o job em `status_url` estiver concluído.
+    """
     try:
         data_selecionada = datetime.strptime(data, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
-
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT * FROM resumodiario WHERE data = %s ORDER BY idagente", (data_selecionada,))
-            dados = cursor.fetchall()
-
-        if not dados:
-            return jsonify({"success": False, "erro": "Nenhum dado encontrado para esta data"}), 404
-
-        dados_list = [dict(row) for row in dados]
-
-        # Gráfico principal: Comparação entre agentes
-        fig = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
-            title=f'Comparação de Agentes - {data_selecionada}',
-            labels={'value': 'Quantidade', 'variable': 'Métrica'},
-            barmode='group'
-        )
+    if _pede_assincrono():
+        return _criar_job('imagem', data_selecionada, "Erro ao gerar imagem",
+                          {"Preference-Applied": "respond-async"})
 
-        # Converter para imagem PNG
-        img_bytes = pio.to_image(fig, format='png', width=1200, height=700)
+    dados_list, erro = _ler_dia(data_selecionada, "Erro ao gerar imagem")
+    if erro:
+        return erro
 
-        conn.close()
-        
-        # Retornar a imagem
+    try:
+        img_bytes = renderizacao.renderizar('imagem', data_selecionada, dados_list)
         return Response(img_bytes, mimetype='image/png')
-
     except Exception as e:
-        conn.close()
         return jsonify({"success": False, "erro": f"Erro ao gerar imagem: {str(e)}"}), 500
 
 @resumos_bp.route('/graficos/diarios/<data>/zip', methods=['GET'])
 def grafico_diarios_zip(data):
-    """Gera ZIP com todos os gráficos do dia em PNG"""
+    """Gera ZIP com todos os gráficos do dia em PNG (assíncrono como em /imagem)"""
     try:
         data_selecionada = datetime.strptime(data, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+    if _pede_assincrono():
+        return _criar_job('zip', data_selecionada, "Erro ao gerar ZIP",
+                          {"Preference-Applied": "respond-async"})
+
+    dados_list, erro = _ler_dia(data_selecionada, "Erro ao gerar ZIP")
+    if erro:
+        return erro
+
+    # O ZIP é enviado à medida que as imagens ficam prontas
+    return Response(
+        renderizacao.exportar_zip('diario', [(data_selecionada, dados_list)]),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment;filename=graficos_{data}.zip'}
+    )
+
+# Tabela e coluna de início do período de cada nível da exportação
+NIVEIS_EXPORTACAO = {
+    'diario': ('resumodiario', 'data'),
+    'semanal': (TABELA_SEMANAL, 'data_inicio'),
+    'mensal': (TABELA_MENSAL, 'data_inicio'),
+}
+EXPORTACAO_MAX_PERIODOS = 400
+
+@resumos_bp.route('/graficos/exportar', methods=['GET'])
+def exportar_graficos():
+    """
+    Exporta em um único ZIP os gráficos PNG de todos os períodos entre
+    ?inicio= e ?fim= (YYYY-MM-DD, inclusivos) do nível ?nivel=diario|semanal|mensal
+    (padrão diario). Os períodos são renderizados em paralelo no pool de
+    renderização e o ZIP é enviado entrada por entrada.
+    """
+    nivel = request.args.get('nivel', 'diario')
+    if nivel not in NIVEIS_EXPORTACAO:
+        return jsonify({"success": False, "erro": "Nível inválido. Use diario, semanal ou mensal"}), 400
 
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT * FROM resumodiario WHERE data = %s ORDER BY idagente", (data_selecionada,))
-            dados = cursor.fetchall()
-
-        if not dados:
-            return jsonify({"success": False, "erro": "Nenhum dado encontrado para esta data"}), 404
-
-        dados_list = [dict(row) for row in dados]
-
-        # Criar múltiplos gráficos
-        fig1 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_domicilios_visitados', 'total_pontos_criticos', 'total_casos_suspeitos'],
-            title=f'Comparação de Agentes - {data_selecionada}',
-            barmode='group'
-        )
+        inicio = datetime.strptime(request.args.get('inicio', ''), '%Y-%m-%d').date()
+        fim = datetime.strptime(request.args.get('fim', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"success": False, "erro": "Informe 'inicio' e 'fim' no formato YYYY-MM-DD"}), 400
 
-        fig2 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_criaduros_encontrados', 'total_criaduros_eliminados'],
-            title=f'Criaduros - {data_selecionada}',
-            barmode='group'
-        )
+    if inicio > fim:
+        return jsonify({"success": False, "erro": "'inicio' deve ser anterior ou igual a 'fim'"}), 400
+    if nivel == 'diario' and (fim - inicio).days >= EXPORTACAO_MAX_PERIODOS:
+        return jsonify({
+            "success": False,
+            "erro": f"Intervalo muito grande: no máximo {EXPORTACAO_MAX_PERIODOS} períodos por exportação"
+        }), 400
+
+    tabela, coluna = NIVEIS_EXPORTACAO[nivel]
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(f"""
+                    SELECT * FROM {tabela}
+                    WHERE {coluna} BETWEEN %s AND %s
+                    ORDER BY {coluna}, idagente
+                """, (inicio, fim))
+                linhas = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao exportar gráficos: {str(e)}"}), 500
+
+    # A conexão já foi devolvida: o envio do ZIP não prende o pool do banco
+    periodos = [(periodo, [dict(row) for row in grupo])
+                for periodo, grupo in groupby(linhas, key=lambda row: row[coluna])]
+
+    if not periodos:
+        return jsonify({"success": False, "erro": "Nenhum dado encontrado no período"}), 404
+    if len(periodos) > EXPORTACAO_MAX_PERIODOS:
+        return jsonify({
+            "success": False,
+            "erro": f"Intervalo muito grande: no máximo {EXPORTACAO_MAX_PERIODOS} períodos por exportação"
+        }), 400
+
+    return Response(
+        renderizacao.exportar_zip(nivel, periodos),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment;filename=graficos_{nivel}_{inicio}_{fim}.zip'}
+    )
+
+# JOBS DE RENDERIZAÇÃO (assíncronos)
+@resumos_bp.route('/graficos/jobs', methods=['POST'])
+def criar_job_grafico():
+    """
+    Enfileira a renderização de um gráfico diário e responde 202 com o id do
+    job. Corpo: {"tipo": "imagem" | "zip", "data": "YYYY-MM-DD"}.
+    """
+    dados = request.get_json()
+
+    if not dados or 'data' not in dados or dados.get('tipo') not in renderizacao.TIPOS_JOB:
+        return jsonify({"success": False, "erro": "Informe 'data' e 'tipo' ('imagem' ou 'zip')"}), 400
 
-        fig3 = px.bar(
-            dados_list,
-            x='idagente',
-            y=['total_larvas_encontradas', 'total_larvas_coletadas'],
-            title=f'Larvas - {data_selecionada}',
-            barmode='group'
-        )
+    try:
+        data_selecionada = datetime.strptime(dados['data'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-        # Converter para imagens PNG
-        img1_bytes = pio.to_image(fig1, format='png', width=1200, height=700)
-        img2_bytes = pio.to_image(fig2, format='png', width=1200, height=700)
-        img3_bytes = pio.to_image(fig3, format='png', width=1200, height=700)
-
-        conn.close()
-        
-        # Criar ZIP com as imagens
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-            zip_file.writestr(f'comparacao_agentes_{data}.png', img1_bytes)
-            zip_file.writestr(f'criaduros_{data}.png', img2_bytes)
-            zip_file.writestr(f'larvas_{data}.png', img3_bytes)
-        
-        zip_buffer.seek(0)
-        
-        return Response(
-            zip_buffer.getvalue(),
-            mimetype='application/zip',
-            headers={'Content-Disposition': f'attachment;filename=graficos_{data}.zip'}
-        )
+    return _criar_job(dados['tipo'], data_selecionada, "Erro ao criar job")
 
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao gerar ZIP: {str(e)}"}), 500
+@resumos_bp.route('/graficos/jobs/<job_id>', methods=['GET'])
+def status_job_grafico(job_id):
+    """Estado do job. Com ?aguardar=N (até 30s) espera o job terminar (long-poll)."""
+    try:
+        aguardar = renderizacao.ler_aguardar(request.args.get('aguardar', 0))
+    except ValueError:
+        return jsonify({"success": False, "erro": "Parâmetro 'aguardar' inválido"}), 400
+
+    status = renderizacao.aguardar_job(job_id, aguardar) if aguardar else renderizacao.status_job(job_id)
+    if status is None:
+        return jsonify({"success": False, "erro": "Job não encontrado"}), 404
+    return jsonify({"success": True, "data": status}), 200
+
+@resumos_bp.route('/graficos/jobs/<job_id>/arquivo', methods=['GET'])
+def arquivo_job_grafico(job_id):
+    """Baixa o PNG/ZIP de um job concluído"""
+    status = renderizacao.status_job(job_id)
+    if status is None:
+        return jsonify({"success": False, "erro": "Job não encontrado"}), 404
+    if status['status'] != 'concluido':
+        return jsonify({"success": False, "erro": f"Job ainda não concluído (status: {status['status']})",
+                        "data": status}), 409
+
+    # O job pode expirar (RENDER_JOBS_TTL) entre a leitura do status e o envio
+    try:
+        return send_file(
+            renderizacao.caminho_artefato(job_id),
+            mimetype=status['mimetype'],
+            as_attachment=True,
+            download_name=status['arquivo']
+        )
+    except FileNotFoundError:
+        return jsonify({"success": False, "erro": "Arquivo do job expirou; crie um novo job"}), 410
 
 # Rota auxiliar para verificar disponibilidade de dados
 @resumos_bp.route('/verificar-disponibilidade', methods=['POST'])
@@ -701,64 +892,60 @@ def verificar_disponibilidade():
     except ValueError:
         return jsonify({"success": False, "erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
 
-    conn = get_connection()
-    if not conn:
-        return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
 
-    try:
-        with conn.cursor() as cursor:
-            if data['tipo'] == 'semanal':
-                inicio_semana = data_referencia - timedelta(days=data_referencia.weekday())
-                fim_semana = inicio_semana + timedelta(days=6)
+        try:
+            with conn.cursor() as cursor:
+                if data['tipo'] == 'semanal':
+                    inicio_semana = data_referencia - timedelta(days=data_referencia.weekday())
+                    fim_semana = inicio_semana + timedelta(days=6)
                 
-                cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data BETWEEN %s AND %s", 
-                             (inicio_semana, fim_semana))
-                total_diarios = cursor.fetchone()[0]
+                    cursor.execute("SELECT COUNT(*) as total FROM resumodiario WHERE data BETWEEN %s AND %s", 
+                                 (inicio_semana, fim_semana))
+                    total_diarios = cursor.fetchone()[0]
                 
-                cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio = %s", (inicio_semana,))
-                total_semanal = cursor.fetchone()[0]
+                    cursor.execute(f"SELECT COUNT(*) as total FROM {TABELA_SEMANAL} WHERE data_inicio = %s", (inicio_semana,))
+                    total_semanal = cursor.fetchone()[0]
                 
-                conn.close()
-                return jsonify({
-                    "success": True,
-                    "disponivel": total_diarios > 0,
-                    "periodo": {
-                        "data_inicio": inicio_semana.isoformat(),
-                        "data_fim": fim_semana.isoformat()
-                    },
-                    "dados_diarios": total_diarios,
-                    "resumo_existente": total_semanal > 0
-                }), 200
+                    return jsonify({
+                        "success": True,
+                        "disponivel": total_diarios > 0,
+                        "periodo": {
+                            "data_inicio": inicio_semana.isoformat(),
+                            "data_fim": fim_semana.isoformat()
+                        },
+                        "dados_diarios": total_diarios,
+                        "resumo_existente": total_semanal > 0
+                    }), 200
                 
-            elif data['tipo'] == 'mensal':
-                inicio_mes = data_referencia.replace(day=1)
-                if data_referencia.month == 12:
-                    fim_mes = data_referencia.replace(year=data_referencia.year + 1, month=1, day=1) - timedelta(days=1)
-                else:
-                    fim_mes = data_referencia.replace(month=data_referencia.month + 1, day=1) - timedelta(days=1)
+                elif data['tipo'] == 'mensal':
+                    inicio_mes = data_referencia.replace(day=1)
+                    if data_referencia.month == 12:
+                        fim_mes = data_referencia.replace(year=data_referencia.year + 1, month=1, day=1) - timedelta(days=1)
+                    else:
+                        fim_mes = data_referencia.replace(month=data_referencia.month + 1, day=1) - timedelta(days=1)
                 
-                cursor.execute("SELECT COUNT(*) as total FROM resumosemanal WHERE data_inicio BETWEEN %s AND %s", 
-                             (inicio_mes, fim_mes))
-                total_semanais = cursor.fetchone()[0]
+                    cursor.execute(f"SELECT COUNT(*) as total FROM {TABELA_SEMANAL} WHERE data_inicio BETWEEN %s AND %s",
+                                 (inicio_mes, fim_mes))
+                    total_semanais = cursor.fetchone()[0]
                 
-                cursor.execute("SELECT COUNT(*) as total FROM resumomensal WHERE data_inicio = %s", (inicio_mes,))
-                total_mensal = cursor.fetchone()[0]
+                    cursor.execute(f"SELECT COUNT(*) as total FROM {TABELA_MENSAL} WHERE data_inicio = %s", (inicio_mes,))
+                    total_mensal = cursor.fetchone()[0]
                 
-                conn.close()
-                return jsonify({
-                    "success": True,
-                    "disponivel": total_semanais > 0,
-                    "periodo": {
-                        "data_inicio": inicio_mes.isoformat(),
-                        "data_fim": fim_mes.isoformat()
-                    },
-                    "dados_semanais": total_semanais,
-                    "resumo_existente": total_mensal > 0
-                }), 200
-            else:
-                conn.close()
-                return jsonify({"success": False, "erro": "Tipo inválido. Use 'semanal' ou 'mensal'"}), 400
+                    return jsonify({
+                        "success": True,
+                        "disponivel": total_semanais > 0,
+                        "periodo": {
+                            "data_inicio": inicio_mes.isoformat(),
+                            "data_fim": fim_mes.isoformat()
+                        },
+                        "dados_semanais": total_semanais,
+                        "resumo_existente": total_mensal > 0
+                    }), 200
+                else:
+                    return jsonify({"success": False, "erro": "Tipo inválido. Use 'semanal' ou 'mensal'"}), 400
 
-    except Exception as e:
-        conn.close()
-        return jsonify({"success": False, "erro": f"Erro ao verificar disponibilidade: {str(e)}"}), 500
\ No newline at end of file
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao verificar disponibilidade: {str(e)}"}), 500
\ No newline at end of file
@@ -0,0 +1,110 @@
+from flask import Blueprint, request, jsonify
+from database import connection
+from psycopg2.extras import RealDictCursor
+from datetime import datetime
+import base64
+import json
+
+sincronizacao_bp = Blueprint('sincronizacao', __name__)
+
+LIMITE_PADRAO = 500
+LIMITE_MAXIMO = 1000
+
+# Posição inicial: antes de qualquer linha
+POSICAO_INICIAL = {"f": [0, 0], "r": [0, "0001-01-01", 0]}
+
+
+def _codificar_cursor(posicao):
+    bruto = json.dumps(posicao, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        posicao = json.loads(bruto)
+        xid_f, id_f = posicao["f"]
+        xid_r, data_r, agente_r = posicao["r"]
+        datetime.strptime(data_r, '%Y-%m-%d')
+        return {"f": [int(xid_f), int(id_f)], "r": [int(xid_r), data_r, int(agente_r)]}
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+@sincronizacao_bp.route("/alteracoes", methods=["GET"])
+def listar_alteracoes():
+    """
+    Feed de alterações para clientes offline: devolve formulários e resumos
+    diários inseridos ou atualizados desde o `cursor` recebido (sem cursor,
+    tudo). O cliente guarda o `cursor` da resposta e repete a chamada
+    enquanto `mais` for true. Exclusões não aparecem no feed.
+
+    Só entram linhas de transações já encerradas (sync_xid abaixo do xmin do
+    snapshot), então uma alteração confirmada depois da leitura nunca fica
+    para trás do cursor. Ver sql/002_sincronizacao.sql.
+    """
+    erros_campo = {}
+    try:
+        limite = int(request.args.get("limite", LIMITE_PADRAO))
+        if not 1 <= limite <= LIMITE_MAXIMO:
+            raise ValueError
+    except ValueError:
+        erros_campo["limite"] = f"Use um inteiro entre 1 e {LIMITE_MAXIMO}"
+
+    posicao = POSICAO_INICIAL
+    if request.args.get("cursor"):
+        try:
+            posicao = _decodificar_cursor(request.args["cursor"])
+        except ValueError as e:
+            erros_campo["cursor"] = str(e)
+
+    if erros_campo:
+        return jsonify({"success": False, "errors": erros_campo}), 400
+
+    with connection() as conn:
+        if not conn:
+            return jsonify({"success": False, "erro": "Erro ao conectar ao banco"}), 500
+
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS horizonte")
+                horizonte = cursor.fetchone()["horizonte"]
+
+                cursor.execute("""
+                    SELECT f.*, f.sync_xid::text::bigint AS sync_xid, ag.matricula AS agente_matricula
+                    FROM formularioporcasa f
+                    JOIN agente ag ON f.idagente = ag.idagente
+                    WHERE f.sync_xid < %s::xid8
+                      AND (f.sync_xid, f.idboletimdiario) > (%s::text::xid8, %s)
+                    ORDER BY f.sync_xid, f.idboletimdiario
+                    LIMIT %s;
+                """, (horizonte, *posicao["f"], limite))
+                formularios = cursor.fetchall()
+
+                cursor.execute("""
+                    SELECT r.*, r.sync_xid::text::bigint AS sync_xid
+                    FROM resumodiario r
+                    WHERE r.sync_xid < %s::xid8
+                      AND (r.sync_xid, r.data, r.idagente) > (%s::text::xid8, %s::date, %s)
+                    ORDER BY r.sync_xid, r.data, r.idagente
+                    LIMIT %s;
+                """, (horizonte, *posicao["r"], limite))
+                resumos = cursor.fetchall()
+
+            nova_posicao = {"f": list(posicao["f"]), "r": list(posicao["r"])}
+            if formularios:
+                ultimo = formularios[-1]
+                nova_posicao["f"] = [ultimo["sync_xid"], ultimo["idboletimdiario"]]
+            if resumos:
+                ultimo = resumos[-1]
+                nova_posicao["r"] = [ultimo["sync_xid"], ultimo["data"].isoformat(), ultimo["idagente"]]
+
+            return jsonify({
+                "success": True,
+                "formularios": formularios,
+                "resumos_diarios": resumos,
+                "cursor": _codificar_cursor(nova_posicao),
+                "mais": len(formularios) == limite or len(resumos) == limite
+            }), 200
+        except Exception as e:
+            return jsonify({"success": False, "erro": f"Erro ao buscar alterações: {str(e)}"}), 500
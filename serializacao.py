@@ -0,0 +1,71 @@
+"""
+Provedor JSON da aplicação (app.json).
+
+Serializa com orjson quando instalado, que já entende date, time e datetime
+(ISO 8601) e escreve bytes direto, sem passar por str. Sem orjson cai no
+json da biblioteca padrão com o mesmo formato. Decimal vira string, como no
+provedor padrão do Flask.
+
+Vale para jsonify, para app.json.dumps nas rotas em streaming e para o
+cache de gráficos, então as linhas do RealDictCursor podem ir direto para a
+resposta, sem conversões por linha. O modo assíncrono (asgi.py) usa
+para_json diretamente, com o mesmo resultado.
+"""
+import json
+from datetime import date, time
+from decimal import Decimal
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+
+def _padrao(valor):
+    """Tipos que nem o orjson nem o json padrão conhecem."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (date, time)):
+        # Só chega aqui no json padrão (date cobre também datetime)
+        return valor.isoformat()
+    if hasattr(valor, "__html__"):
+        return str(valor.__html__())
+    raise TypeError(f"Objeto do tipo {type(valor).__name__} não é serializável em JSON")
+
+
+def para_json(obj, indent=False):
+    """Serializa em bytes, com chaves ordenadas como o provedor padrão do Flask."""
+    if orjson is not None:
+        opcoes = orjson.OPT_SORT_KEYS
+        if indent:
+            opcoes |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_padrao, option=opcoes)
+    return json.dumps(
+        obj, default=_padrao, sort_keys=True, ensure_ascii=False,
+        indent=2 if indent else None, separators=None if indent else (",", ":"),
+    ).encode()
+
+
+class ProvedorJSON(JSONProvider):
+    """Provedor JSON rápido, com chaves ordenadas como o padrão do Flask."""
+
+    mimetype = "application/json"
+
+    def dumps_bytes(self, obj, indent=False):
+        return para_json(obj, indent)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=bool(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=self._app.debug) + b"\n", mimetype=self.mimetype
+        )
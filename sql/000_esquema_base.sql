@@ -0,0 +1,95 @@
+-- Tabelas base do EntomoTrack, como as rotas as usam. Em bancos criados
+-- antes das migrações as tabelas já existem e nada é alterado.
+--
+-- Aplicado por `flask migrar` (migracoes.py), como os demais arquivos de sql/.
+CREATE TABLE IF NOT EXISTS usuario (
+    idusuario SERIAL PRIMARY KEY,
+    nome TEXT NOT NULL,
+    email TEXT NOT NULL,
+    senha TEXT NOT NULL,
+    funcao TEXT NOT NULL,
+    telefone TEXT
+);
+
+CREATE TABLE IF NOT EXISTS agente (
+    idagente SERIAL PRIMARY KEY,
+    quartelaria INTEGER,
+    matricula TEXT NOT NULL,
+    idusuario INTEGER REFERENCES usuario(idusuario) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS supervisor (
+    idsupervisor SERIAL PRIMARY KEY,
+    matricula TEXT NOT NULL,
+    idusuario INTEGER REFERENCES usuario(idusuario) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS formularioporcasa (
+    idboletimdiario SERIAL PRIMARY KEY,
+    data DATE NOT NULL,
+    bairro TEXT,
+    endereco TEXT,
+    tipo_inseto TEXT,
+    hora_inicio TIME,
+    hora_saida TIME,
+    num_pontos_criticos INTEGER DEFAULT 0,
+    total_criaduros_encontrados INTEGER DEFAULT 0,
+    criaduros_eliminados INTEGER DEFAULT 0,
+    tipos_criaduros TEXT,
+    num_locos_larva INTEGER DEFAULT 0,
+    num_locos_positivos INTEGER DEFAULT 0,
+    num_adultos_encontrados INTEGER DEFAULT 0,
+    num_adultos_coletados INTEGER DEFAULT 0,
+    acaorealizada TEXT,
+    inseticida_usado TEXT,
+    quantidade_inseticida TEXT,
+    casos_suspeitos INTEGER DEFAULT 0,
+    nome_pessoa TEXT,
+    telefone_pessoa TEXT,
+    observacoes TEXT,
+    idagente INTEGER NOT NULL REFERENCES agente(idagente)
+);
+
+CREATE TABLE IF NOT EXISTS resumodiario (
+    idresumodiario SERIAL PRIMARY KEY,
+    data DATE NOT NULL,
+    idagente INTEGER NOT NULL REFERENCES agente(idagente),
+    total_domicilios_visitados INTEGER DEFAULT 0,
+    total_pontos_criticos INTEGER DEFAULT 0,
+    total_criaduros_encontrados INTEGER DEFAULT 0,
+    total_criaduros_eliminados INTEGER DEFAULT 0,
+    total_larvas_encontradas INTEGER DEFAULT 0,
+    total_larvas_coletadas INTEGER DEFAULT 0,
+    total_adultos_coletados INTEGER DEFAULT 0,
+    total_casos_suspeitos INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS resumosemanal (
+    idresumosemanal SERIAL PRIMARY KEY,
+    data_inicio DATE NOT NULL,
+    data_fim DATE NOT NULL,
+    idagente INTEGER NOT NULL,
+    total_domicilios_visitados INTEGER DEFAULT 0,
+    total_pontos_criticos INTEGER DEFAULT 0,
+    total_criaduros_encontrados INTEGER DEFAULT 0,
+    total_criaduros_eliminados INTEGER DEFAULT 0,
+    total_larvas_encontradas INTEGER DEFAULT 0,
+    total_larvas_coletadas INTEGER DEFAULT 0,
+    total_adultos_coletados INTEGER DEFAULT 0,
+    total_casos_suspeitos INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS resumomensal (
+    idresumomensal SERIAL PRIMARY KEY,
+    data_inicio DATE NOT NULL,
+    data_fim DATE NOT NULL,
+    idagente INTEGER NOT NULL,
+    total_domicilios_visitados_mes INTEGER DEFAULT 0,
+    total_pontos_criticos_mes INTEGER DEFAULT 0,
+    total_criaduros_encontrados_mes INTEGER DEFAULT 0,
+    total_criaduros_eliminados_mes INTEGER DEFAULT 0,
+    total_larvas_encontradas_mes INTEGER DEFAULT 0,
+    total_larvas_coletadas_mes INTEGER DEFAULT 0,
+    total_adultos_coletados_mes INTEGER DEFAULT 0,
+    total_casos_suspeitos_mes INTEGER DEFAULT 0
+);
@@ -0,0 +1,23 @@
+-- Restrição única (data, idagente) em resumodiario, necessária para o
+-- upsert incremental feito por criar_formulario (ver agregacao.py).
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+-- Depois, se houver dúvida sobre os totais de algum dia, use
+-- POST /resumos/recalcular-diario para reconstruí-los a partir dos formulários.
+
+-- Remove linhas duplicadas deixadas pelo antigo fluxo de DELETE + INSERT
+DELETE FROM resumodiario a
+USING resumodiario b
+WHERE a.data = b.data
+  AND a.idagente = b.idagente
+  AND a.ctid < b.ctid;
+
+-- Bancos em que este arquivo já foi aplicado à mão já têm a restrição
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'resumodiario_data_idagente_key') THEN
+        ALTER TABLE resumodiario
+            ADD CONSTRAINT resumodiario_data_idagente_key UNIQUE (data, idagente);
+    END IF;
+END;
+$$;
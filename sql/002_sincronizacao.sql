@@ -0,0 +1,43 @@
+-- Suporte à sincronização incremental dos clientes de campo
+-- (GET /sync/alteracoes) e às chaves de idempotência de criar_formulario.
+--
+-- Cada linha de formularioporcasa e resumodiario guarda em sync_xid o id da
+-- transação que a gravou por último. O feed devolve apenas linhas de
+-- transações já encerradas (sync_xid abaixo do xmin do snapshot atual), o
+-- que garante que nenhuma alteração confirmada fora de ordem seja pulada.
+-- Requer PostgreSQL 13+ (xid8 / pg_current_xact_id).
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE OR REPLACE FUNCTION marcar_sync_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.sync_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE formularioporcasa
+    ADD COLUMN IF NOT EXISTS sync_xid xid8 NOT NULL DEFAULT '0'::xid8,
+    ADD COLUMN IF NOT EXISTS chave_idempotencia TEXT;
+ALTER TABLE resumodiario
+    ADD COLUMN IF NOT EXISTS sync_xid xid8 NOT NULL DEFAULT '0'::xid8;
+
+-- Linhas existentes ficam com sync_xid 0 e entram na primeira sincronização
+DROP TRIGGER IF EXISTS formularioporcasa_sync_xid ON formularioporcasa;
+CREATE TRIGGER formularioporcasa_sync_xid
+    BEFORE INSERT OR UPDATE ON formularioporcasa
+    FOR EACH ROW EXECUTE FUNCTION marcar_sync_xid();
+
+DROP TRIGGER IF EXISTS resumodiario_sync_xid ON resumodiario;
+CREATE TRIGGER resumodiario_sync_xid
+    BEFORE INSERT OR UPDATE ON resumodiario
+    FOR EACH ROW EXECUTE FUNCTION marcar_sync_xid();
+
+CREATE INDEX IF NOT EXISTS formularioporcasa_sync_xid_idx
+    ON formularioporcasa (sync_xid, idboletimdiario);
+CREATE INDEX IF NOT EXISTS resumodiario_sync_xid_idx
+    ON resumodiario (sync_xid, data, idagente);
+
+-- Envios repetidos com a mesma chave não criam formulários duplicados
+CREATE UNIQUE INDEX IF NOT EXISTS formularioporcasa_chave_idempotencia_key
+    ON formularioporcasa (chave_idempotencia);
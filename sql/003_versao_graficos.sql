@@ -0,0 +1,12 @@
+-- Versão dos dados de cada período, usada como parte da chave do cache de
+-- gráficos (cache_graficos.py). As rotas que gravam um período incrementam
+-- a versão na mesma transação.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE TABLE IF NOT EXISTS versao_graficos (
+    tipo TEXT NOT NULL,          -- 'diario', 'semanal' ou 'mensal'
+    periodo DATE NOT NULL,       -- data, início da semana ou início do mês
+    versao BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo, periodo)
+);
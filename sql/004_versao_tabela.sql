@@ -0,0 +1,40 @@
+-- Versão e horário da última alteração de cada tabela, usados como ETag e
+-- Last-Modified das listagens (cache_http.py). Um trigger por comando
+-- (não por linha) incrementa a versão a cada INSERT/UPDATE/DELETE/TRUNCATE,
+-- então a rota só precisa ler uma linha por tabela para saber se algo mudou.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE TABLE IF NOT EXISTS versao_tabela (
+    tabela TEXT PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 0,
+    alterado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION incrementar_versao_tabela() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO versao_tabela (tabela, versao, alterado_em)
+    VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+    ON CONFLICT (tabela) DO UPDATE
+        SET versao = versao_tabela.versao + 1, alterado_em = clock_timestamp();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    nome TEXT;
+BEGIN
+    FOREACH nome IN ARRAY ARRAY['usuario', 'agente', 'supervisor', 'formularioporcasa',
+                                'resumodiario', 'resumosemanal', 'resumomensal']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', nome || '_versao', nome);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION incrementar_versao_tabela()',
+            nome || '_versao', nome
+        );
+        INSERT INTO versao_tabela (tabela) VALUES (nome) ON CONFLICT (tabela) DO NOTHING;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,57 @@
+-- Resumos semanais e mensais como views materializadas, usadas quando a
+-- aplicação roda com RESUMOS_MODO=materializado (ver agregacao.py).
+--
+-- As views são calculadas a partir de resumodiario e atualizadas com
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY (POST /resumos/atualizar-materializados
+-- ou `flask atualizar-materializados`), que não bloqueia leituras nem deixa
+-- a view vazia durante a atualização. O CONCURRENTLY exige o índice único.
+--
+-- O id sintético segue a ordem (data_inicio, idagente) e pode mudar entre
+-- atualizações; use (data_inicio, idagente) como chave.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumosemanal_mv AS
+SELECT
+    (row_number() OVER (ORDER BY date_trunc('week', data), idagente))::integer AS idresumosemanal,
+    date_trunc('week', data)::date AS data_inicio,
+    date_trunc('week', data)::date + 6 AS data_fim,
+    idagente,
+    SUM(total_domicilios_visitados)::integer AS total_domicilios_visitados,
+    SUM(total_pontos_criticos)::integer AS total_pontos_criticos,
+    SUM(total_criaduros_encontrados)::integer AS total_criaduros_encontrados,
+    SUM(total_criaduros_eliminados)::integer AS total_criaduros_eliminados,
+    SUM(total_larvas_encontradas)::integer AS total_larvas_encontradas,
+    SUM(total_larvas_coletadas)::integer AS total_larvas_coletadas,
+    SUM(total_adultos_coletados)::integer AS total_adultos_coletados,
+    SUM(total_casos_suspeitos)::integer AS total_casos_suspeitos
+FROM resumodiario
+GROUP BY date_trunc('week', data), idagente;
+
+CREATE UNIQUE INDEX IF NOT EXISTS resumosemanal_mv_periodo_key
+    ON resumosemanal_mv (data_inicio, idagente);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS resumomensal_mv AS
+SELECT
+    (row_number() OVER (ORDER BY date_trunc('month', data), idagente))::integer AS idresumomensal,
+    date_trunc('month', data)::date AS data_inicio,
+    (date_trunc('month', data) + interval '1 month - 1 day')::date AS data_fim,
+    idagente,
+    SUM(total_domicilios_visitados)::integer AS total_domicilios_visitados_mes,
+    SUM(total_pontos_criticos)::integer AS total_pontos_criticos_mes,
+    SUM(total_criaduros_encontrados)::integer AS total_criaduros_encontrados_mes,
+    SUM(total_criaduros_eliminados)::integer AS total_criaduros_eliminados_mes,
+    SUM(total_larvas_encontradas)::integer AS total_larvas_encontradas_mes,
+    SUM(total_larvas_coletadas)::integer AS total_larvas_coletadas_mes,
+    SUM(total_adultos_coletados)::integer AS total_adultos_coletados_mes,
+    SUM(total_casos_suspeitos)::integer AS total_casos_suspeitos_mes
+FROM resumodiario
+GROUP BY date_trunc('month', data), idagente;
+
+CREATE UNIQUE INDEX IF NOT EXISTS resumomensal_mv_periodo_key
+    ON resumomensal_mv (data_inicio, idagente);
+
+-- REFRESH não dispara triggers: a versão (ETag) das views é incrementada
+-- pela própria aplicação ao atualizar
+INSERT INTO versao_tabela (tabela) VALUES ('resumosemanal_mv'), ('resumomensal_mv')
+ON CONFLICT (tabela) DO NOTHING;
@@ -0,0 +1,65 @@
+-- Registro dos (data, idagente) alterados em formularioporcasa desde o
+-- último processamento. A semana ISO e o mês de cada linha são derivados da
+-- data, então uma linha por dia/agente basta para saber quais resumos
+-- diários, semanais e mensais refazer (agregacao.processar_periodos_sujos).
+--
+-- Triggers por comando com tabelas de transição cobrem qualquer caminho de
+-- escrita (criar_formulario, /lote, edições e exclusões manuais) com um
+-- único INSERT por comando. `versao` muda a cada nova marcação, para que o
+-- processamento só remova a marca que ele mesmo leu.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE TABLE IF NOT EXISTS periodo_sujo (
+    data DATE NOT NULL,
+    idagente INTEGER NOT NULL,
+    versao BIGINT NOT NULL DEFAULT 1,
+    marcado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (data, idagente)
+);
+
+CREATE OR REPLACE FUNCTION marcar_periodos_sujos() RETURNS trigger AS $$
+BEGIN
+    -- Em ordem de (data, idagente), como o upsert de resumodiario, para
+    -- que comandos concorrentes travem as linhas na mesma ordem
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO periodo_sujo (data, idagente)
+        SELECT DISTINCT data, idagente FROM novos ORDER BY 1, 2
+        ON CONFLICT (data, idagente) DO UPDATE
+            SET versao = periodo_sujo.versao + 1, marcado_em = now();
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO periodo_sujo (data, idagente)
+        SELECT data, idagente FROM novos
+        UNION
+        SELECT data, idagente FROM antigos
+        ORDER BY 1, 2
+        ON CONFLICT (data, idagente) DO UPDATE
+            SET versao = periodo_sujo.versao + 1, marcado_em = now();
+    ELSE
+        INSERT INTO periodo_sujo (data, idagente)
+        SELECT DISTINCT data, idagente FROM antigos ORDER BY 1, 2
+        ON CONFLICT (data, idagente) DO UPDATE
+            SET versao = periodo_sujo.versao + 1, marcado_em = now();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tabelas de transição exigem um trigger por evento
+DROP TRIGGER IF EXISTS formularioporcasa_sujo_insert ON formularioporcasa;
+CREATE TRIGGER formularioporcasa_sujo_insert
+    AFTER INSERT ON formularioporcasa
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
+
+DROP TRIGGER IF EXISTS formularioporcasa_sujo_update ON formularioporcasa;
+CREATE TRIGGER formularioporcasa_sujo_update
+    AFTER UPDATE ON formularioporcasa
+    REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
+
+DROP TRIGGER IF EXISTS formularioporcasa_sujo_delete ON formularioporcasa;
+CREATE TRIGGER formularioporcasa_sujo_delete
+    AFTER DELETE ON formularioporcasa
+    REFERENCING OLD TABLE AS antigos
+    FOR EACH STATEMENT EXECUTE FUNCTION marcar_periodos_sujos();
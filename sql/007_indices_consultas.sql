@@ -0,0 +1,85 @@
+-- Índices para as consultas das rotas e da agregação, cada um com a
+-- consulta que ele atende. benchmarks/verificar_indices.py confere com
+-- EXPLAIN, em um banco com volume de produção, que elas usam estes índices.
+--
+-- Aplicado por `flask migrar` (migracoes.py). Os CREATE INDEX bloqueiam
+-- escritas na tabela enquanto o índice é construído (segundos com milhões
+-- de formulários): aplique fora do horário de envio dos agentes.
+--
+-- Já cobertos por migrações anteriores:
+--   resumodiario (data, idagente) único (001): WHERE data = / BETWEEN,
+--     ORDER BY data DESC e o upsert incremental;
+--   formularioporcasa (sync_xid, idboletimdiario) e
+--   resumodiario (sync_xid, data, idagente) (002): GET /sync/alteracoes.
+
+-- Usuário, agente e supervisor: as rotas recusam e-mail e matrícula
+-- repetidos com um SELECT antes do INSERT; a restrição fecha a corrida
+-- entre dois cadastros simultâneos. Duplicatas existentes precisam ser
+-- resolvidas à mão antes da migração.
+DO $$
+DECLARE
+    repetidos TEXT;
+BEGIN
+    SELECT string_agg(DISTINCT email, ', ') INTO repetidos
+    FROM (SELECT email FROM usuario GROUP BY email HAVING COUNT(*) > 1) d;
+    IF repetidos IS NOT NULL THEN
+        RAISE EXCEPTION 'usuario.email repetido: %', repetidos;
+    END IF;
+    SELECT string_agg(DISTINCT matricula, ', ') INTO repetidos
+    FROM (SELECT matricula FROM agente GROUP BY matricula HAVING COUNT(*) > 1) d;
+    IF repetidos IS NOT NULL THEN
+        RAISE EXCEPTION 'agente.matricula repetida: %', repetidos;
+    END IF;
+    SELECT string_agg(DISTINCT matricula, ', ') INTO repetidos
+    FROM (SELECT matricula FROM supervisor GROUP BY matricula HAVING COUNT(*) > 1) d;
+    IF repetidos IS NOT NULL THEN
+        RAISE EXCEPTION 'supervisor.matricula repetida: %', repetidos;
+    END IF;
+END;
+$$;
+
+-- SELECT 1 FROM usuario WHERE email = %s
+CREATE UNIQUE INDEX IF NOT EXISTS usuario_email_key ON usuario (email);
+-- SELECT 1 FROM agente WHERE matricula = %s
+CREATE UNIQUE INDEX IF NOT EXISTS agente_matricula_key ON agente (matricula);
+-- SELECT 1 FROM supervisor WHERE matricula = %s
+CREATE UNIQUE INDEX IF NOT EXISTS supervisor_matricula_key ON supervisor (matricula);
+
+-- DELETE FROM usuario (ON DELETE CASCADE procura o agente/supervisor do usuário)
+CREATE INDEX IF NOT EXISTS agente_idusuario_idx ON agente (idusuario);
+CREATE INDEX IF NOT EXISTS supervisor_idusuario_idx ON supervisor (idusuario);
+
+-- GET /formularios: ORDER BY data DESC, idboletimdiario DESC com o cursor
+-- WHERE (data, idboletimdiario) < (%s, %s) e LIMIT, lido de trás para frente
+CREATE INDEX IF NOT EXISTS formularioporcasa_data_id_idx
+    ON formularioporcasa (data, idboletimdiario);
+
+-- Recálculo do resumo de um dia/agente (agregacao.recalcular_resumo_diario,
+-- períodos sujos e POST /resumos/recalcular-diario):
+-- WHERE data = %s AND idagente = %s
+CREATE INDEX IF NOT EXISTS formularioporcasa_data_idagente_idx
+    ON formularioporcasa (data, idagente);
+
+-- Resumos semanais e mensais: uma linha por (data_inicio, idagente).
+-- Atende WHERE data_inicio = / BETWEEN e ORDER BY data_inicio DESC, e
+-- permite os upserts ON CONFLICT (data_inicio, idagente) da agregação e de
+-- gerar-semanais/gerar-mensais. Linhas repetidas deixadas pelo antigo
+-- "manter" de gerar-semanais/gerar-mensais são removidas; refaça os totais
+-- depois com `flask reprocessar-resumos` se houver dúvida.
+DELETE FROM resumosemanal a
+USING resumosemanal b
+WHERE a.data_inicio = b.data_inicio
+  AND a.idagente = b.idagente
+  AND a.ctid < b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS resumosemanal_periodo_key
+    ON resumosemanal (data_inicio, idagente);
+
+DELETE FROM resumomensal a
+USING resumomensal b
+WHERE a.data_inicio = b.data_inicio
+  AND a.idagente = b.idagente
+  AND a.ctid < b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS resumomensal_periodo_key
+    ON resumomensal (data_inicio, idagente);
@@ -0,0 +1,15 @@
+-- Chave de idempotência única por (chave_idempotencia, data) em vez de só
+-- pela chave. Em uma tabela particionada (particoes.py) todo índice único
+-- precisa conter a coluna de partição; com a mesma restrição nos dois modos,
+-- criar_formulario usa um único ON CONFLICT (chave_idempotencia, data).
+--
+-- Um reenvio traz o mesmo formulário, com a mesma data, e continua sendo
+-- reconhecido. O índice também atende a busca dos ids originais
+-- (WHERE chave_idempotencia = ANY(...) AND data = ANY(...)).
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE UNIQUE INDEX IF NOT EXISTS formularioporcasa_chave_idempotencia_data_key
+    ON formularioporcasa (chave_idempotencia, data);
+
+DROP INDEX IF EXISTS formularioporcasa_chave_idempotencia_key;
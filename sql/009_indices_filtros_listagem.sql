@@ -0,0 +1,23 @@
+-- Índices dos filtros de GET /formularios (FILTROS_LISTAGEM em
+-- routes/formularios.py). Com um filtro de igualdade e a ordem da
+-- listagem (data DESC, idboletimdiario DESC) no mesmo índice, a página
+-- sai na ordem, sem ordenar as visitas do bairro ou do agente inteiras.
+--
+-- Aplicado por `flask migrar` (migracoes.py). Como em 007, os CREATE
+-- INDEX bloqueiam escritas em formularioporcasa enquanto são construídos.
+--
+-- Já cobertos: data_inicio/data_fim e tipo_inseto sozinho usam
+-- (data, idboletimdiario) (007); matricula vira idagente pela subconsulta
+-- em agente_matricula_key (007).
+
+-- ?idagente= / ?matricula=, com ou sem intervalo de datas
+CREATE INDEX IF NOT EXISTS formularioporcasa_idagente_data_id_idx
+    ON formularioporcasa (idagente, data, idboletimdiario);
+
+-- ?bairro= ("meu bairro na última semana")
+CREATE INDEX IF NOT EXISTS formularioporcasa_bairro_data_id_idx
+    ON formularioporcasa (bairro, data, idboletimdiario);
+
+-- ?casos_suspeitos=true: poucas visitas têm casos, o índice parcial é pequeno
+CREATE INDEX IF NOT EXISTS formularioporcasa_casos_suspeitos_idx
+    ON formularioporcasa (data, idboletimdiario) WHERE casos_suspeitos > 0;
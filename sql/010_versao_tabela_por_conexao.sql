@@ -0,0 +1,59 @@
+-- Versões de tabela sem linha compartilhada entre escritores.
+--
+-- Em 004 cada INSERT/UPDATE/DELETE fazia upsert na linha da tabela em
+-- versao_tabela, que ficava travada até o commit: todos os envios de
+-- formulário do cluster esperavam uns pelos outros nessa linha.
+--
+-- Agora o trigger incrementa uma linha por (tabela, pid do backend) em
+-- versao_tabela_conexao. Um backend executa uma transação por vez, então
+-- nenhum escritor espera por outro. A versão de uma tabela é a soma de
+-- versao_tabela (base) com as linhas das conexões (SQL_VERSOES em
+-- cache_http.py). Continua transacional: quem lê a versão só vê o
+-- incremento junto com os dados que o causaram. Um contador fora de
+-- transação (nextval) apareceria antes do commit, e uma resposta ainda sem
+-- os dados poderia ficar guardada com o ETag novo.
+--
+-- As linhas de backends encerrados são somadas à base por
+-- consolidar_versoes() (chamada pelo líder do agendador), de modo que a
+-- tabela fica com cerca de uma linha por conexão viva e a soma nunca diminui.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE TABLE IF NOT EXISTS versao_tabela_conexao (
+    tabela TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    versao BIGINT NOT NULL DEFAULT 0,
+    alterado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (tabela, pid)
+);
+
+-- Também usada diretamente onde não há trigger (REFRESH, DETACH, cargas)
+CREATE OR REPLACE FUNCTION incrementar_versao(nome TEXT) RETURNS void AS $$
+    INSERT INTO versao_tabela_conexao (tabela, pid, versao, alterado_em)
+    VALUES (nome, pg_backend_pid(), 1, clock_timestamp())
+    ON CONFLICT (tabela, pid) DO UPDATE
+        SET versao = versao_tabela_conexao.versao + 1, alterado_em = clock_timestamp();
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION incrementar_versao_tabela() RETURNS trigger AS $$
+BEGIN
+    PERFORM incrementar_versao(TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consolidar_versoes() RETURNS integer AS $$
+    WITH encerradas AS (
+        DELETE FROM versao_tabela_conexao c
+        WHERE NOT EXISTS (SELECT 1 FROM pg_stat_activity a WHERE a.pid = c.pid)
+        RETURNING tabela, versao, alterado_em
+    ), somadas AS (
+        INSERT INTO versao_tabela (tabela, versao, alterado_em)
+        SELECT tabela, SUM(versao), MAX(alterado_em) FROM encerradas GROUP BY tabela
+        ON CONFLICT (tabela) DO UPDATE
+            SET versao = versao_tabela.versao + EXCLUDED.versao,
+                alterado_em = GREATEST(versao_tabela.alterado_em, EXCLUDED.alterado_em)
+        RETURNING 1
+    )
+    SELECT COUNT(*)::integer FROM encerradas;
+$$ LANGUAGE sql;
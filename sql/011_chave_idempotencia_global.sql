@@ -0,0 +1,47 @@
+-- Chave de idempotência única no banco todo de novo, não por data (008).
+--
+-- Com a unicidade por (chave_idempotencia, data), um reenvio com a data
+-- corrigida gravava um segundo formulário e somava o resumo duas vezes.
+-- Um índice único global em formularioporcasa não é possível com a tabela
+-- particionada (particoes.py), então as chaves ficam em uma tabela à parte,
+-- não particionada, preenchida no mesmo comando que insere os formulários
+-- (SQL_INSERIR_FORMULARIOS em routes/formularios.py): só entra o formulário
+-- cuja chave foi registrada por ele.
+--
+-- Apagar um formulário libera a chave (trigger abaixo), como acontecia
+-- com o índice único.
+--
+-- Aplicado por `flask migrar` (migracoes.py).
+
+CREATE TABLE IF NOT EXISTS chave_idempotencia (
+    chave TEXT PRIMARY KEY,
+    idboletimdiario INTEGER NOT NULL,
+    data DATE NOT NULL
+);
+
+-- Chaves já gravadas; repetidas em datas diferentes (possível desde 008)
+-- ficam com o primeiro formulário
+INSERT INTO chave_idempotencia (chave, idboletimdiario, data)
+SELECT chave_idempotencia, idboletimdiario, data
+FROM formularioporcasa
+WHERE chave_idempotencia IS NOT NULL
+ORDER BY idboletimdiario
+ON CONFLICT (chave) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION liberar_chaves_idempotencia() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM chave_idempotencia c
+    USING antigos a
+    WHERE c.chave = a.chave_idempotencia AND c.idboletimdiario = a.idboletimdiario;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS formularioporcasa_liberar_chaves ON formularioporcasa;
+CREATE TRIGGER formularioporcasa_liberar_chaves
+    AFTER DELETE ON formularioporcasa
+    REFERENCING OLD TABLE AS antigos
+    FOR EACH STATEMENT EXECUTE FUNCTION liberar_chaves_idempotencia();
+
+-- A unicidade agora é garantida por chave_idempotencia
+DROP INDEX IF EXISTS formularioporcasa_chave_idempotencia_data_key;
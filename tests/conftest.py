@@ -0,0 +1,79 @@
+"""
+Configuração comum dos testes (rodar com `python -m pytest` na raiz).
+
+Os testes que precisam de banco usam a fixture `criar_banco`, que cria um
+banco vazio por chamada e o apaga no fim da sessão. O servidor é um
+PostgreSQL descartável (benchmarks/banco_local.py) ou, com
+ENTOMOTRACK_PG_TESTE, um servidor existente (DSN de um banco de
+manutenção, ex. postgresql:///postgres?host=/tmp&port=5433&user=postgres,
+com permissão de CREATE DATABASE). Sem nenhum dos dois (PostgreSQL não
+instalado, ou rodando como root) esses testes são pulados.
+"""
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Os módulos da aplicação ficam na raiz do repositório, fora de um pacote,
+# e os auxiliares de banco em benchmarks/
+for caminho in (RAIZ, os.path.join(RAIZ, 'benchmarks')):
+    if caminho not in sys.path:
+        sys.path.insert(0, caminho)
+
+PG_TESTE = os.getenv('ENTOMOTRACK_PG_TESTE')
+
+
+@pytest.fixture(scope='session')
+def servidor_pg():
+    """DSN do banco de manutenção do servidor usado nos testes."""
+    psycopg2 = pytest.importorskip('psycopg2')
+    if PG_TESTE:
+        yield PG_TESTE
+        return
+
+    from banco_local import PostgresLocal
+
+    try:
+        pg = PostgresLocal(fsync=False)
+        pg.iniciar()
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as erro:
+        pytest.skip(f"PostgreSQL indisponível para os testes: {erro}")
+    try:
+        yield psycopg2.extensions.make_dsn(pg.dsn, dbname='postgres')
+    finally:
+        pg.parar()
+
+
+@pytest.fixture(scope='session')
+def criar_banco(servidor_pg):
+    """criar_banco() -> DSN de um banco novo e vazio, apagado no fim da sessão."""
+    import psycopg2
+
+    criados = []
+
+    def criar():
+        nome = f"entomotrack_teste_{uuid.uuid4().hex[:8]}"
+        conn = psycopg2.connect(servidor_pg)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"CREATE DATABASE {nome} TEMPLATE template0 ENCODING 'UTF8' LOCALE 'C'")
+        finally:
+            conn.close()
+        criados.append(nome)
+        return psycopg2.extensions.make_dsn(servidor_pg, dbname=nome)
+
+    yield criar
+
+    conn = psycopg2.connect(servidor_pg)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for nome in criados:
+                cursor.execute(f'DROP DATABASE IF EXISTS {nome} WITH (FORCE)')
+    finally:
+        conn.close()
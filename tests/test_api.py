@@ -0,0 +1,345 @@
+"""
+Testes de fumaça da API contra um PostgreSQL descartável (ver conftest.py):
+`flask migrar`, POST /formularios/lote, o feed /sync/alteracoes paginado
+por cursor, GET condicional (304), o pool de conexões e /imagem e /zip,
+direto ou por job.
+"""
+import json
+import types
+from datetime import date
+
+import pytest
+
+pytest.importorskip('flask')
+
+DIA = date(2025, 3, 10)
+
+
+def _formulario(idagente, chave=None, dia=DIA, **campos):
+    dados = {"data": dia.isoformat(), "idagente": idagente, "tipo_inseto": "Aedes aegypti",
+             "num_pontos_criticos": 1, "num_locos_larva": 2}
+    if chave is not None:
+        dados["chave_idempotencia"] = chave
+    dados.update(campos)
+    return dados
+
+
+@pytest.fixture(scope='module')
+def api(criar_banco):
+    """App apontando para um banco novo, migrado por `flask migrar`, com dois agentes."""
+    import psycopg2
+
+    dsn = criar_banco()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', dsn)
+        import agendador
+        import database
+        from app import app
+
+        mp.setattr(agendador, 'AGENDADOR_ATIVO', False)
+        database.close_pool()
+        migracao = app.test_cli_runner().invoke(args=['migrar'])
+
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO usuario (nome, email, senha, funcao) "
+                               "VALUES ('Agente', 'agente@teste', 'x', 'agente') RETURNING idusuario")
+                idusuario = cursor.fetchone()[0]
+                cursor.execute("INSERT INTO agente (matricula, idusuario) VALUES ('A1', %s), ('A2', %s) "
+                               "RETURNING idagente", (idusuario, idusuario))
+                agentes = [linha[0] for linha in cursor.fetchall()]
+            conn.commit()
+        finally:
+            conn.close()
+
+        try:
+            yield types.SimpleNamespace(app=app, cliente=app.test_client(), dsn=dsn,
+                                        migracao=migracao, agentes=agentes)
+        finally:
+            database.close_pool()
+
+
+def _consultar(api, sql, parametros=()):
+    import psycopg2
+
+    conn = psycopg2.connect(api.dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def test_migrar(api):
+    assert api.migracao.exit_code == 0, api.migracao.output
+    assert "migração(ões) aplicada(s)" in api.migracao.output
+
+    runner = api.app.test_cli_runner()
+    de_novo = runner.invoke(args=['migrar'])
+    assert de_novo.exit_code == 0, de_novo.output
+    assert "Banco já está atualizado" in de_novo.output
+
+    listagem = runner.invoke(args=['migrar', '--listar'])
+    assert listagem.exit_code == 0, listagem.output
+    assert "pendente" not in listagem.output
+
+
+def test_lote_erros_por_registro_e_idempotencia(api):
+    agente, outro = api.agentes
+    lote = [
+        _formulario(agente, chave="lote-1"),
+        _formulario(agente, data="10/03/2025"),
+        _formulario(999999),
+        _formulario(outro, num_locos_larva="muitos"),
+        _formulario(outro),
+    ]
+    resposta = api.cliente.post("/formularios/lote", json=lote)
+    assert resposta.status_code == 201, resposta.get_json()
+    corpo = resposta.get_json()
+    assert (corpo["inseridos"], corpo["duplicados"], corpo["rejeitados"]) == (2, 0, 3)
+
+    resultados = corpo["resultados"]
+    assert [r["indice"] for r in resultados] == list(range(len(lote)))
+    assert "id_formulario" in resultados[0] and "id_formulario" in resultados[4]
+    assert set(resultados[1]["errors"]) == {"data"}
+    assert resultados[2]["errors"] == {"idagente": "Agente não encontrado"}
+    assert set(resultados[3]["errors"]) == {"num_locos_larva"}
+
+    # Reenvio com a data corrigida: devolve o original, sem gravar nem somar de novo
+    reenvio = api.cliente.post("/formularios/lote", json=[_formulario(agente, chave="lote-1", dia=date(2025, 3, 11))])
+    assert reenvio.status_code == 201
+    resultado = reenvio.get_json()["resultados"][0]
+    assert resultado == {"indice": 0, "id_formulario": resultados[0]["id_formulario"], "duplicado": True}
+
+    formularios = _consultar(api, "SELECT COUNT(*) FROM formularioporcasa WHERE idagente = %s", (agente,))
+    resumo = _consultar(api, "SELECT data, total_domicilios_visitados FROM resumodiario WHERE idagente = %s",
+                        (agente,))
+    assert formularios[0][0] == 1
+    assert resumo == [(DIA, 1)]
+
+    # Nenhum registro válido: 400 com os erros de cada um
+    invalido = api.cliente.post("/formularios/lote", json=[{"idagente": agente}])
+    assert invalido.status_code == 400
+    assert set(invalido.get_json()["resultados"][0]["errors"]) == {"data", "tipo_inseto"}
+
+
+def test_alteracoes_paginadas_por_cursor(api):
+    agente, _ = api.agentes
+    novos = api.cliente.post("/formularios/lote", json=[_formulario(agente, dia=date(2025, 4, d)) for d in range(1, 6)])
+    assert novos.status_code == 201
+
+    vistos, resumos, cursor, paginas = [], [], None, 0
+    while True:
+        resposta = api.cliente.get("/sync/alteracoes", query_string={"limite": 2, **({"cursor": cursor} if cursor else {})})
+        assert resposta.status_code == 200, resposta.get_json()
+        corpo = resposta.get_json()
+        vistos += [f["idboletimdiario"] for f in corpo["formularios"]]
+        resumos += [(r["data"], r["idagente"]) for r in corpo["resumos_diarios"]]
+        cursor, paginas = corpo["cursor"], paginas + 1
+        if not corpo["mais"]:
+            break
+        assert paginas < 50
+
+    todos = [linha[0] for linha in _consultar(api, "SELECT idboletimdiario FROM formularioporcasa")]
+    assert paginas > 1
+    assert sorted(vistos) == sorted(todos)
+    assert len(set(resumos)) == len(resumos) == len(_consultar(api, "SELECT 1 FROM resumodiario"))
+
+    # Com o último cursor só vem o que mudou depois
+    vazio = api.cliente.get("/sync/alteracoes", query_string={"cursor": cursor}).get_json()
+    assert vazio["formularios"] == [] and vazio["resumos_diarios"] == []
+    novo = api.cliente.post("/formularios", json=_formulario(agente, dia=date(2025, 4, 20)))
+    assert novo.status_code == 201
+    depois = api.cliente.get("/sync/alteracoes", query_string={"cursor": cursor}).get_json()
+    assert [f["idboletimdiario"] for f in depois["formularios"]] == [novo.get_json()["id_formulario"]]
+    assert [(r["data"], r["idagente"]) for r in depois["resumos_diarios"]] == [("2025-04-20", agente)]
+
+    invalido = api.cliente.get("/sync/alteracoes", query_string={"cursor": "nao-e-cursor"})
+    assert invalido.status_code == 400
+    assert "cursor" in invalido.get_json()["errors"]
+
+
+@pytest.mark.parametrize("rota,tabela", [
+    ("/formularios", "formularioporcasa"),
+    ("/formularios/resumo/diario", "formularioporcasa"),
+    ("/resumos/diarios", "resumodiario"),
+])
+def test_get_condicional(api, rota, tabela):
+    primeira = api.cliente.get(rota)
+    assert primeira.status_code == 200
+    etag = primeira.headers["ETag"]
+    assert primeira.headers["Last-Modified"]
+
+    igual = api.cliente.get(rota, headers={"If-None-Match": etag})
+    assert igual.status_code == 304
+    assert igual.data == b""
+    assert igual.headers["ETag"] == etag
+
+    # Uma escrita em qualquer conexão muda a versão da tabela
+    novo = api.cliente.post("/formularios", json=_formulario(api.agentes[1], dia=date(2025, 5, 2)))
+    assert novo.status_code == 201
+    mudou = api.cliente.get(rota, headers={"If-None-Match": etag})
+    assert mudou.status_code == 200
+    assert mudou.headers["ETag"] != etag
+    assert json.loads(mudou.data)
+
+
+def test_pool_devolve_conexoes(api):
+    for _ in range(3):
+        assert api.cliente.get("/formularios", query_string={"limite": 5}).status_code == 200
+    assert api.cliente.get("/sync/alteracoes", query_string={"cursor": "invalido"}).status_code == 400
+
+    saude = api.cliente.get("/health")
+    assert saude.status_code == 200
+    assert saude.get_json()["db"] is True
+
+    pool = api.cliente.get("/health/pool").get_json()["data"]
+    assert pool["em_uso"] == 0
+    assert pool["checkouts"] > 0
+    assert pool["timeouts"] == 0
+    assert 1 <= pool["ociosas"] <= pool["max"]
+
+
+@pytest.mark.parametrize("formato,assinatura", [("imagem", b"\x89PNG"), ("zip", b"PK")])
+def test_imagem_e_zip(api, formato, assinatura):
+    pytest.importorskip('kaleido')
+    import renderizacao
+
+    dia = date(2025, 6, 2)
+    assert api.cliente.post("/formularios", json=_formulario(api.agentes[0], dia=dia)).status_code == 201
+    rota = f"/resumos/graficos/diarios/{dia.isoformat()}/{formato}"
+
+    try:
+        # Sem pedir, a rota devolve o próprio arquivo
+        direto = api.cliente.get(rota)
+        assert direto.status_code == 200
+        assert direto.data.startswith(assinatura)
+
+        # Com Prefer: respond-async (ou ?assincrono=1), um job
+        for pedido in ({"headers": {"Prefer": "respond-async, wait=0"}}, {"query_string": {"assincrono": 1}}):
+            resposta = api.cliente.get(rota, **pedido)
+            assert resposta.status_code == 202, resposta.get_json()
+            corpo = resposta.get_json()
+            assert resposta.headers["Location"] == corpo["status_url"]
+            assert resposta.headers["Preference-Applied"] == "respond-async"
+
+            status = api.cliente.get(corpo["status_url"], query_string={"aguardar": 30}).get_json()["data"]
+            assert status["status"] == "concluido", status
+            arquivo = api.cliente.get(corpo["arquivo_url"])
+            assert arquivo.status_code == 200
+            assert arquivo.data.startswith(assinatura)
+    finally:
+        renderizacao.encerrar()
+
+    sem_dados = api.cliente.get(f"/resumos/graficos/diarios/1999-01-01/{formato}")
+    assert sem_dados.status_code == 404
+
+
+def test_validacao_do_pool_nao_conta_como_consulta(api):
+    import database
+    import metricas
+
+    pool = database.ConnectionPool(api.dsn, minconn=1, maxconn=1, validar_apos=0)
+    inicio = metricas.iniciar_requisicao()
+    try:
+        requisicao = metricas._requisicao.get()
+        # A conexão ociosa é validada com SELECT 1 antes de ser entregue
+        conn = pool.getconn()
+        assert requisicao.consultas == 0
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        assert requisicao.consultas == 1
+        pool.putconn(conn)
+    finally:
+        metricas.finalizar_requisicao(inicio, '/teste', 'GET', 200)
+        pool.closeall()
+
+
+@pytest.mark.parametrize("parametros", [{}, {"limite": 5}, {"formato": "ndjson"}])
+def test_get_condicional_usa_um_checkout(api, parametros):
+    def checkouts():
+        return api.cliente.get("/health/pool").get_json()["data"]["checkouts"]
+
+    antes = checkouts()
+    resposta = api.cliente.get("/formularios", query_string=parametros)
+    assert resposta.status_code == 200
+    assert resposta.data
+    # /health/pool não retira conexão; a listagem, uma só
+    assert checkouts() - antes == 1
+
+    antes = checkouts()
+    igual = api.cliente.get("/formularios", query_string=parametros, headers={"If-None-Match": resposta.headers["ETag"]})
+    assert igual.status_code == 304
+    assert checkouts() - antes == 1
+    assert api.cliente.get("/health/pool").get_json()["data"]["em_uso"] == 0
+
+
+def test_envio_incrementa_versao_do_grafico_diario(api):
+    dia = date(2025, 7, 1)
+
+    def versao():
+        linhas = _consultar(api, "SELECT versao FROM versao_graficos WHERE tipo = 'diario' AND periodo = %s", (dia,))
+        return linhas[0][0] if linhas else 0
+
+    antes = versao()
+    assert api.cliente.post("/formularios", json=_formulario(api.agentes[0], dia=dia)).status_code == 201
+    assert versao() == antes + 1
+    lote = [_formulario(api.agentes[0], dia=dia), _formulario(api.agentes[1], dia=dia)]
+    assert api.cliente.post("/formularios/lote", json=lote).status_code == 201
+    assert versao() == antes + 2
+
+
+
+def test_reprocessar_incrementa_versao_depois_do_commit(api):
+    import psycopg2
+    from agregacao import reprocessar_resumos
+
+    dia = date(2025, 7, 15)
+    assert api.cliente.post("/formularios", json=_formulario(api.agentes[0], dia=dia)).status_code == 201
+    sql_versao = "SELECT versao FROM versao_graficos WHERE tipo = 'diario' AND periodo = %s"
+    antes = _consultar(api, sql_versao, (dia,))[0][0]
+
+    conn = psycopg2.connect(api.dsn)
+    trava = psycopg2.connect(api.dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE resumodiario SET total_domicilios_visitados = 99 WHERE data = %s", (dia,))
+            cursor.execute("SET lock_timeout = '200ms'")
+        conn.commit()
+        with trava.cursor() as cursor:
+            cursor.execute(sql_versao + " FOR UPDATE", (dia,))
+
+        # Com a linha de versão travada, o resumo reconstruído já foi
+        # confirmado; só o incremento da versão espera (e aqui expira)
+        with pytest.raises(psycopg2.errors.LockNotAvailable):
+            reprocessar_resumos(conn, dia, dia, ('diario',))
+        resumo = _consultar(api, "SELECT total_domicilios_visitados FROM resumodiario WHERE data = %s", (dia,))
+        assert resumo == [(1,)]
+    finally:
+        trava.close()
+        conn.close()
+
+    resposta = api.cliente.post("/resumos/reprocessar",
+                                json={"inicio": dia.isoformat(), "fim": dia.isoformat(), "niveis": ["diario"]})
+    assert resposta.status_code == 200, resposta.get_json()
+    assert _consultar(api, sql_versao, (dia,))[0][0] == antes + 1
+
+
+@pytest.mark.parametrize("aguardar", ["nan", "inf", "-inf", "abc"])
+def test_aguardar_invalido(api, aguardar):
+    resposta = api.cliente.get(f"/resumos/graficos/jobs/{'0' * 32}", query_string={"aguardar": aguardar})
+    assert resposta.status_code == 400
+
+
+def test_arquivo_de_job_expirado(api, tmp_path, monkeypatch):
+    import renderizacao
+
+    monkeypatch.setattr(renderizacao, 'RENDER_JOBS_DIR', str(tmp_path))
+    job_id = 'd' * 32
+    renderizacao._gravar_status(job_id, 'concluido', mimetype='image/png', arquivo='grafico.png')
+
+    resposta = api.cliente.get(f"/resumos/graficos/jobs/{job_id}/arquivo")
+    assert resposta.status_code == 410
+    assert resposta.get_json()["success"] is False
@@ -0,0 +1,26 @@
+"""Cache de gráficos em disco (cache_graficos.CacheDisco)."""
+import os
+import threading
+
+from cache_graficos import CacheDisco
+
+
+def test_limpeza_a_cada_100_gravacoes_com_threads(tmp_path, monkeypatch):
+    cache = CacheDisco(str(tmp_path), max_arquivos=50)
+    limpezas = []
+    limpar = cache._limpar
+    monkeypatch.setattr(cache, '_limpar', lambda: (limpezas.append(1), limpar()))
+
+    def gravar(inicio):
+        for i in range(inicio, inicio + 100):
+            cache.set(f"diario:{i}", b"{}")
+
+    threads = [threading.Thread(target=gravar, args=(n * 100,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 800 gravações: exatamente 8 limpezas, e a última deixa o limite
+    assert len(limpezas) == 8
+    assert len([nome for nome in os.listdir(tmp_path) if nome.endswith(".json")]) <= 50
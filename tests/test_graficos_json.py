@@ -0,0 +1,110 @@
+"""
+graficos_json contra graficos.py (px / go) nos nove gráficos dos resumos.
+
+As linhas imitam o RealDictCursor de SQL_GRAFICOS (routes/resumos.py):
+colunas de id e de data, somas como Decimal e NULL como None. O lado do
+graficos_json passa pelo mesmo serializador das respostas (para_json); o
+do px recebe as somas já como números, que é o que o pandas consegue
+desenhar, e sai por pio.to_json.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pio = pytest.importorskip("plotly.io")
+
+import graficos  # noqa: E402
+import graficos_json  # noqa: E402
+from serializacao import para_json  # noqa: E402
+
+COLUNAS = [
+    'total_domicilios_visitados', 'total_pontos_criticos', 'total_criaduros_encontrados',
+    'total_criaduros_eliminados', 'total_larvas_encontradas', 'total_larvas_coletadas',
+    'total_adultos_coletados', 'total_casos_suspeitos',
+]
+
+VALORES = [
+    # idagente, somas na ordem de COLUNAS
+    (3, [Decimal(12), Decimal(3), Decimal(4), Decimal(3), Decimal(7), Decimal(5), Decimal(2), Decimal(1)]),
+    (7, [None, None, None, None, None, Decimal(0), None, Decimal(0)]),
+    (11, [Decimal(5), Decimal(0), Decimal(0), Decimal(0), Decimal(9), Decimal(4), Decimal(1), Decimal(2)]),
+    (15, [8, 2, 6, 5, 0, 0, 3, 1]),
+]
+
+DIA = date(2024, 3, 5)
+SEMANA = (date(2024, 3, 4), date(2024, 3, 10))
+MES = date(2024, 3, 1)
+
+
+def _linhas(nivel):
+    """Linhas como as do RealDictCursor para o nível pedido"""
+    linhas = []
+    for i, (idagente, somas) in enumerate(VALORES, start=1):
+        if nivel == 'diario':
+            linha = {'idresumodiario': i, 'data': DIA, 'idagente': idagente}
+        elif nivel == 'semanal':
+            linha = {'idresumosemanal': i, 'data_inicio': SEMANA[0], 'data_fim': SEMANA[1], 'idagente': idagente}
+        else:
+            linha = {'idresumomensal': i, 'data_inicio': MES, 'data_fim': date(2024, 3, 31), 'idagente': idagente}
+        sufixo = '_mes' if nivel == 'mensal' else ''
+        linha.update({coluna + sufixo: soma for coluna, soma in zip(COLUNAS, somas)})
+        linhas.append(linha)
+    return linhas
+
+
+def _numericas(linhas):
+    """As mesmas linhas com Decimal convertido para int, para o px"""
+    return [{k: int(v) if isinstance(v, Decimal) else v for k, v in linha.items()} for linha in linhas]
+
+
+def _figuras(nivel):
+    if nivel == 'diario':
+        args = (DIA,)
+        px_figs, json_figs = graficos.figuras_graficos_diarios, graficos_json.graficos_diarios
+    elif nivel == 'semanal':
+        args = SEMANA
+        px_figs, json_figs = graficos.figuras_graficos_semanais, graficos_json.graficos_semanais
+    else:
+        args = (MES,)
+        px_figs, json_figs = graficos.figuras_graficos_mensais, graficos_json.graficos_mensais
+
+    esperado = {nome: json.loads(pio.to_json(fig)) for nome, fig in px_figs(*args, _numericas(_linhas(nivel)))}
+    obtido = {nome: json.loads(para_json(fig)) for nome, fig in json_figs(*args, _linhas(nivel))}
+    return esperado, obtido
+
+
+GRAFICOS = [
+    ('diario', 'comparacao_agentes'),
+    ('diario', 'criaduros'),
+    ('diario', 'larvas'),
+    ('semanal', 'metricas_principais'),
+    ('semanal', 'eficiencia_criaduros'),
+    ('semanal', 'distribuicao_atividades'),
+    ('mensal', 'comparacao_mensal'),
+    ('mensal', 'coleta_insetos'),
+    ('mensal', 'heatmap_produtividade'),
+]
+
+
+@pytest.mark.parametrize("nivel,nome", GRAFICOS)
+def test_grafico_igual_ao_plotly(nivel, nome):
+    esperado, obtido = _figuras(nivel)
+    assert obtido[nome]["data"] == esperado[nome]["data"]
+    assert obtido[nome]["layout"] == esperado[nome]["layout"]
+
+
+@pytest.mark.parametrize("nivel", ['diario', 'semanal', 'mensal'])
+def test_mesmos_graficos_por_nivel(nivel):
+    esperado, obtido = _figuras(nivel)
+    assert list(obtido) == list(esperado)
+    assert {nome for n, nome in GRAFICOS if n == nivel} == set(obtido)
+
+
+def test_somas_decimal_saem_como_numero():
+    _, obtido = _figuras('mensal')
+    z = obtido['heatmap_produtividade']['data'][0]['z']
+    assert z[0] == [12, 3, 3, 5, 2]
+    assert z[1] == [None, None, None, 0, None]
+    assert all(not isinstance(v, str) for linha in z for v in linha)
@@ -0,0 +1,73 @@
+"""Métricas: fragmentos de threads encerradas e retratos de processos que saíram."""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import metricas
+
+
+def _total(texto, linha):
+    for atual in texto.splitlines():
+        if atual.startswith(linha + ' '):
+            return float(atual.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_fragmentos_de_threads_encerradas_sao_somados_e_descartados():
+    antes = len(metricas._fragmentos)
+    base = _total(metricas.texto_prometheus(), 'entomotrack_teste_threads_total')
+
+    def registrar():
+        metricas.contar('teste_threads_total')
+        metricas.observar('http_duracao_segundos', 0.02, rota='/teste-threads', metodo='GET')
+
+    for _ in range(20):
+        thread = threading.Thread(target=registrar)
+        thread.start()
+        thread.join()
+
+    texto = metricas.texto_prometheus()
+    assert len(metricas._fragmentos) <= antes + 1
+    assert _total(texto, 'entomotrack_teste_threads_total') == base + 20
+    assert _total(texto, 'entomotrack_http_duracao_segundos_count{metodo="GET",rota="/teste-threads"}') == 20
+
+
+def _retrato(pid, valor):
+    return {'pid': pid, 'contadores': [['teste_encerrados_total', [], valor]],
+            'histogramas': [], 'medidores': [['http_em_andamento', [], 1]]}
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, 'METRICAS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_processo_encerrado_vai_para_o_acumulado(diretorio):
+    for pid, valor in ((999991, 3), (999992, 4)):
+        (diretorio / f'{pid}.json').write_text(json.dumps(_retrato(pid, valor)))
+        metricas.encerrar_processo(pid)
+
+    assert sorted(os.listdir(diretorio)) == [metricas.ARQUIVO_ENCERRADOS]
+    texto = metricas.texto_prometheus()
+    assert _total(texto, 'entomotrack_teste_encerrados_total') == 7
+    # Medidores de processos encerrados não contam
+    assert _total(texto, 'entomotrack_http_em_andamento') == 0
+
+    # Um novo processo com o mesmo pid não apaga o que já foi somado
+    (diretorio / '999991.json').write_text(json.dumps(_retrato(os.getpid() + 1, 1)))
+    metricas.encerrar_processo(999991)
+    assert _total(metricas.texto_prometheus(), 'entomotrack_teste_encerrados_total') == 8
+
+
+def test_retrato_sem_atualizacao_e_ignorado(diretorio):
+    caminho = diretorio / '999993.json'
+    caminho.write_text(json.dumps(_retrato(999993, 5)))
+    assert _total(metricas.texto_prometheus(), 'entomotrack_teste_encerrados_total') == 5
+
+    antigo = time.time() - metricas.METRICAS_EXPIRAR - 1
+    os.utime(caminho, (antigo, antigo))
+    assert _total(metricas.texto_prometheus(), 'entomotrack_teste_encerrados_total') == 0
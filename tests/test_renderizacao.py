@@ -0,0 +1,39 @@
+"""Limpeza dos jobs de renderização em RENDER_JOBS_DIR."""
+import os
+import time
+
+import pytest
+
+import renderizacao
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(renderizacao, 'RENDER_JOBS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _envelhecer(caminho, segundos):
+    antigo = time.time() - segundos
+    os.utime(caminho, (antigo, antigo))
+
+
+def test_status_e_artefato_expiram_juntos(diretorio):
+    ttl = renderizacao.RENDER_JOBS_TTL
+    antigo, recente = 'a' * 32, 'b' * 32
+    for job_id in (antigo, recente):
+        renderizacao._gravar_status(job_id, 'concluido')
+        (diretorio / f'{job_id}.bin').write_bytes(b'PNG')
+        # O artefato é gravado antes do status: é sempre o mais velho
+        _envelhecer(diretorio / f'{job_id}.bin', ttl + 10)
+    _envelhecer(diretorio / f'{antigo}.json', ttl + 5)
+
+    orfao = diretorio / f'{"c" * 32}.bin'
+    orfao.write_bytes(b'PNG')
+    _envelhecer(orfao, ttl + 1)
+    temporario = diretorio / 'xyz.tmp'
+    temporario.write_bytes(b'')
+
+    renderizacao._limpar_jobs_antigos()
+
+    assert sorted(os.listdir(diretorio)) == sorted([f'{recente}.json', f'{recente}.bin', 'xyz.tmp'])
@@ -0,0 +1,26 @@
+"""
+As consultas quentes das rotas usam os índices esperados
+(benchmarks/verificar_indices.py), em tabela comum e particionada.
+
+O volume é menor que o do script (padrão de 1 milhão de visitas), mas
+grande o bastante para o planejador preferir os índices.
+"""
+import pytest
+
+verificar_indices = pytest.importorskip('verificar_indices')
+
+FORMULARIOS = 200_000
+AGENTES = 200
+DIAS = 365
+
+
+@pytest.mark.parametrize("particionar", [False, True], ids=['comum', 'particionada'])
+def test_consultas_quentes_usam_indices(criar_banco, particionar):
+    dsn = criar_banco()
+    verificar_indices.preparar(dsn, FORMULARIOS, AGENTES, DIAS, particionar=particionar)
+
+    resultados = verificar_indices.verificar_consultas(dsn)
+
+    assert resultados
+    falhas = [f"{nome}: espera {indice}; {resumo}" for nome, indice, ok, resumo in resultados if not ok]
+    assert not falhas, "\n".join(falhas)